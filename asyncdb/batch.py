@@ -0,0 +1,133 @@
+"""Batching point lookups, DataLoader style."""
+
+from __future__ import unicode_literals, absolute_import
+
+import collections
+import functools
+
+DEFAULT_MAX_BATCH_SIZE = 100
+
+
+class BatchLoader(object):
+    """
+    Collects the keys passed to :meth:`load` during one pass of the event
+    loop and fetches them together.
+
+    ``fetch(keys)`` must return a Future that resolves to a list of items,
+    and ``key_of(item)`` tells which key an item belongs to. A key that no
+    item belongs to loads as ``None``. At most `max_batch_size` keys go into
+    one fetch.
+
+    With `cache`, a key is fetched at most once in the loader's lifetime
+    and every load of it gets the same item, so make one loader per
+    request rather than sharing one for good.
+    """
+
+    def __init__(self, io_loop, framework, fetch, key_of,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE, cache=True):
+        self.io_loop = io_loop
+        self._framework = framework
+        self._fetch = fetch
+        self._key_of = key_of
+        self.max_batch_size = max_batch_size
+        self.cache = cache
+        self._cached = {}
+        self._pending = collections.OrderedDict()
+        self._scheduled = False
+
+        # Fetches issued, and loads answered from the cache.
+        self.batches = 0
+        self.cache_hits = 0
+
+    def load(self, key):
+        """Returns a Future that resolves to the item for `key`, or None."""
+        if self.cache:
+            future = self._cached.get(key)
+            if future is not None:
+                self.cache_hits += 1
+                return future
+
+        future = self._framework.get_future(self.io_loop)
+        if self.cache:
+            self._cached[key] = future
+        self._pending.setdefault(key, []).append(future)
+        if not self._scheduled:
+            self._scheduled = True
+            self._framework.call_soon(self.io_loop, self._dispatch)
+        return future
+
+    def load_many(self, keys):
+        """Returns a Future that resolves to a list with the item, or None,
+        for each of `keys`."""
+        result = self._framework.get_future(self.io_loop)
+        futures = [self.load(key) for key in keys]
+        remaining = [len(futures)]
+
+        def loaded(_):
+            remaining[0] -= 1
+            if remaining[0] or result.done():
+                return
+            try:
+                result.set_result([future.result() for future in futures])
+            except Exception as exc:
+                result.set_exception(exc)
+
+        if not futures:
+            result.set_result([])
+        for future in futures:
+            future.add_done_callback(loaded)
+        return result
+
+    def prime(self, key, item):
+        """Cache `item` for `key`, unless `key` is already loaded."""
+        if self.cache and key not in self._cached:
+            future = self._framework.get_future(self.io_loop)
+            future.set_result(item)
+            self._cached[key] = future
+
+    def clear(self, key=None):
+        """Forget `key`, or with no argument every key, so it's fetched
+        again on the next load."""
+        if key is None:
+            self._cached.clear()
+        else:
+            self._cached.pop(key, None)
+
+    def _dispatch(self):
+        self._scheduled = False
+        pending, self._pending = self._pending, collections.OrderedDict()
+        keys = list(pending)
+        for start in range(0, len(keys), self.max_batch_size):
+            batch = keys[start:start + self.max_batch_size]
+            waiters = [(key, pending[key]) for key in batch]
+            self.batches += 1
+            try:
+                fetched = self._fetch(batch)
+            except Exception as exc:
+                self._fail(waiters, exc)
+            else:
+                fetched.add_done_callback(
+                    functools.partial(self._fetched, waiters))
+
+    def _fetched(self, waiters, fetched):
+        try:
+            items = fetched.result()
+        except Exception as exc:
+            self._fail(waiters, exc)
+            return
+
+        by_key = {}
+        for item in items:
+            by_key.setdefault(self._key_of(item), item)
+        for key, futures in waiters:
+            item = by_key.get(key)
+            for future in futures:
+                future.set_result(item)
+
+    def _fail(self, waiters, exc):
+        for key, futures in waiters:
+            # Let a later load try again.
+            if self._cached.get(key) in futures:
+                del self._cached[key]
+            for future in futures:
+                future.set_exception(exc)
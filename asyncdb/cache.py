@@ -0,0 +1,191 @@
+"""An in-process cache of query results."""
+
+from __future__ import unicode_literals, absolute_import
+
+import collections
+import copy
+import functools
+import sys
+import time
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 60
+
+
+def _sizeof(value):
+    # Rough memory footprint of a decoded result.
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += _sizeof(key) + _sizeof(item)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += _sizeof(item)
+    return size
+
+
+class _Entry(object):
+    __slots__ = ('value', 'size', 'tags', 'expires', 'stale_until')
+
+    def __init__(self, value, size, tags, expires, stale_until):
+        self.value = value
+        self.size = size
+        self.tags = tags
+        self.expires = expires
+        self.stale_until = stale_until
+
+
+class ResultCache(object):
+    """
+    Query results by key, each tagged with the tables or collections it
+    read, in a least-recently-used cache of at most `max_bytes` bytes.
+
+    A result is fresh for `ttl` seconds. For `stale_ttl` seconds after that
+    it's still returned while one caller reloads it in the background, so a
+    hot key that expires doesn't send every caller to the server at once.
+    Concurrent misses on one key share a single load.
+
+    :meth:`invalidate` drops the results tagged with a table or collection;
+    results being loaded while it's called aren't stored. Unless `copy` is
+    False, every caller gets its own deep copy of a cached result.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL,
+                 stale_ttl=0, copy=True):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.copy = copy
+        self._entries = collections.OrderedDict()
+        self._tags = {}
+        self._generations = collections.defaultdict(int)
+        self._epoch = 0
+        self._loading = {}
+        self.bytes = 0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def stats(self):
+        return {'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'bytes': self.bytes}
+
+    def fetch(self, key, tags, load, io_loop, framework, refresh=None):
+        """Returns a Future for the result cached for `key`. On a miss,
+        ``load()`` must return a Future for the result; it's cached tagged
+        with `tags`. A stale result is reloaded with ``refresh()``, if
+        given, since no caller waits for that."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.time()
+            if now < entry.expires:
+                self.hits += 1
+                self._touch(key)
+                return self._resolved(entry.value, io_loop, framework)
+
+            if now < entry.stale_until:
+                self.stale_hits += 1
+                self._touch(key)
+                if key not in self._loading:
+                    self._load(key, tags, refresh or load)
+                return self._resolved(entry.value, io_loop, framework)
+
+            self._remove(key)
+
+        self.misses += 1
+        loading = self._loading.get(key)
+        if loading is None:
+            loading = self._load(key, tags, load)
+
+        future = framework.get_future(io_loop)
+        loading.add_done_callback(functools.partial(self._loaded, future))
+        return future
+
+    def invalidate(self, tag):
+        """Drop results tagged with `tag`."""
+        self._generations[tag] += 1
+        for key in list(self._tags.get(tag, ())):
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop every result."""
+        self._epoch += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._tags.clear()
+        self.bytes = 0
+
+    def _load(self, key, tags, load):
+        versions = self._versions(tags)
+        loading = load()
+        self._loading[key] = loading
+        loading.add_done_callback(
+            functools.partial(self._store, key, tags, versions))
+        return loading
+
+    def _versions(self, tags):
+        return self._epoch, [self._generations[tag] for tag in tags]
+
+    def _store(self, key, tags, versions, loading):
+        del self._loading[key]
+        if loading.exception() is not None:
+            return
+
+        if versions != self._versions(tags):
+            # Invalidated while loading; the result may predate a write.
+            return
+
+        value = loading.result()
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        self._remove(key)
+        now = time.time()
+        self._entries[key] = _Entry(value, size, tags, now + self.ttl,
+                                    now + self.ttl + self.stale_ttl)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        self.bytes += size
+
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _loaded(self, future, loading):
+        try:
+            value = loading.result()
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(copy.deepcopy(value) if self.copy else value)
+
+    def _resolved(self, value, io_loop, framework):
+        future = framework.get_future(io_loop)
+        future.set_result(copy.deepcopy(value) if self.copy else value)
+        return future
+
+    def _touch(self, key):
+        entry = self._entries.pop(key)
+        self._entries[key] = entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
@@ -0,0 +1,68 @@
+"""Sharing one in-flight read among concurrent identical requests."""
+
+from __future__ import unicode_literals, absolute_import
+
+import copy
+import functools
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with equal keys: the first caller starts the
+    operation, later callers with the same key wait for it instead of
+    starting their own, and all of them get its result or error.
+
+    Every caller after the first gets a deep copy of the result, so callers
+    may modify what they get.
+    """
+
+    def __init__(self, io_loop, framework):
+        self.io_loop = io_loop
+        self._framework = framework
+        self._calls = {}
+
+        # Calls that joined one in flight, and calls that started one.
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    def do(self, key, start):
+        """Returns a Future for the result of the call in flight for `key`,
+        or of ``start()``, which must return a Future."""
+        future = self._framework.get_future(self.io_loop)
+        waiters = self._calls.get(key)
+        if waiters is not None:
+            self.hits += 1
+            waiters.append(future)
+            return future
+
+        self.misses += 1
+        self._calls[key] = [future]
+        try:
+            started = start()
+        except Exception:
+            del self._calls[key]
+            raise
+        started.add_done_callback(functools.partial(self._done, key))
+        return future
+
+    def _done(self, key, started):
+        waiters = self._calls.pop(key)
+        try:
+            result = started.result()
+        except Exception as exc:
+            for future in waiters:
+                future.set_exception(exc)
+            return
+
+        waiters[0].set_result(result)
+        for future in waiters[1:]:
+            future.set_result(copy.deepcopy(result))
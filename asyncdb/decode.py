@@ -0,0 +1,55 @@
+"""Decoding large results on an executor, off the event loop."""
+
+from __future__ import unicode_literals, absolute_import
+
+import greenlet
+
+from .event import MotorGreenletEvent
+
+# Results smaller than this are decoded on the event loop, where it's
+# cheaper than a round trip through the executor.
+DEFAULT_THRESHOLD = 1024 * 1024
+
+
+class DecodeExecutor(object):
+    """
+    Decodes results of at least `threshold` bytes on `executor`, a
+    :class:`concurrent.futures.ThreadPoolExecutor` or
+    :class:`~concurrent.futures.ProcessPoolExecutor`, while the event loop
+    goes on serving other requests.
+
+    A thread pool shares the GIL with the event loop, so decoding is
+    split into pieces that give it back often. A process pool decodes in
+    parallel, but pickles each result back: MySQL converters and
+    ``document_class`` must be picklable, module-level callables.
+    """
+
+    def __init__(self, executor, threshold=DEFAULT_THRESHOLD):
+        self.executor = executor
+        self.threshold = threshold
+
+        # How many results went through the executor or stayed on the loop.
+        self.offloaded = 0
+        self.inline = 0
+
+    def should_offload(self, nbytes):
+        if nbytes >= self.threshold:
+            self.offloaded += 1
+            return True
+        self.inline += 1
+        return False
+
+    def run(self, io_loop, framework, fn, *args, **kwargs):
+        """Call ``fn(*args, **kwargs)`` on the executor and return its result.
+
+        Must be called on a child greenlet, which is paused until the
+        executor is done.
+        """
+        assert greenlet.getcurrent().parent is not None, "Should be on child greenlet"
+
+        done = MotorGreenletEvent(io_loop, framework)
+        future = self.executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(
+            lambda _: framework.call_soon_threadsafe(io_loop, done.set))
+        done.wait()
+        return future.result()
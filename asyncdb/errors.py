@@ -39,6 +39,11 @@ class OperationalError(AsyncdbError):
     error occurred during processing, etc."""
 
 
+class QueryTimeout(OperationalError):
+    """Raised when a query ran past its timeout and was killed.
+    """
+
+
 class CallbackTypeError(AsyncdbError):
     def __init__(self):
         AsyncdbError.__init__(self, "callback must be a callable")
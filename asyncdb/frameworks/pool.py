@@ -46,6 +46,9 @@ class SocketInfo(object):
         self.last_checkout = time.time()
         self.forced = False
         self.connected = False
+        self.session = None
+        # What SocketPool indexes the socket by while it's idle.
+        self.labels = ()
 
         self._min_wire_version = None
         self._max_wire_version = None
@@ -147,7 +150,8 @@ class SocketPool(object):
             ssl_ca_certs=None,
             wait_queue_timeout=None,
             wait_queue_multiple=None,
-            socket_keepalive=False):
+            socket_keepalive=False,
+            labels=None):
         """
         A connection pool that uses Motor's framework-specific sockets.
 
@@ -189,6 +193,9 @@ class SocketPool(object):
           - `socket_keepalive`: (boolean) Whether to send periodic keep-alive
             packets on connected sockets. Defaults to ``False`` (do not send
             keep-alive packets).
+          - `labels`: optional function of a SocketInfo returning hashable
+            labels; idle sockets are indexed by them, for `get_socket` to
+            prefer some.
 
         .. versionchanged:: 0.2
            ``max_size`` is now a hard cap. ``wait_queue_timeout`` and
@@ -198,6 +205,9 @@ class SocketPool(object):
         self.io_loop = io_loop
         self._framework = framework
         self.sockets = set()
+        # Label: the idle sockets with it.
+        self.labels = labels
+        self._labelled = {}
         self.pair = pair
         self.max_size = max_size
         self.net_timeout = net_timeout
@@ -259,6 +269,7 @@ class SocketPool(object):
         self.pool_id += 1
 
         sockets, self.sockets = self.sockets, set()
+        self._labelled = {}
         for sock_info in sockets:
             sock_info.close()
 
@@ -324,7 +335,7 @@ class SocketPool(object):
             motor_sock = self.create_connection()
             return SocketInfo(motor_sock, self.pool_id, self.pair[0])
 
-    def get_socket(self, force=False):
+    def get_socket(self, force=False, prefer=(), preferred_only=False):
         """Get a socket from the pool.
 
         Returns a :class:`SocketInfo` object wrapping a connected
@@ -334,6 +345,11 @@ class SocketPool(object):
         :Parameters:
           - `force`: optional boolean, forces a connection to be returned
               without blocking, even if `max_size` has been reached.
+          - `prefer`: optional labels, best first; an idle socket with the
+              first of them any idle socket has is returned. See `labels`.
+          - `preferred_only`: if True and no idle socket has a preferred
+              label, a new socket is opened, closing an idle one if the pool
+              is full.
         """
         forced = False
         if force:
@@ -344,16 +360,53 @@ class SocketPool(object):
             if self.motor_sock_counter >= self.max_size:
                 forced = True
 
+        sock_info = None
         if self.sockets:
-            sock_info, from_pool = self.sockets.pop(), True
+            sock_info = self._preferred_socket(prefer)
+            if sock_info is None and not preferred_only:
+                sock_info = next(iter(self.sockets))
+
+        if sock_info is not None:
+            self._remove_idle(sock_info)
             sock_info = self._check(sock_info)
         else:
-            sock_info, from_pool = self.connect(force=force), False
+            full = self.max_size and self.motor_sock_counter >= self.max_size
+            if self.sockets and full:
+                # Make room for the new socket.
+                idle = next(iter(self.sockets))
+                self._remove_idle(idle)
+                idle.close()
+                self.motor_sock_counter -= 1
+            sock_info = self.connect(force=force)
 
         sock_info.forced = forced
         sock_info.last_checkout = time.time()
         return sock_info
 
+    def _preferred_socket(self, prefer):
+        for label in prefer:
+            sock_infos = self._labelled.get(label)
+            if sock_infos:
+                return next(iter(sock_infos))
+        return None
+
+    def _add_idle(self, sock_info):
+        self.sockets.add(sock_info)
+        if self.labels is not None:
+            sock_info.labels = tuple(self.labels(sock_info))
+            for label in sock_info.labels:
+                self._labelled.setdefault(label, set()).add(sock_info)
+
+    def _remove_idle(self, sock_info):
+        self.sockets.discard(sock_info)
+        for label in sock_info.labels:
+            sock_infos = self._labelled.get(label)
+            if sock_infos is not None:
+                sock_infos.discard(sock_info)
+                if not sock_infos:
+                    del self._labelled[label]
+        sock_info.labels = ()
+
     def start_request(self):
         raise NotImplementedError("Motor doesn't implement requests")
 
@@ -389,7 +442,7 @@ class SocketPool(object):
             self._framework.call_soon(self.io_loop,
                                       functools.partial(waiter, sock_info))
         elif self.motor_sock_counter <= self.max_size and sock_info.pool_id == self.pool_id:
-            self.sockets.add(sock_info)
+            self._add_idle(sock_info)
         else:
             sock_info.close()
             # if not sock_info.forced:
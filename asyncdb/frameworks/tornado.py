@@ -242,6 +242,9 @@ def tornado_motor_sock_method(method):
     return wrapped
 
 
+# Tornado 3's read_bytes waits for all the bytes asked for.
+PARTIAL_READS = tornado.version_info[0] >= 4
+
 if tornado.version_info[0] < 4:
     # In Tornado 3.2, IOStream.connect and read_bytes don't return Futures.
     def stream_method(stream, method_name, *args, **kwargs):
@@ -289,20 +292,55 @@ class _Wait(concurrent.Future):
 
 
 class SockFile(object):
-    def __init__(self, sock):
+    """Buffered reads from a TornadoAsyncSocket.
+
+    Each recv fetches whatever has arrived, up to `bufsize` bytes or the
+    rest of a larger read, so many small reads cost one greenlet switch.
+    Without partial reads (Tornado 3) it asks for just what is missing.
+    Callers that can parse in place use read_view() to avoid copying.
+    """
+
+    def __init__(self, sock, bufsize=64 * 1024):
         self._sock = sock
+        self._bufsize = bufsize
+        self._buf = b''
+        self._pos = 0
+
+    def _fill(self, n):
+        have = len(self._buf) - self._pos
+        parts = [self._buf[self._pos:]] if have else []
+        while have < n:
+            if PARTIAL_READS:
+                data = self._sock.recv_some(max(n - have, self._bufsize))
+            else:
+                data = self._sock.recv_some(n - have)
+            if not data:
+                break
+            parts.append(data)
+            have += len(data)
+
+        # Join once, rather than growing the result read by read.
+        self._buf = parts[0] if len(parts) == 1 else b''.join(parts)
+        self._pos = 0
 
     def read(self, n):
-        read = self._sock.recv(n)
-        if len(read) == n:
-            return read
-        while True:
-            data = self._sock.recv(n - len(read))
-            if not data:
-                return read
-            read += data
-            if len(read) == n:
-                return read
+        if len(self._buf) - self._pos < n:
+            self._fill(n)
+        if self._pos == 0 and len(self._buf) == n:
+            data, self._buf = self._buf, b''
+        else:
+            data = self._buf[self._pos:self._pos + n]
+            self._pos += len(data)
+        return data
+
+    def read_view(self, n):
+        """Like read, but returns a memoryview of the buffer. It stays valid
+        after later reads, since the buffer is never modified in place."""
+        if len(self._buf) - self._pos < n:
+            self._fill(n)
+        view = memoryview(self._buf)[self._pos:self._pos + n]
+        self._pos += len(view)
+        return view
 
 
 class TornadoAsyncSocket(object):
@@ -416,6 +454,30 @@ class TornadoAsyncSocket(object):
             # PyMongo is built to handle socket.error here, not IOError.
             raise socket.error(str(e))
 
+    @tornado_motor_sock_method
+    def flush(self):
+        """Pause until everything passed to sendall has been written.
+
+        sendall only buffers, so callers streaming a lot of data use this
+        to keep the buffer from growing without bound.
+        """
+        if not self.stream.writing():
+            return
+
+        # An empty write resolves once the buffer ahead of it is flushed.
+        future = stream_method(self.stream, 'write', b'')
+        try:
+            if self.timeout_td:
+                yield _Wait(
+                    future,
+                    self.io_loop,
+                    self.timeout_td,
+                    timeout_exc)
+            else:
+                yield future
+        except IOError as e:
+            raise socket.error(str(e))
+
     @tornado_motor_sock_method
     def recv(self, num_bytes):
         future = stream_method(self.stream, 'read_bytes', num_bytes)
@@ -434,6 +496,28 @@ class TornadoAsyncSocket(object):
 
         raise gen.Return(result)
 
+    @tornado_motor_sock_method
+    def recv_some(self, max_bytes):
+        """Receive between 1 and `max_bytes` bytes, whatever is available
+        first. Without :data:`PARTIAL_READS`, waits for all `max_bytes`."""
+        if not PARTIAL_READS:
+            future = stream_method(self.stream, 'read_bytes', max_bytes)
+        else:
+            future = self.stream.read_bytes(max_bytes, partial=True)
+        try:
+            if self.timeout_td:
+                result = yield _Wait(
+                    future,
+                    self.io_loop,
+                    self.timeout_td,
+                    timeout_exc)
+            else:
+                result = yield future
+        except IOError as e:
+            raise socket.error(str(e))
+
+        raise gen.Return(result)
+
     def close(self):
         if not self.stream:
             return
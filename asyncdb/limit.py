@@ -0,0 +1,184 @@
+"""Capping how many operations run at once."""
+
+from __future__ import unicode_literals, absolute_import
+
+import collections
+import functools
+
+
+class ConcurrencyLimit(object):
+    """
+    Runs at most `limit` operations at a time; the rest wait their turn in
+    the order they came.
+    """
+
+    def __init__(self, io_loop, framework, limit):
+        if limit < 1:
+            raise ValueError('limit must be at least 1, not %r' % limit)
+        self.io_loop = io_loop
+        self._framework = framework
+        self.limit = limit
+        self.active = 0
+        self._waiting = collections.deque()
+
+    @property
+    def waiting(self):
+        return len(self._waiting)
+
+    def run(self, start):
+        """Returns a Future for the result of ``start()``, which must return
+        a Future, once there's room to call it."""
+        future = self._framework.get_future(self.io_loop)
+        if self.active < self.limit:
+            self._start(start, future)
+        else:
+            self._waiting.append((start, future))
+        return future
+
+    def _start(self, start, future):
+        self.active += 1
+        try:
+            started = start()
+        except Exception as exc:
+            self._finished(future, None)
+            future.set_exception(exc)
+            return
+        started.add_done_callback(functools.partial(self._finished, future))
+
+    def _finished(self, future, started):
+        self.active -= 1
+        if self._waiting:
+            self._start(*self._waiting.popleft())
+        if started is None:
+            return
+        try:
+            result = started.result()
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+
+DEFAULT_MAP_CONCURRENCY = 8
+
+
+class ConcurrentMap(object):
+    """
+    Calls `function`, which must return a Future, on each item of a cursor,
+    anything with ``fetch_next`` and ``next_object()``, with at most
+    `concurrency` calls running at once.
+
+    The cursor is only read when there's room for another call, so it's
+    never read ahead of the results. With `ordered`, results are passed on
+    in the cursor's order, and those finished before an earlier one still
+    take up room, so a slow item holds the rest back rather than letting
+    them pile up.
+
+    Results are collected in a list, or if `on_result` is given, passed to
+    it as they come and not kept. :attr:`future` resolves to the list, or
+    to the number of items, when all are done, or to the first error, at
+    which point the cursor is read no further.
+    """
+
+    def __init__(self, io_loop, framework, cursor, function,
+                 concurrency=DEFAULT_MAP_CONCURRENCY, ordered=False,
+                 on_result=None):
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1, not %r'
+                             % concurrency)
+        self.io_loop = io_loop
+        self._framework = framework
+        self.cursor = cursor
+        self.function = function
+        self.concurrency = concurrency
+        self.ordered = ordered
+        self.on_result = on_result
+        self.results = [] if on_result is None else None
+        self.count = 0
+        self.future = framework.get_future(io_loop)
+
+        # Calls running, plus with `ordered`, results waiting by index for
+        # the one at _next_index.
+        self._window = 0
+        self._waiting = {}
+        self._next_index = 0
+        self._fetching = False
+        self._filling = False
+        self._exhausted = False
+
+    def start(self):
+        self._fill()
+
+    def _fill(self):
+        # Futures resolved already run their callbacks at once, which call
+        # this again; the outermost call does the work.
+        if self._filling:
+            return
+        self._filling = True
+        try:
+            while (self._window < self.concurrency and not self._fetching
+                   and not self._exhausted and not self.future.done()):
+                fetched = self.cursor.fetch_next
+                if not fetched.done():
+                    self._fetching = True
+                    fetched.add_done_callback(self._fetched)
+                    return
+                self._take(fetched)
+        finally:
+            self._filling = False
+
+    def _fetched(self, fetched):
+        self._fetching = False
+        self._take(fetched)
+        self._fill()
+
+    def _take(self, fetched):
+        try:
+            if not fetched.result():
+                self._exhausted = True
+                self._check_done()
+                return
+            index = self.count
+            self.count += 1
+            self._window += 1
+            started = self.function(self.cursor.next_object())
+        except Exception as exc:
+            self._fail(exc)
+            return
+        started.add_done_callback(functools.partial(self._finished, index))
+
+    def _finished(self, index, started):
+        if self.future.done():
+            return
+        try:
+            result = started.result()
+            if not self.ordered:
+                self._window -= 1
+                self._emit(result)
+            else:
+                self._waiting[index] = result
+                while self._next_index in self._waiting:
+                    result = self._waiting.pop(self._next_index)
+                    self._next_index += 1
+                    self._window -= 1
+                    self._emit(result)
+        except Exception as exc:
+            self._fail(exc)
+            return
+        self._check_done()
+        self._fill()
+
+    def _emit(self, result):
+        if self.on_result is None:
+            self.results.append(result)
+        else:
+            self.on_result(result)
+
+    def _check_done(self):
+        if self._exhausted and not self._window and not self.future.done():
+            self.future.set_result(
+                self.results if self.on_result is None else self.count)
+
+    def _fail(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
@@ -85,7 +85,22 @@ def asynchronize(motor_class, framework, sync_method, has_write_concern, doc=Non
                         functools.partial(future.set_exception, e))
 
         # Start running the operation on a greenlet.
-        greenlet.greenlet(call_method).switch()
+        child = greenlet.greenlet(call_method)
+        get_decode_executor = getattr(self, 'get_decode_executor', None)
+        if get_decode_executor is not None:
+            decode_executor = get_decode_executor()
+            if decode_executor is not None:
+                # Picked up by mongo.response while PyMongo decodes replies.
+                child.decode_context = (decode_executor, loop, framework)
+        # On the class: a MotorCollection makes any missing attribute a
+        # subcollection.
+        if getattr(type(self), '_reply_handler', None) is not None:
+            # Consulted by mongo.response for each reply.
+            child.reply_handler = self._reply_handler()
+        if (getattr(child, 'decode_context', None) is not None
+                or getattr(child, 'reply_handler', None) is not None):
+            child.run = _decoding_replies(call_method)
+        child.switch()
         return future
 
     # This is for the benefit of motor_extensions.py, which needs this info to
@@ -98,6 +113,20 @@ def asynchronize(motor_class, framework, sync_method, has_write_concern, doc=Non
     return method
 
 
+def _decoding_replies(call_method):
+    # PyMongo decodes replies with mongo.response's function only while a
+    # greenlet stamped for it runs, so other clients are left alone.
+    from .mongo import response
+
+    def run():
+        response.install()
+        try:
+            call_method()
+        finally:
+            response.uninstall()
+    return run
+
+
 def motor_coroutine(f):
     """
     Used by Motor classes to mark functions as coroutines.
@@ -193,6 +222,9 @@ class Async(AttributeFactory):
     def unwrap(self, class_name):
         return Unwrap(self, class_name)
 
+    def invalidates(self):
+        return Invalidate(self)
+
 
 class AsyncRead(Async):
     def __init__(self, attr_name=None, doc=None):
@@ -302,6 +334,37 @@ class Unwrap(WrapBase):
         return _f
 
 
+class Invalidate(WrapBase):
+    def __init__(self, prop):
+        """
+        Like Async, for a method that modifies data: once it's done, calls
+        the owner's invalidate_cache(), which also keeps reads that started
+        before then from being cached. E.g.,
+
+        insert = AsyncWrite().invalidates()
+
+        :Parameters:
+        - `prop`: An Async, the async method that writes.
+        """
+        super(Invalidate, self).__init__(prop)
+
+    def create_attribute(self, cls, attr_name):
+        f = self.property.create_attribute(cls, attr_name)
+
+        @functools.wraps(f)
+        def _f(self, *args, **kwargs):
+            callback = kwargs.pop('callback', None)
+            future = f(self, *args, **kwargs)
+            future.add_done_callback(lambda _: self.invalidate_cache())
+            return self._framework.future_or_callback(
+                future, callback, self.get_io_loop())
+
+        if self.doc:
+            _f.__doc__ = self.doc
+
+        return _f
+
+
 class ReadOnlyPropertyDescriptor(object):
     def __init__(self, attr_name, doc=None):
         self.attr_name = attr_name
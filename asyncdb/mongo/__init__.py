@@ -37,4 +37,6 @@ MotorCommandCursor = create_motor_class(core.AgnosticCommandCursor)
 
 MotorAggregationCursor = create_motor_class(core.AgnosticAggregationCursor)
 
+MotorCollectionScan = create_motor_class(core.AgnosticCollectionScan)
+
 MotorBulkOperationBuilder = create_motor_class(core.AgnosticBulkOperationBuilder)
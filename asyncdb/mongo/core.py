@@ -14,8 +14,14 @@
 
 from __future__ import unicode_literals, absolute_import
 
+import collections
+import datetime
+import numbers
 import textwrap
 
+import bson
+import bson.errors
+import bson.son
 import pymongo
 import pymongo.bulk
 import pymongo.command_cursor
@@ -25,12 +31,34 @@ import pymongo.errors
 import pymongo.mongo_replica_set_client
 import pymongo.son_manipulator
 
+from . import paging, raw
+from .sizing import (AdaptiveBatchSize, DEFAULT_MAX_SIZE, DEFAULT_MIN_SIZE,
+                     DEFAULT_TARGET_BYTES, DEFAULT_TARGET_LATENCY)
+from ..batch import BatchLoader, DEFAULT_MAX_BATCH_SIZE
+from ..coalesce import SingleFlight
 from ..errors import *
 from ..event import MotorGreenletEvent
 from ..frameworks.pool import SocketPool
+from ..limit import ConcurrencyLimit, ConcurrentMap, DEFAULT_MAP_CONCURRENCY
 from ..meta import *
 from ..pycompat import PY35
 
+DEFAULT_SCAN_MAX_BUFFERED = 10000
+DEFAULT_SCAN_RETRIES = 2
+
+# Sub-batches of an unordered bulk write run at once, and the fewest
+# operations worth a sub-batch of their own.
+DEFAULT_BULK_CONCURRENCY = 4
+MIN_BULK_SPLIT_SIZE = 100
+
+# How long a tail waits before polling again, at first and at most, while
+# no documents come.
+DEFAULT_TAIL_MIN_DELAY = 0.01
+DEFAULT_TAIL_MAX_DELAY = 1.0
+
+# Errors a scan_parallel() range's cursor, or a tail's, is reopened after.
+_RESTARTABLE = (pymongo.errors.AutoReconnect, pymongo.errors.CursorNotFound)
+
 
 class AgnosticBase(object):
     def __eq__(self, other):
@@ -55,6 +83,18 @@ class AgnosticBase(object):
     def __repr__(self):
         return '%s(%r)' % (self.__class__.__name__, self.delegate)
 
+    def get_decode_executor(self):
+        return None
+
+    def get_single_flight(self):
+        return None
+
+    def get_result_cache(self):
+        return None
+
+    def get_write_batcher(self):
+        return None
+
 
 class AgnosticClientBase(AgnosticBase):
     """MotorClient and MotorReplicaSetClient common functionality."""
@@ -79,6 +119,10 @@ class AgnosticClientBase(AgnosticBase):
         pool_class = functools.partial(SocketPool, io_loop, self._framework)
         kwargs['_pool_class'] = pool_class
         kwargs['_connect'] = False
+        self.decode_executor = kwargs.pop('decode_executor', None)
+        single_flight = kwargs.pop('single_flight', False)
+        self.result_cache = kwargs.pop('result_cache', None)
+        self.write_batcher = kwargs.pop('write_batcher', None)
         delegate = self.__delegate_class__(*args, **kwargs)
         super(AgnosticClientBase, self).__init__(delegate)
         if io_loop:
@@ -87,9 +131,26 @@ class AgnosticClientBase(AgnosticBase):
         else:
             self.io_loop = self._framework.get_event_loop()
 
+        if single_flight:
+            self.single_flight = SingleFlight(self.io_loop, self._framework)
+        else:
+            self.single_flight = None
+
     def get_io_loop(self):
         return self.io_loop
 
+    def get_decode_executor(self):
+        return self.decode_executor
+
+    def get_single_flight(self):
+        return self.single_flight
+
+    def get_result_cache(self):
+        return self.result_cache
+
+    def get_write_batcher(self):
+        return self.write_batcher
+
     def __getattr__(self, name):
         db_class = create_class_with_framework(
             AgnosticDatabase, self._framework, self.__module__)
@@ -135,6 +196,21 @@ class AgnosticClient(AgnosticClientBase):
         :Parameters:
           - `io_loop` (optional): Special :class:`tornado.ioloop.IOLoop`
             instance to use instead of default
+          - `decode_executor` (optional): a
+            :class:`~asyncdb.decode.DecodeExecutor`; replies larger than its
+            threshold are decoded on its executor instead of the event loop
+          - `single_flight` (optional): if True, concurrent identical
+            :meth:`MotorCollection.find_one` calls share one query; see
+            :class:`~asyncdb.coalesce.SingleFlight`, the client's
+            ``single_flight`` attribute, for hit counts
+          - `result_cache` (optional): a
+            :class:`~asyncdb.cache.ResultCache` for the results of
+            :meth:`MotorCollection.find_one` and :meth:`MotorCursor.to_list`;
+            writes through a collection invalidate what it cached
+          - `write_batcher` (optional): a
+            :class:`~asyncdb.mongo.writes.WriteBatcher`; concurrent
+            :meth:`MotorCollection.insert` calls, and optionally
+            :meth:`MotorCollection.update` calls, are sent as one bulk write
         """
         if 'io_loop' in kwargs:
             io_loop = kwargs.pop('io_loop')
@@ -207,6 +283,21 @@ class AgnosticReplicaSetClient(AgnosticClientBase):
         :Parameters:
           - `io_loop` (optional): Special :class:`tornado.ioloop.IOLoop`
             instance to use instead of default
+          - `decode_executor` (optional): a
+            :class:`~asyncdb.decode.DecodeExecutor`; replies larger than its
+            threshold are decoded on its executor instead of the event loop
+          - `single_flight` (optional): if True, concurrent identical
+            :meth:`MotorCollection.find_one` calls share one query; see
+            :class:`~asyncdb.coalesce.SingleFlight`, the client's
+            ``single_flight`` attribute, for hit counts
+          - `result_cache` (optional): a
+            :class:`~asyncdb.cache.ResultCache` for the results of
+            :meth:`MotorCollection.find_one` and :meth:`MotorCursor.to_list`;
+            writes through a collection invalidate what it cached
+          - `write_batcher` (optional): a
+            :class:`~asyncdb.mongo.writes.WriteBatcher`; concurrent
+            :meth:`MotorCollection.insert` calls, and optionally
+            :meth:`MotorCollection.update` calls, are sent as one bulk write
         """
         if 'io_loop' in kwargs:
             io_loop = kwargs.pop('io_loop')
@@ -443,6 +534,102 @@ class AgnosticDatabase(AgnosticBase):
     def get_io_loop(self):
         return self.connection.get_io_loop()
 
+    def get_decode_executor(self):
+        return self.connection.get_decode_executor()
+
+    def get_single_flight(self):
+        return self.connection.get_single_flight()
+
+    def get_result_cache(self):
+        return self.connection.get_result_cache()
+
+    def get_write_batcher(self):
+        return self.connection.get_write_batcher()
+
+
+def _get_path(path, document):
+    # Documents may also be raw BSON or LazyDocuments, from a raw or lazy
+    # cursor.
+    if isinstance(document, bson.BSON):
+        document = document.decode()
+    for name in path:
+        if not isinstance(document, raw.Mapping):
+            return None
+        document = document.get(name)
+    return document
+
+
+def _split_ids(low, high, parts):
+    # Boundaries splitting [low, high] into `parts` ranges: even for
+    # integer _ids, by generation time for ObjectIds. Between two such
+    # _ids BSON's sort order has no other type, so the ranges cover all.
+    if isinstance(low, bool) or isinstance(high, bool):
+        return []
+    if isinstance(low, numbers.Integral) and isinstance(high, numbers.Integral):
+        step = max(1, (high - low + 1) // parts)
+        return list(range(low + step, high + 1, step))[:parts - 1]
+    if isinstance(low, bson.ObjectId) and isinstance(high, bson.ObjectId):
+        start = low.generation_time
+        step = (high.generation_time - start) // parts
+        if step < datetime.timedelta(seconds=1):
+            return []
+        return [bson.ObjectId.from_datetime(start + step * i)
+                for i in range(1, parts)]
+    return []
+
+
+def _bulk_result(future, ops):
+    # The result of a bulk write of `ops`, whether it raised BulkWriteError
+    # or not. If it raised anything else, none of them is known to have
+    # been applied, so each gets a write error.
+    try:
+        return future.result()
+    except pymongo.errors.BulkWriteError as exc:
+        return exc.details
+    except Exception as exc:
+        error = {'code': getattr(exc, 'code', None), 'errmsg': str(exc)}
+        return {'nModified': 0,
+                'writeErrors': [dict(error, index=index, op=op)
+                                for index, (_, op) in enumerate(ops)]}
+
+
+def _merge_bulk_results(results):
+    # Merge the (offset, result) of each part of a split bulk write, as
+    # PyMongo merges the results of the write commands of one.
+    merged = {'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0,
+              'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0,
+              'upserted': []}
+    for offset, result in results:
+        for name in ('nInserted', 'nUpserted', 'nMatched', 'nRemoved'):
+            merged[name] += result.get(name, 0)
+        # Left out by servers that can't count it; then so is the total.
+        if result.get('nModified') is not None and 'nModified' in merged:
+            merged['nModified'] += result['nModified']
+        else:
+            merged.pop('nModified', None)
+        for name in ('writeErrors', 'upserted'):
+            for document in result.get(name, ()):
+                document['index'] += offset
+                merged[name].append(document)
+        merged['writeConcernErrors'].extend(result.get('writeConcernErrors', ()))
+    merged['writeErrors'].sort(key=lambda error: error['index'])
+    merged['upserted'].sort(key=lambda upserted: upserted['index'])
+    return merged
+
+
+def _document_mode(kwargs):
+    # Pop the raw and lazy options of find() and aggregate(): the mongo.raw
+    # mode they ask for, or None to decode documents as usual.
+    as_raw = kwargs.pop('raw', False)
+    as_lazy = kwargs.pop('lazy', False)
+    if as_raw and as_lazy:
+        raise pymongo.errors.InvalidOperation("Pass raw or lazy, not both.")
+    if as_raw:
+        return raw.RAW
+    if as_lazy:
+        return raw.LAZY
+    return None
+
 
 class AgnosticCollection(AgnosticBase):
     __motor_class_name__ = 'MotorCollection'
@@ -451,25 +638,25 @@ class AgnosticCollection(AgnosticBase):
     create_index = AsyncCommand()
     drop_indexes = AsyncCommand()
     drop_index = AsyncCommand()
-    drop = AsyncCommand()
+    drop = AsyncCommand().invalidates()
     ensure_index = AsyncCommand()
     reindex = AsyncCommand()
-    rename = AsyncCommand()
-    find_and_modify = AsyncCommand()
+    rename = AsyncCommand().invalidates()
+    find_and_modify = AsyncCommand().invalidates()
     map_reduce = AsyncCommand().wrap(pymongo.database.Collection)
-    update = AsyncWrite()
-    insert = AsyncWrite()
-    remove = AsyncWrite()
-    save = AsyncWrite()
+    _update = AsyncWrite(attr_name='update').invalidates()
+    _insert = AsyncWrite(attr_name='insert').invalidates()
+    remove = AsyncWrite().invalidates()
+    save = AsyncWrite().invalidates()
     index_information = AsyncRead()
     count = AsyncRead()
     options = AsyncRead()
     group = AsyncRead()
     distinct = AsyncRead()
     inline_map_reduce = AsyncRead()
-    find_one = AsyncRead()
     full_name = ReadOnlyProperty()
 
+    _find_one = AsyncRead(attr_name='find_one')
     _async_aggregate = AsyncRead(attr_name='aggregate')
     __parallel_scan = AsyncRead(attr_name='parallel_scan')
 
@@ -499,6 +686,121 @@ class AgnosticCollection(AgnosticBase):
             "failing because no such method exists." %
             self.delegate.name)
 
+    def insert(self, *args, **kwargs):
+        """Insert a document or documents. Same parameters as for PyMongo's
+        :meth:`~pymongo.collection.Collection.insert`.
+
+        If the client was created with a ``write_batcher``, inserting one
+        document with no other options may be sent in a bulk write with
+        other inserts; see :class:`~asyncdb.mongo.writes.WriteBatcher`.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the ``_id`` or list of ``_id``\ s inserted.
+        """
+        callback = kwargs.pop('callback', None)
+        batcher = self.get_write_batcher()
+        if batcher is None or not batcher.accepts_insert(self, args, kwargs):
+            return self._insert(*args, callback=callback, **kwargs)
+
+        return self._framework.future_or_callback(
+            batcher.insert(self, args[0]), callback, self.get_io_loop())
+
+    def update(self, *args, **kwargs):
+        """Update a document or documents. Same parameters as for PyMongo's
+        :meth:`~pymongo.collection.Collection.update`.
+
+        If the client was created with a ``write_batcher`` that batches
+        updates, an update given only `upsert` and `multi` may be sent in a
+        bulk write, and resolves to a dict with only the ``upserted``
+        ``_id``, if any; see :class:`~asyncdb.mongo.writes.WriteBatcher`.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the server's reply.
+        """
+        callback = kwargs.pop('callback', None)
+        batcher = self.get_write_batcher()
+        if batcher is None or not batcher.accepts_update(self, args, kwargs):
+            return self._update(*args, callback=callback, **kwargs)
+
+        return self._framework.future_or_callback(
+            batcher.update(self, *args, **kwargs), callback, self.get_io_loop())
+
+    def find_one(self, *args, **kwargs):
+        """Get a single document from the database. Same parameters as for
+        PyMongo's :meth:`~pymongo.collection.Collection.find_one`.
+
+        If the client was created with a ``result_cache``, the result may
+        come from it. If it was created with ``single_flight=True``, a call
+        identical to one still in flight waits for that one's result
+        instead of querying the server again.
+
+        Pass ``raw=True`` or ``lazy=True`` to get the document as BSON or as
+        a :class:`~asyncdb.mongo.raw.LazyDocument`, as with :meth:`find`.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the document or ``None``.
+        """
+        find_one = self._find_one
+        if kwargs.get('raw') or kwargs.get('lazy'):
+            find_one = self._find_one_undecoded
+
+        result_cache = self.get_result_cache()
+        single_flight = self.get_single_flight()
+        key = None
+        if result_cache is not None or single_flight is not None:
+            key = self._find_one_key(args, kwargs)
+        if key is None:
+            return find_one(*args, **kwargs)
+
+        callback = kwargs.pop('callback', None)
+        find_one = functools.partial(find_one, *args, **kwargs)
+        if single_flight is not None:
+            find_one = functools.partial(single_flight.do, key, find_one)
+        if result_cache is not None:
+            future = result_cache.fetch(
+                ('find_one',) + key, frozenset([self.delegate.full_name]),
+                find_one, self.get_io_loop(), self._framework)
+        else:
+            future = find_one()
+        return self._framework.future_or_callback(
+            future, callback, self.get_io_loop())
+
+    def _find_one_undecoded(self, spec_or_id=None, *args, **kwargs):
+        # PyMongo's find_one decodes the reply; query through a MotorCursor.
+        callback = kwargs.pop('callback', None)
+        if spec_or_id is not None and not isinstance(spec_or_id, dict):
+            spec_or_id = {'_id': spec_or_id}
+        kwargs.pop('limit', None)
+
+        future = self._framework.get_future(self.get_io_loop())
+        retval = self._framework.future_or_callback(
+            future, callback, self.get_io_loop())
+
+        def got_list(to_list_future):
+            try:
+                documents = to_list_future.result()
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(documents[0] if documents else None)
+
+        cursor = self.find(spec_or_id, *args, **kwargs).limit(-1)
+        cursor.to_list(1).add_done_callback(got_list)
+        return retval
+
+    def _find_one_key(self, args, kwargs):
+        # Equal BSON means the same query; arguments BSON can't encode,
+        # like as_class, opt out of coalescing.
+        options = bson.son.SON(sorted(
+            (k, v) for k, v in kwargs.items() if k != 'callback'))
+        try:
+            query = bson.BSON.encode({'args': list(args), 'kwargs': options})
+        except (bson.errors.InvalidDocument, TypeError):
+            return None
+        return (self.delegate.full_name,
+                self.delegate.read_preference,
+                query)
+
     def find(self, *args, **kwargs):
         """Create a :class:`MotorCursor`. Same parameters as for
         PyMongo's :meth:`~pymongo.collection.Collection.find`.
@@ -508,15 +810,101 @@ class AgnosticCollection(AgnosticBase):
         :class:`MotorCursor` without performing any operations on the server.
         ``MotorCursor`` methods such as :meth:`~MotorCursor.to_list` or
         :meth:`~MotorCursor.count` perform actual operations.
+
+        With ``prefetch=True``, the cursor asks for its next batch as soon as
+        one arrives, so the server's latency overlaps with processing the
+        documents; see :attr:`MotorCursor.prefetch`.
+
+        With ``raw=True`` the cursor's documents are :class:`bson.BSON`,
+        the bytes the server sent, never decoded; with ``lazy=True`` they
+        are :class:`~asyncdb.mongo.raw.LazyDocument`, decoded when first
+        read. Either way the database's SON manipulators aren't applied.
+        See :attr:`MotorCursor.raw`.
         """
         if 'callback' in kwargs:
             raise pymongo.errors.InvalidOperation("Pass a callback to each, to_list, or count, not to find.")
 
+        prefetch = kwargs.pop('prefetch', False)
+        mode = _document_mode(kwargs)
         cursor = self.delegate.find(*args, **kwargs)
         cursor_class = create_class_with_framework(
             AgnosticCursor, self._framework, self.__module__)
 
-        return cursor_class(cursor, self)
+        return cursor_class(cursor, self, prefetch, mode)
+
+    def paginate(self, spec=None, sort=None, page_size=paging.DEFAULT_PAGE_SIZE,
+                 after=None, fields=None, callback=None):
+        """Get a page of the documents matching `spec`, in `sort` order.
+
+        Rather than skip the pages before it, which the server must walk
+        through, a page is found by the sort key values of the last
+        document of the page before: pass the previous page's ``next``
+        token as `after`. With an index on the sort keys each page costs
+        the same however deep::
+
+            page = yield db.events.paginate({'user': user_id},
+                                            [('created', -1)], 50)
+            while page.next:
+                page = yield db.events.paginate({'user': user_id},
+                                                [('created', -1)], 50,
+                                                after=page.next)
+
+        `sort` is a key or a list of (key, direction) pairs, as for
+        :meth:`MotorCursor.sort`; ``_id`` is added as the last key to
+        break ties. Every document must have every sort key, and `fields`
+        must include them. A token is only valid for the same `sort`.
+
+        Takes an optional callback, or returns a Future that resolves to
+        a :class:`~asyncdb.mongo.paging.Page`.
+        """
+        keys = paging.sort_keys(sort)
+        if after is not None:
+            spec = paging.after_spec(spec, keys, paging.parse_token(after, keys))
+
+        io_loop = self.get_io_loop()
+        future = self._framework.get_future(io_loop)
+        retval = self._framework.future_or_callback(future, callback, io_loop)
+
+        def got_list(to_list_future):
+            try:
+                documents = to_list_future.result()
+                next_token = None
+                if len(documents) > page_size:
+                    del documents[page_size:]
+                    next_token = paging.token(
+                        keys, paging.values_of(documents[-1], keys))
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(paging.Page(documents, next_token))
+
+        # One document past the page tells whether there's another.
+        cursor = self.find(spec, fields).sort(keys).limit(page_size + 1)
+        cursor.to_list(page_size + 1).add_done_callback(got_list)
+        return retval
+
+    def loader(self, key='_id', max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+               cache=True, **kwargs):
+        """A :class:`~asyncdb.batch.BatchLoader` of documents by `key`.
+
+        Lookups made in the same pass of the event loop are sent as one
+        ``find({key: {'$in': [...]}})``; `kwargs` are passed on to
+        :meth:`find`. `key` should be unique, a dotted path is fine::
+
+            loader = db.users.loader()
+            user, friend = yield [loader.load(user_id), loader.load(friend_id)]
+            friends = yield loader.load_many(user['friend_ids'])
+
+        Documents missing from the collection load as ``None``. With
+        `cache`, the loader remembers every document it loaded; make one
+        per request.
+        """
+        def fetch(keys):
+            return self.find({key: {'$in': keys}}, **kwargs).to_list(None)
+
+        return BatchLoader(self.get_io_loop(), self._framework, fetch,
+                           functools.partial(_get_path, key.split('.')),
+                           max_batch_size, cache)
 
     def aggregate(self, pipeline, **kwargs):
         """Execute an aggregation pipeline on this collection.
@@ -554,6 +942,9 @@ class AgnosticCollection(AgnosticBase):
           for doc in reply['results']:
               print(doc)
 
+        Pass ``prefetch=True`` to read ahead one batch, and ``raw=True`` or
+        ``lazy=True`` for undecoded documents, as with :meth:`find`.
+
         .. versionchanged:: 0.5
            `aggregate` now returns a cursor by default, and the cursor is
            returned immediately without a ``yield``.
@@ -568,6 +959,8 @@ class AgnosticCollection(AgnosticBase):
         """
         if kwargs.get('cursor') is False:
             kwargs.pop('cursor')
+            kwargs.pop('prefetch', None)
+            _document_mode(kwargs)
             # One-shot aggregation, no cursor. Send command now, return Future.
             return self._async_aggregate(pipeline, **kwargs)
         else:
@@ -613,6 +1006,10 @@ class AgnosticCollection(AgnosticBase):
 
         :Parameters:
           - `num_cursors`: the number of cursors to return
+          - `prefetch` (optional): whether the cursors read ahead one batch,
+            as with :meth:`find`
+          - `raw`, `lazy` (optional): undecoded documents, as with
+            :meth:`find`
 
         .. note:: Requires server version **>= 2.5.5**.
         """
@@ -625,12 +1022,62 @@ class AgnosticCollection(AgnosticBase):
 
         # Once we have PyMongo Cursors, wrap in MotorCursors and resolve the
         # future with them, or pass them to the callback.
-        scan_callback = functools.partial(self._scan_callback, future)
+        scan_callback = functools.partial(self._scan_callback, future,
+                                          kwargs.pop('prefetch', False),
+                                          _document_mode(kwargs))
         self.__parallel_scan(num_cursors, callback=scan_callback, **kwargs)
 
         return retval
 
-    def _scan_callback(self, future, command_cursors, error):
+    def scan_parallel(self, num_cursors=4, concurrency=None, prefetch=False,
+                      spec=None, fields=None, batch_size=None,
+                      max_buffered=DEFAULT_SCAN_MAX_BUFFERED,
+                      retries=DEFAULT_SCAN_RETRIES, boundaries=None):
+        """Read this collection, or the documents matching `spec`, over
+        several cursors at once, merged into one.
+
+        The range of ``_id`` is split into `num_cursors` ranges: evenly
+        between its least and greatest value for integer or ObjectId
+        ``_id``, else at the sorted `boundaries` given. `concurrency`
+        cursors, all of them by default, each read one range at a time
+        in ``_id`` order, `batch_size` documents a batch, reading ahead
+        one batch with `prefetch`. They stop while `max_buffered` documents
+        or more wait to be consumed, so memory stays bounded, by about
+        `max_buffered` plus a batch per cursor, however big the
+        collection.
+
+        A cursor that dies, e.g. with :exc:`~pymongo.errors.AutoReconnect`
+        or :exc:`~pymongo.errors.CursorNotFound`, is reopened after the
+        last ``_id`` it read, up to `retries` times for its range, without
+        disturbing the others; :attr:`MotorCollectionScan.restarts` counts
+        this.
+
+        Returns a :class:`MotorCollectionScan` of batches, lists of
+        documents in no particular order across ranges, iterated like a
+        :class:`MotorCursor`::
+
+            scan = collection.scan_parallel(8, concurrency=4)
+            while (yield scan.fetch_next):
+                export(scan.next_object())
+
+        or in Python 3.5 and newer with ``async for``.
+
+        Unlike :meth:`parallel_scan` this needs no special server support.
+        The server's parallelCollectionScan cursors can't be reopened
+        where they died, ranges of ``_id`` can.
+        """
+        if isinstance(fields, dict) and not fields.get('_id', True):
+            raise pymongo.errors.InvalidOperation(
+                "scan_parallel() resumes after the last _id, don't exclude it.")
+
+        scan_class = create_class_with_framework(
+            AgnosticCollectionScan, self._framework, self.__module__)
+
+        return scan_class(self, num_cursors, concurrency or num_cursors,
+                          prefetch, spec, fields, batch_size, max_buffered,
+                          retries, boundaries)
+
+    def _scan_callback(self, future, prefetch, mode, command_cursors, error):
         if error:
             # TODO: exc_info.
             future.set_exception(error)
@@ -639,7 +1086,7 @@ class AgnosticCollection(AgnosticBase):
                 AgnosticCommandCursor, self._framework, self.__module__)
 
             motor_command_cursors = [
-                command_cursor_class(cursor, self)
+                command_cursor_class(cursor, self, prefetch, mode)
                 for cursor in command_cursors]
 
             future.set_result(motor_command_cursors)
@@ -699,6 +1146,24 @@ class AgnosticCollection(AgnosticBase):
     def get_io_loop(self):
         return self.database.get_io_loop()
 
+    def get_decode_executor(self):
+        return self.database.get_decode_executor()
+
+    def get_single_flight(self):
+        return self.database.get_single_flight()
+
+    def get_result_cache(self):
+        return self.database.get_result_cache()
+
+    def get_write_batcher(self):
+        return self.database.get_write_batcher()
+
+    def invalidate_cache(self):
+        """Drop results cached for this collection."""
+        result_cache = self.get_result_cache()
+        if result_cache is not None:
+            result_cache.invalidate(self.delegate.full_name)
+
 
 class AgnosticBaseCursor(AgnosticBase):
     """Base class for AgnosticCursor and AgnosticCommandCursor"""
@@ -707,7 +1172,7 @@ class AgnosticBaseCursor(AgnosticBase):
     alive = ReadOnlyProperty()
     batch_size = CursorChainingMethod()
 
-    def __init__(self, cursor, collection):
+    def __init__(self, cursor, collection, prefetch=False, raw=None):
         """Don't construct a cursor yourself, but acquire one from methods like
         :meth:`MotorCollection.find` or :meth:`MotorCollection.aggregate`.
 
@@ -724,6 +1189,25 @@ class AgnosticBaseCursor(AgnosticBase):
         self.started = False
         self.closed = False
 
+        # Whether to send the next getMore as soon as a batch arrives. PyMongo
+        # replaces its buffer with each batch, so the batch being consumed
+        # is moved to _held first. At most one getMore is ever outstanding.
+        self.prefetch = prefetch
+        self._held = collections.deque()
+        self._getting_more = None
+        self._awaited = False
+        self._failed = None
+
+        # An AdaptiveBatchSize, and the bytes of replies to this cursor's
+        # getMore since the last batch.
+        self.batch_sizer = None
+        self._reply_bytes = 0
+
+        # None, or the mongo.raw mode the documents are left in. Only this
+        # cursor's own queries and getMores are unpacked that way.
+        self.raw = raw
+        self._fetching = False
+
     if PY35:
         exec(textwrap.dedent("""
         async def __aiter__(self):
@@ -738,12 +1222,108 @@ class AgnosticBaseCursor(AgnosticBase):
 
     def _get_more(self):
         """Initial query or getMore. Returns a Future."""
+        if self._held:
+            future = self._framework.get_future(self.get_io_loop())
+            future.set_result(self._buffer_size())
+            return future
+
+        if self._failed is not None:
+            # A prefetch failed; report it now someone wants the batch.
+            future, self._failed = self._failed, None
+            return future
+
+        if self._getting_more is not None:
+            self._awaited = True
+            if self.batch_sizer is not None:
+                self.batch_sizer.waiting()
+            return self._getting_more
+
         if not self.alive:
             raise pymongo.errors.InvalidOperation(
                 "Can't call get_more() on a MotorCursor that has been exhausted or killed.")
 
+        if self.batch_sizer is not None:
+            self.batch_sizer.waiting()
+        future = self._fetch_batch()
         self.started = True
-        return self._refresh()
+        self._getting_more = future
+        future.add_done_callback(functools.partial(self._got_more, False))
+        return future
+
+    def _fetch_batch(self):
+        self._fetching = True
+        try:
+            return self._refresh()
+        finally:
+            self._fetching = False
+
+    def _more(self):
+        # Whether _get_more() has anything to return, a failure included.
+        return self.alive or self._failed is not None
+
+    def _got_more(self, prefetched, future):
+        if self._getting_more is future:
+            self._getting_more = None
+        if future.exception() is not None:
+            if prefetched and not self._awaited:
+                self._failed = future
+            return
+
+        if self.batch_sizer is not None:
+            arrived = len(self._data())
+            self._set_batch_size(self.batch_sizer.arrived(
+                arrived, self._reply_bytes, self._buffer_size() - arrived))
+            self._reply_bytes = 0
+        if self.prefetch:
+            # After whoever waited for this batch has taken from it.
+            self._framework.call_soon(self.get_io_loop(), self._prefetch)
+
+    def _reply_handler(self):
+        # Called as a method starts; see mongo.response.
+        if self._fetching and (self.raw is not None
+                               or self.batch_sizer is not None):
+            return self._on_reply
+        return None
+
+    def _on_reply(self, size):
+        if self.batch_sizer is not None:
+            self._reply_bytes += size
+        return self.raw
+
+    def adaptive_batch_size(self, target_bytes=DEFAULT_TARGET_BYTES,
+                            target_latency=DEFAULT_TARGET_LATENCY,
+                            min_size=DEFAULT_MIN_SIZE, max_size=DEFAULT_MAX_SIZE):
+        """Choose each getMore's batch size from the batches so far.
+
+        Batches are sized to be about `target_bytes` of BSON, by the
+        average size of the documents received, but no more than the
+        consumer goes through in `target_latency` seconds, by how fast it
+        has taken documents when not waiting for the server. The size stays
+        within `min_size` and `max_size` documents, and at most doubles
+        from one batch to the next. The first batch is the one set with
+        :meth:`batch_size`, or the server's default.
+
+        Returns this cursor, like :meth:`batch_size`, which it overrides
+        after the first batch. The sizer is :attr:`batch_sizer`.
+        """
+        self.batch_sizer = AdaptiveBatchSize(target_bytes, target_latency,
+                                             min_size, max_size)
+        return self
+
+    def _prefetch(self):
+        if (self.closed or self._getting_more is not None or self._held
+                or self._failed is not None or not self.cursor_id
+                or not self.alive
+                or self._query_flags() & pymongo.cursor._QUERY_OPTIONS['exhaust']):
+            return
+
+        data = self._data()
+        self._held.extend(data)
+        data.clear()
+        future = self._fetch_batch()
+        self._getting_more = future
+        self._awaited = False
+        future.add_done_callback(functools.partial(self._got_more, True))
 
     @property
     def fetch_next(self):
@@ -760,7 +1340,7 @@ class AgnosticBaseCursor(AgnosticBase):
         In Python 3.5 and newer, cursors can be iterated elegantly and very
         efficiently in native coroutines with `async for`:
         """
-        if not self._buffer_size() and self.alive:
+        if not self._buffer_size() and self._more():
             # Return the Future, which resolves to number of docs fetched or 0.
             return self._get_more()
         elif self._buffer_size():
@@ -779,8 +1359,23 @@ class AgnosticBaseCursor(AgnosticBase):
         """
         if not self._buffer_size():
             return None
+        if self._held:
+            return self._fix_outgoing(self._held.popleft())
+        if self.raw is not None:
+            return self._data().popleft()
         return next(self.delegate)
 
+    def next_batch(self):
+        """Get all the documents fetched and not yet consumed, as a list,
+        which is empty if there are none. See :attr:`fetch_next`.
+
+        With ``raw=True`` the list is of BSON documents, and
+        ``b''.join(batch)`` is ready to send on as is.
+        """
+        batch = []
+        self._take(self._buffer_size(), batch)
+        return batch
+
     def each(self, callback):
         """Iterates over all the documents for this cursor.
 
@@ -813,7 +1408,7 @@ class AgnosticBaseCursor(AgnosticBase):
                 return
 
         while self._buffer_size() > 0:
-            doc = next(self.delegate)  # decrements self.buffer_size
+            doc = self.next_object()  # decrements self.buffer_size
 
             # Quit if callback returns exactly False (not None). Note we
             # don't close the cursor: user may want to resume iteration.
@@ -824,7 +1419,7 @@ class AgnosticBaseCursor(AgnosticBase):
             if self.closed:
                 return
 
-        if self.alive and (self.cursor_id or not self.started):
+        if self._failed is not None or (self.alive and (self.cursor_id or not self.started)):
             self._get_more().add_done_callback(
                 functools.partial(self._each_got_more, callback))
         else:
@@ -833,6 +1428,90 @@ class AgnosticBaseCursor(AgnosticBase):
                 self.get_io_loop(),
                 functools.partial(callback, None, None))
 
+    def each_batch(self, callback):
+        """Like :meth:`each`, but `callback` is passed each batch the
+        cursor fetches, as a list, and ``(None, None)`` at the end. See
+        :meth:`next_batch`.
+
+        Cancel iteration early by returning ``False`` from the callback.
+
+        :Parameters:
+         - `callback`: function taking (documents, error)
+        """
+        if not callable(callback):
+            raise CallbackTypeError()
+
+        self._each_batch_got_more(callback, None)
+
+    def _each_batch_got_more(self, callback, future):
+        if future:
+            try:
+                future.result()
+            except Exception as error:
+                callback(None, error)
+                return
+
+        if self._buffer_size():
+            if callback(self.next_batch(), None) is False:
+                return
+
+            if self.closed:
+                return
+
+        if self._failed is not None or (self.alive and (self.cursor_id or not self.started)):
+            self._get_more().add_done_callback(
+                functools.partial(self._each_batch_got_more, callback))
+        else:
+            self._framework.call_soon(
+                self.get_io_loop(),
+                functools.partial(callback, None, None))
+
+    def batches(self):
+        """Iterate this cursor a batch at a time, in a native coroutine::
+
+            async for batch in collection.find().batches():
+                process(batch)
+
+        Each batch is a list, as from :meth:`next_batch`. With
+        ``gen.coroutine``, do::
+
+            while (yield cursor.fetch_next):
+                process(cursor.next_batch())
+        """
+        return _CursorBatches(self)
+
+    def map_concurrent(self, function, concurrency=DEFAULT_MAP_CONCURRENCY,
+                       ordered=False, on_result=None, callback=None):
+        """Call ``function(document)`` for each document, several at once::
+
+            @gen.coroutine
+            def enrich(user):
+                user['orders'] = yield db.orders.find(
+                    {'user_id': user['_id']}).to_list(None)
+                raise gen.Return(user)
+
+            users = yield db.users.find().map_concurrent(enrich, 16)
+
+        `function` must return a Future, e.g. be a ``gen.coroutine``. At
+        most `concurrency` calls run at once, and the cursor is only read
+        when there's room for another, so it's never read ahead of the
+        results. With `ordered`, results keep the cursor's order; otherwise
+        they're in the order they finish.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the list of results, or if `on_result` is given, to the number of
+        documents: each result is passed to `on_result` as it comes instead of
+        being kept. The first error stops the map and is raised; calls
+        already running are left to finish.
+        """
+        io_loop = self.get_io_loop()
+        mapper = ConcurrentMap(io_loop, self._framework, self, function,
+                               concurrency, ordered, on_result)
+        retval = self._framework.future_or_callback(
+            mapper.future, callback, io_loop)
+        mapper.start()
+        return retval
+
     def to_list(self, length, callback=None):
         """Get a list of documents.
 
@@ -857,12 +1536,33 @@ class AgnosticBaseCursor(AgnosticBase):
         if self._query_flags() & pymongo.cursor._QUERY_OPTIONS['tailable_cursor']:
             raise pymongo.errors.InvalidOperation("Can't call to_list on tailable cursor")
 
+        result_cache = self.get_result_cache()
+        key = None
+        if result_cache is not None and not self.started:
+            key = self._cache_key(length)
+        if key is not None:
+            # Load from a clone, so this cursor is left unstarted.
+            future = result_cache.fetch(
+                key, frozenset([self.collection.delegate.full_name]),
+                functools.partial(self.clone()._to_list_future, length),
+                self.get_io_loop(), self._framework)
+            return self._framework.future_or_callback(
+                future, callback, self.get_io_loop())
+
         to_list_future = self._framework.get_future(self.get_io_loop())
 
         # Run future_or_callback's type checking before we change anything.
         retval = self._framework.future_or_callback(to_list_future, callback, self.get_io_loop())
+        self._start_to_list(length, to_list_future)
+        return retval
 
-        if not self.alive:
+    def _to_list_future(self, length):
+        to_list_future = self._framework.get_future(self.get_io_loop())
+        self._start_to_list(length, to_list_future)
+        return to_list_future
+
+    def _start_to_list(self, length, to_list_future):
+        if not self._buffer_size() and not self._more():
             to_list_future.set_result([])
         else:
             the_list = []
@@ -872,27 +1572,20 @@ class AgnosticBaseCursor(AgnosticBase):
                                   the_list,
                                   to_list_future))
 
-        return retval
-
     def _to_list(self, length, the_list, to_list_future, get_more_result):
         # get_more_result is the result of self._get_more().
         # to_list_future will be the result of the user's to_list() call.
         try:
-            result = get_more_result.result()
-            collection = self.collection
-            fix_outgoing = collection.database.delegate._fix_outgoing
-
+            get_more_result.result()
+            result = self._buffer_size()
             if length is None:
                 n = result
             else:
                 n = min(length, result)
-
-            for _ in range(n):
-                the_list.append(fix_outgoing(self._data().popleft(),
-                                             collection))
+            self._take(n, the_list)
 
             reached_length = (length is not None and len(the_list) >= length)
-            if reached_length or not self.alive:
+            if reached_length or not self._more():
                 to_list_future.set_result(the_list)
             else:
                 self._get_more().add_done_callback(
@@ -904,9 +1597,34 @@ class AgnosticBaseCursor(AgnosticBase):
             # TODO: lost exc_info
             to_list_future.set_exception(exc)
 
+    def _take(self, n, the_list):
+        # Move n buffered documents to the_list. Batches held back by
+        # prefetching come first.
+        collection = self.collection
+        database = collection.database.delegate
+        for data in (self._held, self._data()):
+            count = min(n, len(data))
+            n -= count
+            if self.raw is None and (database.outgoing_manipulators
+                                     or database.outgoing_copying_manipulators):
+                for _ in range(count):
+                    the_list.append(database._fix_outgoing(data.popleft(),
+                                                           collection))
+            elif count and count == len(data):
+                the_list.extend(data)
+                data.clear()
+            else:
+                the_list.extend(data.popleft() for _ in range(count))
+
     def get_io_loop(self):
         return self.collection.get_io_loop()
 
+    def get_decode_executor(self):
+        return self.collection.get_decode_executor()
+
+    def get_result_cache(self):
+        return self.collection.get_result_cache()
+
     @motor_coroutine
     def close(self):
         """Explicitly kill this cursor on the server. Call like (in Tornado)::
@@ -920,16 +1638,31 @@ class AgnosticBaseCursor(AgnosticBase):
         """
         if not self.closed:
             self.closed = True
+            self._held.clear()
+            if self._getting_more is not None:
+                # Let an outstanding getMore finish before killing the cursor.
+                try:
+                    yield self._framework.yieldable(self._getting_more)
+                except Exception:
+                    pass
             yield self._framework.yieldable(self._close())
 
     def _buffer_size(self):
-        return len(self._data())
+        return len(self._held) + len(self._data())
+
+    def _fix_outgoing(self, doc):
+        database = self.collection.database.delegate
+        if self.raw is None and (database.outgoing_manipulators
+                                 or database.outgoing_copying_manipulators):
+            return database._fix_outgoing(doc, self.collection)
+        return doc
 
     def __del__(self):
         # This MotorCursor is deleted on whatever greenlet does the last
         # decref, or (if it's referenced from a cycle) whichever is current
-        # when the GC kicks in. First, do a quick check whether the cursor
-        # is still alive on the server:
+        # when the GC kicks in. An outstanding getMore keeps it referenced,
+        # so none is running now. First, do a quick check whether the
+        # cursor is still alive on the server:
         if self.cursor_id and self.alive:
             client = self.collection.database.connection
             cursor_id = self.cursor_id
@@ -940,10 +1673,17 @@ class AgnosticBaseCursor(AgnosticBase):
             self._close_exhaust_cursor()
             client.kill_cursors([cursor_id])
 
+    def _cache_key(self, length):
+        # The key to cache to_list(length) under, or None not to cache it.
+        return None
+
     # Paper over some differences between PyMongo Cursor and CommandCursor.
     def _query_flags(self):
         raise NotImplementedError
 
+    def _set_batch_size(self, batch_size):
+        raise NotImplementedError
+
     def _data(self):
         raise NotImplementedError
 
@@ -983,21 +1723,89 @@ class AgnosticCursor(AgnosticBaseCursor):
         """Rewind this cursor to its unevaluated state."""
         self.delegate.rewind()
         self.started = False
+        self._held.clear()
+        self._failed = None
         return self
 
     def clone(self):
         """Get a clone of this cursor."""
-        return self.__class__(self.delegate.clone(), self.collection)
+        return self._with_delegate(self.delegate.clone())
+
+    def tail(self, resume_key='_id', await_data=True,
+             min_delay=DEFAULT_TAIL_MIN_DELAY, max_delay=DEFAULT_TAIL_MAX_DELAY):
+        """Follow this query on a capped collection as documents are
+        inserted, like ``tail -f``::
+
+            async for document in db.log.find({'level': 'error'}).tail():
+                alert(document)
+
+        or with ``gen.coroutine``::
+
+            tail = db.log.find().tail()
+            while (yield tail.fetch_next):
+                alert(tail.next_object())
+
+        A clone of this cursor is made tailable, and with `await_data` the
+        server holds each getMore a while for new documents. As long as
+        documents come, the next getMore is sent as soon as a batch is
+        consumed. While none do, the tail waits before asking again, from
+        `min_delay` seconds doubling up to `max_delay`.
+
+        If the cursor dies, because the collection was empty or the cursor
+        fell behind the capped collection's end or the connection was lost,
+        the query is run again for documents whose `resume_key` is greater
+        than the last one's, e.g. ``'ts'`` on the oplog.
+
+        Iteration only stops once the tail's ``close()`` is called.
+        """
+        options = pymongo.cursor._QUERY_OPTIONS['tailable_cursor']
+        if await_data:
+            options |= pymongo.cursor._QUERY_OPTIONS['await_data']
+        return _CursorTail(self.clone().add_option(options), resume_key,
+                           min_delay, max_delay)
 
     def __copy__(self):
-        return self.__class__(self.delegate.__copy__(), self.collection)
+        return self._with_delegate(self.delegate.__copy__())
 
     def __deepcopy__(self, memo):
-        return self.__class__(self.delegate.__deepcopy__(memo), self.collection)
+        return self._with_delegate(self.delegate.__deepcopy__(memo))
+
+    def _with_delegate(self, delegate):
+        cursor = self.__class__(delegate, self.collection, self.prefetch,
+                                self.raw)
+        if self.batch_sizer is not None:
+            cursor.batch_sizer = self.batch_sizer.clone()
+        return cursor
+
+    def _cache_key(self, length):
+        cursor = self.delegate
+        if cursor._Cursor__exhaust or cursor._Cursor__explain:
+            return None
+        try:
+            query = bson.BSON.encode({
+                'spec': cursor._Cursor__query_spec(),
+                'fields': cursor._Cursor__fields,
+                'skip': cursor._Cursor__skip,
+                'limit': cursor._Cursor__limit,
+                'batch_size': cursor._Cursor__batch_size,
+                'flags': cursor._Cursor__query_flags,
+                'length': length})
+        except (bson.errors.InvalidDocument, TypeError):
+            return None
+        return ('find',
+                self.collection.delegate.full_name,
+                cursor._Cursor__read_preference,
+                cursor._Cursor__as_class,
+                self.raw,
+                query)
 
     def _query_flags(self):
         return self.delegate._Cursor__query_flags
 
+    def _set_batch_size(self, batch_size):
+        # Cursor.batch_size() refuses once the query has been sent.
+        self.delegate._Cursor__batch_size = batch_size
+
     def _data(self):
         return self.delegate._Cursor__data
 
@@ -1029,6 +1837,9 @@ class AgnosticCommandCursor(AgnosticBaseCursor):
     def _query_flags(self):
         return 0
 
+    def _set_batch_size(self, batch_size):
+        self.delegate._CommandCursor__batch_size = batch_size
+
     def _data(self):
         return self.delegate._CommandCursor__data
 
@@ -1044,6 +1855,162 @@ class AgnosticCommandCursor(AgnosticBaseCursor):
         yield self._framework.yieldable(self._CommandCursor__die())
 
 
+class _CursorBatches(object):
+    """The batches of a cursor; see :meth:`AgnosticBaseCursor.batches`."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    if PY35:
+        exec(textwrap.dedent("""
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            cursor = self.cursor
+            if cursor._buffer_size() or await cursor.fetch_next:
+                return cursor.next_batch()
+            raise StopAsyncIteration()
+        """), globals(), locals())
+
+
+class _CursorTail(object):
+    """A tailable cursor, reopened when it dies; see
+    :meth:`AgnosticCursor.tail`."""
+
+    def __init__(self, template, resume_key, min_delay, max_delay):
+        self._template = template
+        self._framework = template._framework
+        self.resume_key = resume_key
+        self._path = resume_key.split('.')
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self.cursor = None
+        self.closed = False
+        # The resume_key of the last document, and cursors reopened.
+        self.last = None
+        self.restarts = 0
+        self._delay = 0
+        self._waiter = None
+        self._timeout = None
+
+    if PY35:
+        exec(textwrap.dedent("""
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if await self.fetch_next:
+                return self.next_object()
+            raise StopAsyncIteration()
+        """), globals(), locals())
+
+    @property
+    def fetch_next(self):
+        """A Future that resolves to True once :meth:`next_object` has a
+        document to return, and to False once the tail is closed."""
+        if self._waiter is not None:
+            return self._waiter
+        future = self._framework.get_future(self.get_io_loop())
+        if self.cursor is not None and self.cursor._buffer_size():
+            future.set_result(True)
+        elif self.closed:
+            future.set_result(False)
+        else:
+            self._waiter = future
+            self._poll()
+        return future
+
+    def next_object(self):
+        """The next document, or None if :attr:`fetch_next` hasn't said
+        there is one."""
+        if self.cursor is None or not self.cursor._buffer_size():
+            return None
+        document = self.cursor.next_object()
+        value = _get_path(self._path, document)
+        if value is not None:
+            self.last = value
+        return document
+
+    def close(self):
+        """Stop tailing. Returns a Future that resolves once the cursor is
+        closed on the server."""
+        self.closed = True
+        if self._timeout is not None:
+            self._framework.call_later_cancel(self.get_io_loop(), self._timeout)
+            self._timeout = None
+        self._resolve(False)
+        if self.cursor is not None:
+            return self.cursor.close()
+        future = self._framework.get_future(self.get_io_loop())
+        future.set_result(None)
+        return future
+
+    def _open(self):
+        cursor = self._template.clone()
+        if self.last is not None:
+            delegate = cursor.delegate
+            spec = delegate._Cursor__spec
+            after = {self.resume_key: {'$gt': self.last}}
+            delegate._Cursor__spec = {'$and': [spec, after]} if spec else after
+        return cursor
+
+    def _poll(self):
+        self._timeout = None
+        if self.closed:
+            return
+        if self.cursor is None or not self.cursor.alive:
+            if self.cursor is not None:
+                self.restarts += 1
+            self.cursor = self._open()
+        try:
+            polled = self.cursor._get_more()
+        except Exception as exc:
+            self._fail(exc)
+            return
+        polled.add_done_callback(self._polled)
+
+    def _polled(self, polled):
+        if self.closed:
+            return
+        try:
+            polled.result()
+        except _RESTARTABLE:
+            # Reopened on the next poll.
+            self.cursor = None
+            self.restarts += 1
+            self._wait()
+            return
+        except Exception as exc:
+            self._fail(exc)
+            return
+
+        if self.cursor._buffer_size():
+            self._delay = 0
+            self._resolve(True)
+        else:
+            self._wait()
+
+    def _wait(self):
+        self._delay = min(self.max_delay, max(self.min_delay, 2 * self._delay))
+        self._timeout = self._framework.call_later(
+            self.get_io_loop(), self._delay, self._poll)
+
+    def _resolve(self, result):
+        waiter, self._waiter = self._waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(result)
+
+    def _fail(self, exc):
+        waiter, self._waiter = self._waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(exc)
+
+    def get_io_loop(self):
+        return self._template.get_io_loop()
+
+
 class _LatentCursor(object):
     """Take the place of a PyMongo CommandCursor until aggregate() begins."""
     alive = True
@@ -1070,11 +2037,14 @@ class AgnosticAggregationCursor(AgnosticCommandCursor):
         # ... so we can't send the "aggregate" command to the server and get
         # a PyMongo CommandCursor back yet. Set self.delegate to a latent
         # cursor until the first yield or await triggers _get_more().
-        super(self.__class__, self).__init__(_LatentCursor(), collection)
+        prefetch = kwargs.pop('prefetch', False)
+        mode = _document_mode(kwargs)
+        super(self.__class__, self).__init__(_LatentCursor(), collection,
+                                             prefetch, mode)
         self.pipeline = pipeline
         self.kwargs = kwargs
 
-    def _get_more(self):
+    def _fetch_batch(self):
         if not self.started:
             self.started = True
             future = self._framework.get_future(self.get_io_loop())
@@ -1085,12 +2055,18 @@ class AgnosticAggregationCursor(AgnosticCommandCursor):
 
             return future
 
-        return super(self.__class__, self)._get_more()
+        return super(self.__class__, self)._fetch_batch()
 
     def _on_get_more(self, future, result, error):
         if result:
             # "result" is a CommandCursor from PyMongo's aggregate().
             self.delegate = result
+            if self.raw is not None:
+                # The first batch came decoded, inside the command's reply.
+                data = result._CommandCursor__data
+                documents = raw.convert(data, self.raw)
+                data.clear()
+                data.extend(documents)
 
             # _get_more is complete.
             future.set_result(len(result._CommandCursor__data))
@@ -1099,18 +2075,291 @@ class AgnosticAggregationCursor(AgnosticCommandCursor):
             future.set_exception(error)
 
 
+class AgnosticCollectionScan(AgnosticBase):
+    __motor_class_name__ = 'MotorCollectionScan'
+    __delegate_class__ = None
+
+    def __init__(self, collection, num_cursors, concurrency, prefetch, spec,
+                 fields, batch_size, max_buffered, retries, boundaries):
+        """Don't construct a scan yourself, call
+        :meth:`MotorCollection.scan_parallel`.
+        """
+        self.collection = collection
+        self.num_cursors = num_cursors
+        self.concurrency = concurrency
+        self.prefetch = prefetch
+        self.spec = spec or {}
+        self.fields = fields
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self.retries = retries
+        self.boundaries = boundaries
+
+        self.started = False
+        self.closed = False
+        # Cursors reopened after an error.
+        self.restarts = 0
+        self._ranges = collections.deque()
+        self._workers = 0
+        self._error = None
+        # Batches fetched and not yet consumed, and their documents.
+        self._buffer = collections.deque()
+        self._buffered = 0
+        self._waiters = []
+        self._room = []
+        super(self.__class__, self).__init__(None)
+
+    if PY35:
+        exec(textwrap.dedent("""
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if self._buffer or await self.fetch_next:
+                return self.next_object()
+            raise StopAsyncIteration()
+        """), globals(), locals())
+
+    @property
+    def fetch_next(self):
+        """A Future that resolves to True once :meth:`next_object` has a
+        batch to return, and to False at the end of the scan. Starts the
+        scan on first use."""
+        future = self._framework.get_future(self.get_io_loop())
+        if not self.started:
+            self.started = True
+            self._start()
+        if self._buffer:
+            future.set_result(True)
+        elif self._error is not None:
+            future.set_exception(self._error)
+        elif self._finished():
+            future.set_result(False)
+        else:
+            self._waiters.append(future)
+        return future
+
+    def next_object(self):
+        """The next batch, or None if :attr:`fetch_next` hasn't said there
+        is one."""
+        if not self._buffer:
+            return None
+        batch = self._buffer.popleft()
+        self._buffered -= len(batch)
+        self._wake(self._room)
+        return batch
+
+    def close(self):
+        """Stop the scan; each cursor is closed after the batch it's
+        reading."""
+        self.closed = True
+        self._ranges.clear()
+        self._buffer.clear()
+        self._buffered = 0
+        self._wake(self._room)
+        self._wake(self._waiters, False)
+
+    def _finished(self):
+        return self.closed or (self.started and not self._workers and not self._ranges)
+
+    def _wake(self, waiters, result=True):
+        waiting = list(waiters)
+        del waiters[:]
+        for future in waiting:
+            if not future.done():
+                future.set_result(result)
+
+    @motor_coroutine
+    def _start(self):
+        self._workers += 1
+        try:
+            boundaries = self.boundaries
+            if boundaries is None:
+                boundaries = []
+                ends = []
+                for direction in (pymongo.ASCENDING, pymongo.DESCENDING):
+                    cursor = self.collection.find({}, {'_id': True})
+                    documents = yield cursor.sort('_id', direction).limit(-1).to_list(1)
+                    ends.extend(document['_id'] for document in documents)
+                if len(ends) == 2:
+                    boundaries = _split_ids(ends[0], ends[1], self.num_cursors)
+            lows = [None] + list(boundaries)
+            highs = list(boundaries) + [None]
+            self._ranges.extend(zip(lows, highs))
+            for _ in range(min(self.concurrency, len(self._ranges))):
+                self._work()
+        except Exception as exc:
+            self._fail(exc)
+        finally:
+            self._worker_done()
+
+    def _cursor(self, low, high, after):
+        # The documents of [low, high) after `after`, in _id order.
+        condition = {}
+        if after is not None:
+            condition['$gt'] = after
+        elif low is not None:
+            condition['$gte'] = low
+        if high is not None:
+            condition['$lt'] = high
+        spec = self.spec
+        if condition:
+            spec = {'$and': [spec, {'_id': condition}]} if spec else {'_id': condition}
+        cursor = self.collection.find(spec, self.fields, prefetch=self.prefetch)
+        if self.batch_size:
+            cursor.batch_size(self.batch_size)
+        return cursor.sort('_id', pymongo.ASCENDING)
+
+    @motor_coroutine
+    def _work(self):
+        self._workers += 1
+        try:
+            while self._ranges and not self.closed and self._error is None:
+                low, high = self._ranges.popleft()
+                after = None
+                attempt = 0
+                while True:
+                    cursor = self._cursor(low, high, after)
+                    try:
+                        while True:
+                            if (self._buffered >= self.max_buffered
+                                    and not self.closed and self._error is None):
+                                room = self._framework.get_future(self.get_io_loop())
+                                self._room.append(room)
+                                yield room
+                                continue
+                            if self.closed or self._error is not None:
+                                yield self._framework.yieldable(cursor.close())
+                                break
+                            if not (yield cursor.fetch_next):
+                                break
+                            batch = cursor.next_batch()
+                            after = batch[-1]['_id']
+                            self._buffer.append(batch)
+                            self._buffered += len(batch)
+                            self._wake(self._waiters)
+                    except _RESTARTABLE:
+                        if attempt >= self.retries or self.closed:
+                            raise
+                        attempt += 1
+                        self.restarts += 1
+                        continue
+                    break
+        except Exception as exc:
+            self._fail(exc)
+        finally:
+            self._worker_done()
+
+    def _fail(self, exc):
+        if self._error is None:
+            self._error = exc
+        self._ranges.clear()
+        self._wake(self._room)
+        waiting = list(self._waiters)
+        del self._waiters[:]
+        for future in waiting:
+            if not future.done():
+                future.set_exception(exc)
+
+    def _worker_done(self):
+        self._workers -= 1
+        if self._finished() and not self._buffer:
+            self._wake(self._waiters, False)
+
+    def get_io_loop(self):
+        return self.collection.get_io_loop()
+
+
 class AgnosticBulkOperationBuilder(AgnosticBase):
     __motor_class_name__ = 'MotorBulkOperationBuilder'
     __delegate_class__ = pymongo.bulk.BulkOperationBuilder
 
     find = DelegateMethod()
     insert = DelegateMethod()
-    execute = AsyncCommand()
+    _execute = AsyncCommand(attr_name='execute').invalidates()
 
     def __init__(self, collection, ordered):
         self.io_loop = collection.get_io_loop()
+        self.collection = collection
         delegate = pymongo.bulk.BulkOperationBuilder(collection.delegate, ordered)
         super(self.__class__, self).__init__(delegate)
 
+    def execute(self, *args, **kwargs):
+        """Execute all provided operations. Same parameters as for
+        PyMongo's :meth:`~pymongo.bulk.BulkOperationBuilder.execute`.
+
+        An unordered bulk write is split into `concurrency` sub-batches,
+        or more if they'd be over the server's ``maxWriteBatchSize``
+        operations, but none smaller than ``MIN_BULK_SPLIT_SIZE``. Up to
+        `concurrency` of them run at once, each on its own socket. Their
+        results are merged into one, with each write error's and upsert's
+        ``index`` the one it had in the whole bulk. If a sub-batch fails
+        with another error, such as
+        :exc:`~pymongo.errors.AutoReconnect`, each of its operations gets a
+        write error with that error's ``errmsg`` and ``code``, and the
+        others' results are still merged; only if every sub-batch fails so
+        is the first such error raised as it is.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the result, or raises :exc:`~pymongo.errors.BulkWriteError` with
+        the merged result in its ``details``.
+        """
+        callback = kwargs.pop('callback', None)
+        concurrency = kwargs.pop('concurrency', DEFAULT_BULK_CONCURRENCY)
+        bulk = self.delegate._BulkOperationBuilder__bulk
+        size = self._split_size(len(bulk.ops), concurrency)
+        if bulk.ordered or bulk.executed or len(bulk.ops) <= size:
+            return self._execute(*args, callback=callback, **kwargs)
+
+        io_loop = self.get_io_loop()
+        future = self._framework.get_future(io_loop)
+        retval = self._framework.future_or_callback(future, callback, io_loop)
+        bulk.executed = True
+        limit = ConcurrencyLimit(io_loop, self._framework, concurrency)
+        offsets = range(0, len(bulk.ops), size)
+        part_ops = [bulk.ops[offset:offset + size] for offset in offsets]
+        parts = [limit.run(functools.partial(self._execute_part, ops, args, kwargs))
+                 for ops in part_ops]
+        results = []
+
+        def executed(part):
+            results.append(part)
+            if len(results) < len(parts):
+                return
+            errors = [part.exception() for part in parts]
+            if all(error is not None
+                   and not isinstance(error, pymongo.errors.BulkWriteError)
+                   for error in errors):
+                future.set_exception(errors[0])
+                return
+            try:
+                merged = _merge_bulk_results(zip(offsets, [
+                    _bulk_result(part, ops) for part, ops in zip(parts, part_ops)]))
+            except Exception as exc:
+                future.set_exception(exc)
+                return
+            if merged['writeErrors'] or merged['writeConcernErrors']:
+                future.set_exception(pymongo.errors.BulkWriteError(merged))
+            else:
+                future.set_result(merged)
+
+        for part in parts:
+            part.add_done_callback(executed)
+        return retval
+
+    def _split_size(self, count, concurrency):
+        # Operations per sub-batch of an unordered bulk write.
+        max_size = self.collection.database.connection.delegate.max_write_batch_size
+        size = max(MIN_BULK_SPLIT_SIZE, -(-count // max(1, concurrency)))
+        return min(size, max_size)
+
+    def _execute_part(self, ops, args, kwargs):
+        part = self.__class__(self.collection, ordered=False)
+        part.delegate._BulkOperationBuilder__bulk.ops = ops
+        return part._execute(*args, **kwargs)
+
     def get_io_loop(self):
         return self.io_loop
+
+    def invalidate_cache(self):
+        self.collection.invalidate_cache()
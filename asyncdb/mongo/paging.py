@@ -0,0 +1,104 @@
+"""Keyset pagination: paging through a sorted query by the last sort key
+values seen, rather than by skipping documents."""
+
+from __future__ import unicode_literals, absolute_import
+
+import base64
+
+import bson
+import bson.errors
+import pymongo
+
+from ..pycompat import string_types
+
+DEFAULT_PAGE_SIZE = 20
+
+
+class Page(object):
+    """A page of documents, and :attr:`next`, the token for the page after
+    it or None if it's the last."""
+
+    __slots__ = ('documents', 'next')
+
+    def __init__(self, documents, next):
+        self.documents = documents
+        self.next = next
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __getitem__(self, index):
+        return self.documents[index]
+
+    def __repr__(self):
+        return '%s(%d documents, next=%r)' % (
+            self.__class__.__name__, len(self.documents), self.next)
+
+
+def sort_keys(sort):
+    """`sort`, a key or a list of (key, direction) pairs, as a list of pairs
+    ending in ``_id`` so that no two documents tie."""
+    if sort is None:
+        keys = []
+    elif isinstance(sort, string_types):
+        keys = [(sort, pymongo.ASCENDING)]
+    else:
+        keys = [(key, direction) for key, direction in sort]
+    for key, direction in keys:
+        if direction not in (pymongo.ASCENDING, pymongo.DESCENDING):
+            raise ValueError('paginate() sorts ascending or descending, not '
+                             'by %r' % (direction,))
+    if '_id' not in [key for key, _ in keys]:
+        keys.append(('_id', keys[-1][1] if keys else pymongo.ASCENDING))
+    return keys
+
+
+def values_of(document, keys):
+    values = []
+    for key, _ in keys:
+        value = document
+        for name in key.split('.'):
+            if not isinstance(value, dict) or name not in value:
+                raise ValueError('paginate() needs every sort key in the '
+                                 'documents, %r has no %r' % (document.get('_id'), key))
+            value = value[name]
+        values.append(value)
+    return values
+
+
+def token(keys, values):
+    """An opaque token for the page after the document with sort key
+    `values`."""
+    data = bson.BSON.encode({'k': [[key, direction] for key, direction in keys],
+                             'v': values})
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def parse_token(after, keys):
+    """The sort key values in token `after`, which must be for `keys`."""
+    try:
+        data = bson.BSON(base64.urlsafe_b64decode(after.encode('ascii'))).decode()
+    except (TypeError, ValueError, bson.errors.InvalidBSON):
+        raise ValueError('invalid page token %r' % (after,))
+    if [tuple(pair) for pair in data.get('k', ())] != list(keys):
+        raise ValueError('page token %r is for another sort order' % (after,))
+    return data['v']
+
+
+def after_spec(spec, keys, values):
+    """`spec` narrowed to the documents sorted after `values`: those past
+    the first key's value, or equal to it and past the second's, and so
+    on."""
+    branches = []
+    for i, (key, direction) in enumerate(keys):
+        branch = dict((keys[j][0], values[j]) for j in range(i))
+        operator = '$gt' if direction == pymongo.ASCENDING else '$lt'
+        branch[key] = {operator: values[i]}
+        branches.append(branch)
+    predicate = branches[0] if len(branches) == 1 else {'$or': branches}
+    if spec:
+        return {'$and': [spec, predicate]}
+    return predicate
@@ -0,0 +1,99 @@
+"""Reading documents as undecoded BSON, or decoding them lazily."""
+
+from __future__ import unicode_literals, absolute_import
+
+import struct
+
+import bson
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# Document modes of a cursor: BSON bytes, or LazyDocuments.
+RAW = 'raw'
+LAZY = 'lazy'
+
+_unpack_length = struct.Struct('<i').unpack_from
+
+
+def split(data, start=0, end=None):
+    """The BSON documents laid end to end in `data`, as :class:`bson.BSON`
+    slices, without decoding them."""
+    if end is None:
+        end = len(data)
+    documents = []
+    while start < end:
+        size = _unpack_length(data, start)[0]
+        documents.append(bson.BSON(data[start:start + size]))
+        start += size
+    return documents
+
+
+class LazyDocument(Mapping):
+    """
+    A read-only document that decodes its BSON the first time a field is
+    read. :attr:`raw` is the BSON itself, for passing on as is.
+    """
+
+    __slots__ = ('_raw', '_document', '_options')
+
+    def __init__(self, raw, as_class=dict, tz_aware=False,
+                 uuid_subtype=bson.OLD_UUID_SUBTYPE, compile_re=True):
+        self._raw = raw
+        self._document = None
+        self._options = (as_class, tz_aware, uuid_subtype, compile_re)
+
+    @classmethod
+    def from_document(cls, document):
+        """A LazyDocument of an already decoded `document`; its BSON is
+        encoded if asked for."""
+        lazy = cls(None)
+        lazy._document = document
+        return lazy
+
+    @property
+    def raw(self):
+        if self._raw is None:
+            self._raw = bson.BSON.encode(self._document)
+        return self._raw
+
+    @property
+    def document(self):
+        """The decoded document."""
+        if self._document is None:
+            self._document = bson.BSON(self._raw).decode(*self._options)
+        return self._document
+
+    def __getitem__(self, key):
+        return self.document[key]
+
+    def __iter__(self):
+        return iter(self.document)
+
+    def __len__(self):
+        return len(self.document)
+
+    def __repr__(self):
+        if self._document is None:
+            return '%s(<%d bytes>)' % (self.__class__.__name__, len(self._raw))
+        return '%s(%r)' % (self.__class__.__name__, self._document)
+
+
+def unpack(data, mode, start, end, as_class=dict, tz_aware=False,
+           uuid_subtype=bson.OLD_UUID_SUBTYPE, compile_re=True):
+    """The documents in `data` as `mode` wants them."""
+    documents = split(data, start, end)
+    if mode == LAZY:
+        documents = [LazyDocument(document, as_class, tz_aware, uuid_subtype,
+                                  compile_re)
+                     for document in documents]
+    return documents
+
+
+def convert(documents, mode):
+    """Already decoded `documents` as `mode` wants them."""
+    if mode == LAZY:
+        return [LazyDocument.from_document(document) for document in documents]
+    return [bson.BSON.encode(document) for document in documents]
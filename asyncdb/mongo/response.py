@@ -0,0 +1,114 @@
+"""Decoding OP_REPLY messages on a DecodeExecutor."""
+
+from __future__ import unicode_literals, absolute_import
+
+import struct
+
+import bson
+import greenlet
+from pymongo import helpers
+
+from . import raw
+
+# PyMongo's own, before install() replaces it.
+_unpack_response = helpers._unpack_response
+
+# Decode a batch this many bytes at a time, so a decoder thread gives
+# the GIL back to the event loop in between.
+PIECE_SIZE = 256 * 1024
+
+_unpack_header = struct.Struct('<iqii').unpack_from
+_unpack_length = struct.Struct('<i').unpack_from
+
+
+def unpack_response(response, cursor_id=None, as_class=dict, tz_aware=False,
+                    uuid_subtype=bson.OLD_UUID_SUBTYPE, compile_re=True):
+    """Like PyMongo's helpers._unpack_response, piece by piece."""
+    flags, reply_cursor_id, starting_from, number_returned = _unpack_header(response)
+    if flags & 3:
+        # CursorNotFound or QueryFailure: let PyMongo raise it.
+        return _unpack_response(response, cursor_id, as_class, tz_aware,
+                                uuid_subtype, compile_re)
+
+    data = []
+    start = pos = 20
+    end = len(response)
+    while pos < end:
+        pos += _unpack_length(response, pos)[0]
+        if pos - start >= PIECE_SIZE or pos >= end:
+            data.extend(bson.decode_all(response[start:pos], as_class,
+                                        tz_aware, uuid_subtype, compile_re))
+            start = pos
+
+    assert len(data) == number_returned
+    return {'cursor_id': reply_cursor_id,
+            'starting_from': starting_from,
+            'number_returned': number_returned,
+            'data': data}
+
+
+def unpack_raw_response(response, mode, cursor_id=None, as_class=dict,
+                        tz_aware=False, uuid_subtype=bson.OLD_UUID_SUBTYPE,
+                        compile_re=True):
+    """Like PyMongo's helpers._unpack_response, but leaving the documents
+    as BSON or LazyDocuments; see mongo.raw."""
+    flags, reply_cursor_id, starting_from, number_returned = _unpack_header(response)
+    if flags & 3:
+        return _unpack_response(response, cursor_id, as_class, tz_aware,
+                                uuid_subtype, compile_re)
+
+    data = raw.unpack(response, mode, 20, len(response), as_class, tz_aware,
+                      uuid_subtype, compile_re)
+    assert len(data) == number_returned
+    return {'cursor_id': reply_cursor_id,
+            'starting_from': starting_from,
+            'number_returned': number_returned,
+            'data': data}
+
+
+def _unpack_response_off_loop(response, *args, **kwargs):
+    # Motor stamps its child greenlets with the client's decode executor,
+    # and a cursor's getMores with its reply handler; see meta.asynchronize.
+    # Cursors pass their cursor id and decoding options, while the
+    # client's own commands on the way, like isMaster while connecting,
+    # pass the reply alone and must get it decoded.
+    current = greenlet.getcurrent()
+    handler = getattr(current, 'reply_handler', None)
+    if handler is not None and args:
+        mode = handler(len(response))
+        if mode is not None:
+            # Splitting a reply into documents is cheap; no executor.
+            return unpack_raw_response(response, mode, *args, **kwargs)
+    context = getattr(current, 'decode_context', None)
+    if context is not None:
+        decoder, io_loop, framework = context
+        if decoder.should_offload(len(response)):
+            return decoder.run(io_loop, framework,
+                               unpack_response, response, *args, **kwargs)
+    return _unpack_response(response, *args, **kwargs)
+
+
+# Greenlets that need _unpack_response_off_loop running, or waiting.
+_installed = 0
+
+
+def install():
+    """Route PyMongo's reply decoding through _unpack_response_off_loop.
+
+    Counted: meta.asynchronize calls this as a greenlet stamped with a
+    decode executor or a reply handler starts, and :func:`uninstall` as it
+    ends, so PyMongo's own function is back whenever none is running.
+    Outside such a greenlet, PyMongo's function is called as before.
+    """
+    global _installed
+    _installed += 1
+    helpers._unpack_response = _unpack_response_off_loop
+
+
+def uninstall():
+    """Undo one :func:`install`; the last puts PyMongo's own reply decoding
+    back."""
+    global _installed
+    _installed -= 1
+    if not _installed:
+        helpers._unpack_response = _unpack_response
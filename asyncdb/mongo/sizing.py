@@ -0,0 +1,109 @@
+"""Choosing a cursor's getMore batch size from the batches it has seen."""
+
+from __future__ import unicode_literals, absolute_import
+
+import time
+
+DEFAULT_TARGET_BYTES = 1024 * 1024
+DEFAULT_TARGET_LATENCY = 0.1
+DEFAULT_MIN_SIZE = 10
+DEFAULT_MAX_SIZE = 10000
+
+# Weight of the newest observation in the running averages.
+_SMOOTHING = 0.5
+
+
+def _average(previous, value):
+    if previous is None:
+        return value
+    return previous + _SMOOTHING * (value - previous)
+
+
+class AdaptiveBatchSize(object):
+    """
+    Sizes batches to be about `target_bytes` of BSON, and no more than the
+    consumer gets through in `target_latency` seconds, within `min_size`
+    and `max_size` documents.
+
+    Tiny documents thus come in big batches, saving round trips, and big
+    documents or a slow consumer in small ones, so a batch doesn't hold
+    more memory than it's worth. A batch is at most twice the size of the
+    one before; shrinking is immediate.
+    """
+
+    def __init__(self, target_bytes=DEFAULT_TARGET_BYTES,
+                 target_latency=DEFAULT_TARGET_LATENCY,
+                 min_size=DEFAULT_MIN_SIZE, max_size=DEFAULT_MAX_SIZE):
+        if not 2 <= min_size <= max_size:
+            # PyMongo turns a batch size of 1 into 2.
+            raise ValueError('need 2 <= min_size <= max_size, not %r and %r'
+                             % (min_size, max_size))
+        self.target_bytes = target_bytes
+        self.target_latency = target_latency
+        self.min_size = min_size
+        self.max_size = max_size
+
+        # Running averages: BSON bytes per document, and documents the
+        # consumer takes per second it isn't waiting for the server.
+        self.document_bytes = None
+        self.rate = None
+        self.size = None
+
+        # Documents received, and since the last batch arrived, when that
+        # was, how many the consumer had taken, and how long it waited.
+        self.received = 0
+        self._arrived_at = None
+        self._taken = 0
+        self._waited = 0.0
+        self._waiting_since = None
+
+    def clone(self):
+        """A sizer with the same settings and nothing observed."""
+        return self.__class__(self.target_bytes, self.target_latency,
+                              self.min_size, self.max_size)
+
+    def waiting(self):
+        """The consumer is waiting for a batch."""
+        if self._waiting_since is None:
+            self._waiting_since = time.time()
+
+    def arrived(self, documents, size, buffered):
+        """A batch of `documents` documents in a `size` byte reply arrived,
+        with `buffered` documents of earlier batches not yet consumed.
+        Returns the size to ask for next."""
+        now = time.time()
+        if self._waiting_since is not None:
+            self._waited += now - self._waiting_since
+            self._waiting_since = None
+
+        self.observe_batch(documents, size)
+        taken = self.received - buffered
+        if self._arrived_at is not None:
+            self.observe_consumer(taken - self._taken,
+                                  now - self._arrived_at - self._waited)
+        self.received += documents
+        self._arrived_at, self._taken, self._waited = now, taken, 0.0
+        return self.next_size(self.size or documents)
+
+    def observe_batch(self, documents, size):
+        """A reply of `size` bytes brought `documents` documents."""
+        if documents and size:
+            self.document_bytes = _average(self.document_bytes,
+                                           float(size) / documents)
+
+    def observe_consumer(self, documents, seconds):
+        """The consumer took `documents` documents in `seconds` seconds."""
+        if documents and seconds > 0:
+            self.rate = _average(self.rate, documents / seconds)
+
+    def next_size(self, last_size):
+        """The batch size to ask for after a batch of `last_size`."""
+        size = self.max_size
+        if self.document_bytes:
+            size = min(size, self.target_bytes / self.document_bytes)
+        if self.rate:
+            size = min(size, self.rate * self.target_latency)
+        if last_size:
+            size = min(size, 2 * last_size)
+        self.size = int(max(self.min_size, min(self.max_size, size)))
+        return self.size
@@ -0,0 +1,225 @@
+"""Coalescing concurrent single-document writes into bulk writes."""
+
+from __future__ import unicode_literals, absolute_import
+
+import functools
+
+import pymongo.errors
+
+DEFAULT_MAX_BATCH_SIZE = 1000
+DEFAULT_MAX_DELAY = 0.0
+
+# Write error codes PyMongo raises DuplicateKeyError for.
+_DUPLICATE_KEY_ERRORS = (11000, 11001, 12582)
+
+# Options of update() a batched update may be given.
+_UPDATE_OPTIONS = frozenset(['upsert', 'multi'])
+
+
+class WriteBatcher(object):
+    """
+    Sends the single-document inserts, and with `updates` the updates,
+    made through a client's collections within `max_delay` seconds as one
+    unordered bulk write per collection, of at most `max_batch_size`
+    operations. With no delay, the writes of one pass of the event loop
+    are batched.
+
+    Each caller gets its own result or error: an insert its ``_id``, an
+    update the reply update() would give, with ``n``, ``nModified`` and
+    ``updatedExisting``, and the ``upserted`` ``_id`` if it upserted. A bulk
+    write only counts the documents its updates matched and modified all
+    together, so where those totals don't settle an update's own counts
+    they're None, and updates are only batched if asked for.
+
+    Writes passing a write concern, or other options, and writes through
+    a database with incoming SON manipulators, aren't batched.
+    """
+
+    def __init__(self, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_delay=DEFAULT_MAX_DELAY, updates=False):
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be at least 1, not %r'
+                             % max_batch_size)
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.updates = updates
+        # Collection name: the _Batch of writes waiting for it.
+        self._pending = {}
+
+        # Bulk writes sent, and the writes in them.
+        self.batches = 0
+        self.writes = 0
+
+    def accepts_insert(self, collection, args, kwargs):
+        return (len(args) == 1 and isinstance(args[0], dict)
+                and not kwargs and self._plain(collection))
+
+    def accepts_update(self, collection, args, kwargs):
+        return (self.updates and len(args) == 2
+                and isinstance(args[0], dict) and isinstance(args[1], dict)
+                and _UPDATE_OPTIONS.issuperset(kwargs)
+                and self._plain(collection))
+
+    def _plain(self, collection):
+        database = collection.database.delegate
+        return not (database.incoming_manipulators
+                    or database.incoming_copying_manipulators)
+
+    def insert(self, collection, document):
+        """Returns a Future that resolves to `document`'s ``_id``."""
+        return self._add(collection, 'insert', (document,))
+
+    def update(self, collection, spec, document, upsert=False, multi=False):
+        """Returns a Future that resolves to the reply update() would give;
+        see :class:`WriteBatcher` for when its counts are None."""
+        return self._add(collection, 'update', (spec, document, upsert, multi))
+
+    def _add(self, collection, op, args):
+        io_loop = collection.get_io_loop()
+        framework = collection._framework
+        future = framework.get_future(io_loop)
+        name = collection.full_name
+        batch = self._pending.get(name)
+        if batch is None:
+            batch = self._pending[name] = _Batch(collection)
+            if self.max_delay:
+                batch.timeout = framework.call_later(
+                    io_loop, self.max_delay, self._flush, batch)
+            else:
+                framework.call_soon(io_loop, self._flush, batch)
+        batch.writes.append((op, args, future))
+        if len(batch.writes) >= self.max_batch_size:
+            if batch.timeout is not None:
+                framework.call_later_cancel(io_loop, batch.timeout)
+            self._flush(batch)
+        return future
+
+    def _flush(self, batch):
+        name = batch.collection.full_name
+        if self._pending.get(name) is not batch:
+            # Sent already, once full.
+            return
+        del self._pending[name]
+        collection, writes = batch.collection, batch.writes
+        self.batches += 1
+        self.writes += len(writes)
+        results = []
+        try:
+            bulk = collection.initialize_unordered_bulk_op()
+            for op, args, _ in writes:
+                if op == 'insert':
+                    bulk.insert(args[0])
+                    results.append(args[0]['_id'])
+                else:
+                    # Filled in from the bulk write's reply.
+                    results.append(None)
+                    _add_update(bulk, *args)
+            executed = bulk.execute()
+        except Exception as exc:
+            for _, _, future in writes:
+                future.set_exception(exc)
+            return
+        executed.add_done_callback(
+            functools.partial(self._executed, writes, results))
+
+    def _executed(self, writes, results, executed):
+        try:
+            details = executed.result()
+        except pymongo.errors.BulkWriteError as exc:
+            details = exc.details
+        except Exception as exc:
+            for _, _, future in writes:
+                future.set_exception(exc)
+            return
+
+        errors = {}
+        for error in details.get('writeErrors', ()):
+            errors.setdefault(error['index'], error)
+        _update_results(writes, results, details, errors)
+        concern_errors = details.get('writeConcernErrors')
+        for index, (_, _, future) in enumerate(writes):
+            if index in errors:
+                future.set_exception(_write_error(errors[index]))
+            elif concern_errors:
+                future.set_exception(_concern_error(concern_errors[0]))
+            else:
+                future.set_result(results[index])
+
+
+class _Batch(object):
+    __slots__ = ('collection', 'writes', 'timeout')
+
+    def __init__(self, collection):
+        self.collection = collection
+        # (op, args, future) triples.
+        self.writes = []
+        self.timeout = None
+
+
+def _add_update(bulk, spec, document, upsert, multi):
+    view = bulk.find(spec)
+    if upsert:
+        view = view.upsert()
+    if not any(key.startswith('$') for key in document):
+        view.replace_one(document)
+    elif multi:
+        view.update(document)
+    else:
+        view.update_one(document)
+
+
+def _update_results(writes, results, details, errors):
+    # Puts the reply of each update that succeeded in `results`.
+    upserted = dict((upsert['index'], upsert['_id'])
+                    for upsert in details.get('upserted', ()))
+    multi = dict((index, args[3]) for index, (op, args, _) in enumerate(writes)
+                 if op == 'update' and index not in errors)
+    matched = [index for index in sorted(multi) if index not in upserted]
+    n = _share(details.get('nMatched', 0), matched, multi)
+    # Not counted by servers before 2.6.
+    n_modified = details.get('nModified')
+    if n_modified is not None:
+        n_modified = _share(n_modified, [index for index in matched if n[index] != 0],
+                            multi)
+
+    for index in multi:
+        if index in upserted:
+            result = {'ok': 1.0, 'n': 1, 'updatedExisting': False,
+                      'upserted': upserted[index]}
+        else:
+            count = n[index]
+            result = {'ok': 1.0, 'n': count,
+                      'updatedExisting': None if count is None else bool(count)}
+        if n_modified is not None:
+            result['nModified'] = n_modified.get(index, 0)
+        results[index] = result
+
+
+def _share(total, indexes, multi):
+    # `total`, counted over the updates at `indexes`, by index, where it
+    # settles what each one counted; None elsewhere.
+    if len(indexes) == 1:
+        return {indexes[0]: total}
+    if total == 0:
+        return dict.fromkeys(indexes, 0)
+    if total == len(indexes) and not any(multi[index] for index in indexes):
+        return dict.fromkeys(indexes, 1)
+    return dict.fromkeys(indexes)
+
+
+def _write_error(error):
+    # As the write alone would have been reported: the first in its batch.
+    error = dict(error, index=0)
+    if error.get('code') in _DUPLICATE_KEY_ERRORS:
+        error_class = pymongo.errors.DuplicateKeyError
+    else:
+        error_class = pymongo.errors.OperationFailure
+    return error_class(error.get('errmsg'), error.get('code'), error)
+
+
+def _concern_error(error):
+    if error.get('errInfo', {}).get('wtimeout'):
+        error_class = pymongo.errors.WTimeoutError
+    else:
+        error_class = pymongo.errors.OperationFailure
+    return error_class(error.get('errmsg'), error.get('code'), error)
@@ -16,7 +16,20 @@
 
 from __future__ import unicode_literals, absolute_import
 
+import functools
+import operator
+import random
+import socket
+import time
+
+import pymysql.err
+
 from . import core
+from .compress import DEFAULT_THRESHOLD
+from .loader import quote_identifier
+from .sharding import HashShardMap, RangeShardMap, ShardedMysqlPool
+from ..batch import BatchLoader, DEFAULT_MAX_BATCH_SIZE
+from ..coalesce import SingleFlight
 from ..frameworks import tornado as tornado_framework
 from ..frameworks.pool import SocketPool
 from ..meta import create_class_with_framework
@@ -30,36 +43,429 @@ MysqlClient = create_mysql_class(core.AgnosticConnection)
 
 MysqlCursor = create_mysql_class(core.AgnosticCursor)
 
+MysqlTransaction = create_mysql_class(core.AgnosticTransaction)
+
+MysqlTableScan = create_mysql_class(core.AgnosticTableScan)
+
 
 class MysqlConnPool(object):
     def __init__(self, framework,
                  host, port, user, password, database,
-                 max_size=100, net_timeout=120, conn_timeout=120):
+                 max_size=100, net_timeout=120, conn_timeout=120,
+                 compress=False, compress_threshold=DEFAULT_THRESHOLD,
+                 decode_executor=None, single_flight=False, result_cache=None,
+                 local_infile=False):
+        """
+        :Parameters:
+          - `compress`: negotiate the MySQL compressed protocol on new
+            sockets, if the server supports it. Worth it for large result
+            sets over slow links; costs CPU on both ends.
+          - `compress_threshold`: with `compress`, packets this application
+            sends that are shorter than this many bytes go out uncompressed.
+            The server applies its own threshold to result rows.
+          - `decode_executor`: a :class:`~asyncdb.decode.DecodeExecutor`;
+            result sets larger than its threshold are decoded on its
+            executor instead of the event loop (Python 3 only)
+          - `single_flight`: if True, concurrent identical reads through
+            :meth:`MysqlCursor.execute` share one query; the pool's
+            ``single_flight`` attribute counts how many did
+          - `result_cache`: a :class:`~asyncdb.cache.ResultCache` for
+            SELECTs through :meth:`MysqlCursor.execute`, tagged with the
+            tables they read. Writes through this pool's connections
+            invalidate the tables they name; writes from elsewhere are only
+            seen once the cached result expires.
+          - `local_infile`: let connections use
+            :meth:`MysqlClient.load_data`, which needs LOAD DATA LOCAL
+            INFILE enabled on the client. Even then, only data passed to
+            load_data() is sent; file requests from the server are refused.
+        """
         io_loop = framework.get_event_loop()
+        self.framework = framework
+        self.io_loop = io_loop
         self.sock_pool = SocketPool(io_loop, framework,
                                     (host, port),
                                     max_size,
                                     net_timeout,
-                                    conn_timeout)
+                                    conn_timeout,
+                                    labels=core.socket_labels)
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.database = database
+        self.compress = compress
+        self.compress_threshold = compress_threshold
+        self.decode_executor = decode_executor
+        # Connections connected and not yet closed.
+        self.outstanding = 0
+        # Checkouts that switched a socket to another user or database.
+        self.user_switches = 0
+        self.db_switches = 0
+        if single_flight:
+            self.single_flight = SingleFlight(io_loop, framework)
+        else:
+            self.single_flight = None
+        self.result_cache = result_cache
+        self.local_infile = local_infile
+
+    def get_connection(self, user=None, password=None, database=None):
+        """A :class:`MysqlClient` that logs in as the pool's user to the
+        pool's database, or as another `user` to another `database`.
+
+        All users and databases share the pool's sockets. On connect, an
+        idle socket already logged in as `user` with `database` selected is
+        preferred; failing that, one of the same user is switched with
+        COM_INIT_DB, or any other with COM_CHANGE_USER. With a PyMySQL
+        that lacks the internals COM_CHANGE_USER needs, a new socket is
+        opened instead. The pool's ``user_switches`` and ``db_switches``
+        count how often a socket was switched.
+        """
+        return MysqlClient(self,
+                           user=self.user if user is None else user,
+                           password=self.password if password is None else password,
+                           database=self.database if database is None else database)
+
+    def transaction(self, retries=0, backoff=0.05, max_backoff=1.0,
+                    user=None, password=None, database=None):
+        """A transaction pinned to one socket from this pool.
+
+        :Parameters:
+          - `retries`: how many times :meth:`MysqlTransaction.run` reruns
+            the transaction after a deadlock or lock wait timeout
+          - `backoff`: base delay in seconds between retries, doubled each
+            attempt and jittered
+          - `max_backoff`: upper bound on the delay
+          - `user`, `password`, `database`: log in as another user or to
+            another database; see :meth:`get_connection`
+        """
+        credentials = {'user': user, 'password': password, 'database': database}
+        return MysqlTransaction(self, retries, backoff, max_backoff, credentials)
+
+    def load_data(self, table, columns, rows, callback=None, **kwargs):
+        """Bulk-insert `rows` into `table` on one pooled connection.
+
+        See :meth:`MysqlClient.load_data`; the load runs in a
+        :meth:`transaction`, so a failure leaves the table unchanged.
+        """
+        def load(connection):
+            return connection.load_data(table, columns, rows, **kwargs)
+
+        return self.transaction().run(load, callback=callback)
+
+    def loader(self, table, key='id', columns=None,
+               max_batch_size=DEFAULT_MAX_BATCH_SIZE, cache=True):
+        """A :class:`~asyncdb.batch.BatchLoader` of rows of `table` by
+        `key`, a unique column.
+
+        Lookups made in the same pass of the event loop are sent as one
+        ``SELECT columns FROM table WHERE key IN (...)``, on a connection
+        of its own::
+
+            loader = pool.loader('user')
+            user, friend = yield [loader.load(1), loader.load(2)]
+
+        Rows are dicts; keys are matched against the column value as the
+        driver converts it, so pass ints for integer columns. Missing rows
+        load as ``None``. With `cache`, the loader remembers every row it
+        loaded; make one per request.
+        """
+        if columns is None:
+            select = '*'
+        else:
+            if key not in columns:
+                columns = [key] + list(columns)
+            select = ', '.join(quote_identifier(column) for column in columns)
+        # The statement up to the IN list. Cursor.execute() %-formats it
+        # with the keys, so a % in an identifier is doubled.
+        prefix = ('SELECT %s FROM %s WHERE %s IN (' % (
+            select, quote_identifier(table), quote_identifier(key))).replace('%', '%%')
 
-    def get_connection(self):
-        return MysqlClient(self)
+        return BatchLoader(self.io_loop, self.framework,
+                           functools.partial(self._fetch_in, prefix),
+                           operator.itemgetter(key), max_batch_size, cache)
 
-    def get_sock_info(self):
-        return self.sock_pool.get_socket()
+    def parallel_scan(self, table, key='id', chunks=8, concurrency=4, columns=None,
+                      batch_size=core.DEFAULT_SCAN_BATCH_SIZE, batches=False,
+                      boundaries=None):
+        """Read all of `table` over several connections at once.
+
+        The range of `key`, an indexed unique column, is split into
+        `chunks` ranges: evenly between its MIN and MAX for an integer key,
+        else at the sorted `boundaries` given. `concurrency` connections
+        each read one range at a time, `batch_size` rows per keyset
+        paginated query, and stop while `concurrency` batches wait to be
+        consumed, so memory stays bounded however big the table.
+
+        Returns a :class:`MysqlTableScan`, iterated like a
+        :class:`~asyncdb.mongo.MotorCursor`, with :attr:`fetch_next` and
+        :meth:`next_object` or, in Python 3.5 and newer, ``async for``::
+
+            scan = pool.parallel_scan('user', chunks=16, concurrency=4)
+            while (yield scan.fetch_next):
+                export(scan.next_object())
+
+        Items are rows, or with `batches` lists of rows, in no particular
+        order across ranges. A key with no integer MIN and MAX and no
+        `boundaries` is read as a single range.
+        """
+        return MysqlTableScan(self, table, key, chunks, concurrency, columns,
+                              batch_size, batches, boundaries)
+
+    def _fetch_in(self, prefix, keys):
+        return self._fetch(prefix + ', '.join(['%s'] * len(keys)) + ')', keys,
+                           operator.methodcaller('fetchall'))
+
+    def _fetch_snapshot(self, query, args, credentials):
+        # For the result cache: must not be answered from it.
+        return self._fetch(query, args, operator.methodcaller('snapshot'),
+                           cached=False, credentials=credentials)
+
+    def _fetch(self, query, args, result_of, cached=True, credentials=None):
+        # Resolves to result_of(cursor) once `query` ran.
+        future = self.framework.get_future(self.io_loop)
+        connection = self.get_connection(**(credentials or {}))
+
+        def connected(result, error):
+            if error:
+                future.set_exception(error)
+                return
+            cursor = connection.cursor()
+            execute = cursor.execute if cached else cursor._execute
+            execute(query, args, callback=functools.partial(executed, cursor))
+
+        def executed(cursor, result, error):
+            connection.close()
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(result_of(cursor.delegate))
+
+        connection.connect(callback=connected)
+        return future
+
+    def get_sock_info(self, prefer=(), force=False, preferred_only=False):
+        return self.sock_pool.get_socket(force, prefer, preferred_only)
 
     def return_sock_info(self, sock_info):
         self.sock_pool.maybe_return_socket(sock_info)
 
+    def checked_out(self, connection):
+        """Called once `connection` has connected."""
+        self.outstanding += 1
+
+    def checked_in(self, connection):
+        """Called when `connection` is closed."""
+        self.outstanding -= 1
+
 
 class TorMysqlPool(MysqlConnPool):
     def __init__(self, host, port, user, password, database,
-                 max_size=100, net_timeout=120, conn_timeout=120):
+                 max_size=100, net_timeout=120, conn_timeout=120,
+                 compress=False, compress_threshold=DEFAULT_THRESHOLD,
+                 decode_executor=None, single_flight=False, result_cache=None,
+                 local_infile=False):
         super(self.__class__, self).__init__(tornado_framework,
                                              host, port, user, password, database,
-                                             max_size, net_timeout, conn_timeout)
+                                             max_size, net_timeout, conn_timeout,
+                                             compress, compress_threshold,
+                                             decode_executor, single_flight,
+                                             result_cache, local_infile)
+
+
+DEFAULT_MAX_LAG = 5
+DEFAULT_CHECK_INTERVAL = 5
+
+
+class _PrimaryPool(MysqlConnPool):
+    def checked_out(self, connection):
+        super(_PrimaryPool, self).checked_out(connection)
+        context = getattr(connection, 'route_context', None)
+        if context is not None:
+            context.writers += 1
+            context.last_write = time.time()
+
+    def checked_in(self, connection):
+        super(_PrimaryPool, self).checked_in(connection)
+        context = getattr(connection, 'route_context', None)
+        if context is not None:
+            context.writers -= 1
+            context.last_write = time.time()
+
+
+class _ReplicaPool(MysqlConnPool):
+    # Seconds_Behind_Master at the last check, or None if the replica is
+    # down or not replicating.
+    lag = None
+    checking = False
+    # Connections read_connection() picked this replica for that haven't
+    # connected yet; they count towards its load from the pick on.
+    picked = 0
+
+    def get_sock_info(self, prefer=(), force=False, preferred_only=False):
+        try:
+            return super(_ReplicaPool, self).get_sock_info(prefer, force, preferred_only)
+        except (socket.error, pymysql.err.OperationalError):
+            # Unreachable: don't send reads here until a check succeeds. A
+            # full pool, or a wait for one of its sockets timing out, only
+            # means it's busy.
+            self.lag = None
+            raise
+
+    def check(self):
+        if self.checking:
+            return
+        self.checking = True
+        self._fetch('SHOW SLAVE STATUS', None, operator.methodcaller('fetchall'),
+                    cached=False).add_done_callback(self._checked)
+
+    def _checked(self, future):
+        self.checking = False
+        try:
+            rows = future.result()
+        except Exception:
+            self.lag = None
+            return
+        lag = rows[0].get('Seconds_Behind_Master') if rows else None
+        self.lag = None if lag is None else float(lag)
+
+
+class RoutingContext(object):
+    """
+    Routing for one request, from :meth:`MysqlRoutingPool.context`: once
+    the request has used the primary, its reads go to the primary too
+    until the replicas have had time to catch up, so it reads its own
+    writes.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        # Primary connections open, and when the last one was used.
+        self.writers = 0
+        self.last_write = None
+
+    def get_connection(self, user=None, password=None, database=None):
+        """A connection to the primary, for writes."""
+        connection = self.pool.get_connection(user, password, database)
+        connection.delegate.route_context = self
+        return connection
+
+    def read_connection(self, user=None, password=None, database=None):
+        """A connection for reads; see :meth:`MysqlRoutingPool.read_connection`."""
+        return self.pool.read_connection(user, password, database, context=self)
+
+    def transaction(self, retries=0, backoff=0.05, max_backoff=1.0,
+                    user=None, password=None, database=None):
+        """A transaction on the primary; see :meth:`MysqlConnPool.transaction`."""
+        credentials = {'user': user, 'password': password, 'database': database}
+        return MysqlTransaction(self, retries, backoff, max_backoff, credentials)
+
+    def may_read(self, replica, now):
+        if self.writers:
+            return False
+        # Seconds_Behind_Master may have grown since it was checked.
+        return (self.last_write is None
+                or now - self.last_write > replica.lag + self.pool.check_interval)
+
+
+class MysqlRoutingPool(object):
+    def __init__(self, framework, primary, replicas, user, password, database,
+                 max_lag=DEFAULT_MAX_LAG, check_interval=DEFAULT_CHECK_INTERVAL,
+                 **kwargs):
+        """
+        Sends writes and transactions to a primary and spreads reads over
+        its replicas, each with a :class:`MysqlConnPool` of its own.
+
+        A read goes to the replica with the fewest open connections. Every
+        `check_interval` seconds each replica's ``SHOW SLAVE STATUS`` is
+        read (this needs the REPLICATION CLIENT privilege); one that is
+        down, not replicating, or more than `max_lag` seconds behind gets
+        no reads until a later check finds it well. With no replica to
+        read from, reads go to the primary.
+
+        :Parameters:
+          - `primary`: the primary's (host, port)
+          - `replicas`: a list of the replicas' (host, port)
+          - `max_lag`: most Seconds_Behind_Master a replica may report
+          - `check_interval`: seconds between replica checks
+
+        Other keyword arguments are passed to each :class:`MysqlConnPool`.
+        """
+        self.framework = framework
+        self.io_loop = framework.get_event_loop()
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.primary = _PrimaryPool(framework, primary[0], primary[1],
+                                    user, password, database, **kwargs)
+        self.replicas = [_ReplicaPool(framework, host, port,
+                                      user, password, database, **kwargs)
+                         for host, port in replicas]
+        self._check_handle = None
+        self._closed = False
+        framework.call_soon(self.io_loop, self._check)
+
+    def get_connection(self, user=None, password=None, database=None):
+        """A :class:`MysqlClient` connected to the primary."""
+        return self.primary.get_connection(user, password, database)
+
+    def read_connection(self, user=None, password=None, database=None,
+                        context=None):
+        """A :class:`MysqlClient` for reads, connected to a replica if one
+        is fit to read from, else to the primary. See :meth:`context`."""
+        replica = self._pick_replica(context)
+        if replica is None:
+            return self.primary.get_connection(user, password, database)
+        connection = replica.get_connection(user, password, database)
+        replica.picked += 1
+        connection.delegate._picked_by = replica
+        return connection
+
+    def transaction(self, retries=0, backoff=0.05, max_backoff=1.0,
+                    user=None, password=None, database=None):
+        """A transaction on the primary; see :meth:`MysqlConnPool.transaction`."""
+        return self.primary.transaction(retries, backoff, max_backoff,
+                                        user, password, database)
+
+    def context(self):
+        """A :class:`RoutingContext` for one request, to read its own
+        writes: after it has used a connection from its
+        :meth:`~RoutingContext.get_connection` or
+        :meth:`~RoutingContext.transaction`, its reads go to the primary
+        until every replica that could serve them is likely caught up."""
+        return RoutingContext(self)
+
+    def close(self):
+        """Stop checking replicas."""
+        self._closed = True
+        if self._check_handle is not None:
+            self.framework.call_later_cancel(self.io_loop, self._check_handle)
+            self._check_handle = None
+
+    def _pick_replica(self, context):
+        now = time.time()
+        candidates = [replica for replica in self.replicas
+                      if replica.lag is not None and replica.lag <= self.max_lag
+                      and (context is None or context.may_read(replica, now))]
+        if not candidates:
+            return None
+        # Fewest connections, open or about to be; ties broken at random.
+        return min(candidates,
+                   key=lambda replica: (replica.outstanding + replica.picked,
+                                        random.random()))
+
+    def _check(self):
+        if self._closed:
+            return
+        for replica in self.replicas:
+            replica.check()
+        self._check_handle = self.framework.call_later(
+            self.io_loop, self.check_interval, self._check)
+
+
+class TorMysqlRoutingPool(MysqlRoutingPool):
+    def __init__(self, primary, replicas, user, password, database,
+                 max_lag=DEFAULT_MAX_LAG, check_interval=DEFAULT_CHECK_INTERVAL,
+                 **kwargs):
+        super(self.__class__, self).__init__(tornado_framework,
+                                             primary, replicas,
+                                             user, password, database,
+                                             max_lag, check_interval, **kwargs)
@@ -0,0 +1,111 @@
+"""The MySQL compressed protocol, layered over a pooled socket."""
+
+from __future__ import unicode_literals, absolute_import
+
+import struct
+import zlib
+
+from pymysql import err
+
+# The largest payload one compressed frame can carry.
+MAX_FRAME_LEN = 2 ** 24 - 1
+
+# MySQL's own MIN_COMPRESS_LENGTH: smaller payloads don't shrink.
+DEFAULT_THRESHOLD = 50
+
+
+def _pack_int24(n):
+    return struct.pack('<I', n)[:3]
+
+
+class CompressedStream(object):
+    """
+    Frames and unframes the compressed protocol for one MySQL socket.
+
+    Reading hands out the decompressed byte stream, so PyMySQL's packet
+    reader works on top of it unchanged. Outgoing data is split into
+    frames; payloads shorter than `threshold` bytes, or that zlib can't
+    shrink, are sent uncompressed.
+    """
+
+    def __init__(self, rfile, threshold=DEFAULT_THRESHOLD):
+        self._rfile = rfile
+        self.threshold = threshold
+        self._buf = bytearray()
+        self._pos = 0
+        self._seq = 0
+        self._new_command = False
+
+        # Compressed and decompressed byte counts, both directions.
+        self.bytes_received = 0
+        self.bytes_decompressed = 0
+        self.bytes_sent = 0
+        self.bytes_uncompressed = 0
+
+    def start_command(self):
+        """The next frame written starts a command; its sequence id is 0."""
+        self._new_command = True
+
+    def read(self, n):
+        while len(self._buf) - self._pos < n:
+            if not self._read_frame():
+                break
+
+        data = bytes(self._buf[self._pos:self._pos + n])
+        self._pos += len(data)
+        if self._pos == len(self._buf):
+            del self._buf[:]
+            self._pos = 0
+        return data
+
+    def _read_frame(self):
+        header = self._rfile.read(7)
+        if len(header) < 7:
+            return False
+
+        low, high, seq, u_low, u_high = struct.unpack('<HBBHB', header)
+        length = low + (high << 16)
+        uncompressed_length = u_low + (u_high << 16)
+        payload = self._rfile.read(length)
+        if len(payload) < length:
+            return False
+
+        if seq != self._seq:
+            raise err.InternalError(
+                "Compressed packet sequence number wrong - got %d expected %d"
+                % (seq, self._seq))
+        self._seq = (seq + 1) % 256
+        self.bytes_received += 7 + length
+        if uncompressed_length:
+            payload = zlib.decompress(payload)
+        self.bytes_decompressed += len(payload)
+
+        if self._pos:
+            del self._buf[:self._pos]
+            self._pos = 0
+        self._buf += payload
+        return True
+
+    def frame(self, data):
+        """Wrap `data`, one or more MySQL packets, in compressed frames."""
+        if self._new_command:
+            self._seq = 0
+            self._new_command = False
+
+        frames = []
+        for start in range(0, max(len(data), 1), MAX_FRAME_LEN):
+            chunk = data[start:start + MAX_FRAME_LEN]
+            uncompressed_length = 0
+            if len(chunk) >= self.threshold:
+                compressed = zlib.compress(chunk)
+                if len(compressed) < len(chunk):
+                    uncompressed_length = len(chunk)
+                    chunk = compressed
+
+            frames.append(_pack_int24(len(chunk)) + struct.pack('B', self._seq)
+                          + _pack_int24(uncompressed_length) + chunk)
+            self._seq = (self._seq + 1) % 256
+            self.bytes_sent += 7 + len(chunk)
+            self.bytes_uncompressed += uncompressed_length or len(chunk)
+
+        return b''.join(frames)
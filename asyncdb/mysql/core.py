@@ -1,10 +1,79 @@
 from __future__ import unicode_literals, absolute_import
 
+import collections
+import copy
+import functools
+import numbers
+import random
+import re
+import struct
+import textwrap
+
+import greenlet
 import pymysql.connections
 import pymysql.cursors
+import pymysql.err
+from pymysql.charset import charset_by_name
+from pymysql.constants import CLIENT, COMMAND, CR, ER, SERVER_STATUS
 
+from . import formatter
+from .compress import CompressedStream
+from .loader import (ChunkPipe, DEFAULT_CHUNK_SIZE, DEFAULT_MAX_CHUNKS,
+                     MAX_PACKET_SIZE, RowEncoder, load_data_sql,
+                     quote_identifier)
+from .packet import is_eof, is_error, parse_row, parse_rows, read_payload
+from .tables import read_tables, written_tables
 from .. import errors
+from ..event import MotorGreenletEvent
+from ..limit import ConcurrentMap, DEFAULT_MAP_CONCURRENCY
 from ..meta import *
+from ..pycompat import PY3, PY35, text_type
+
+# Not in PyMySQL's COMMAND constants; MySQL 5.7.3+ and MariaDB 10.2.4+.
+COM_RESET_CONNECTION = 0x1f
+
+# Statements that change session state behind our back.
+_SESSION_STATEMENT = re.compile(r'\s*(USE|SET)\b', re.IGNORECASE)
+_VARIABLE_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_VERSION = re.compile(r'(\d+)\.(\d+)\.(\d+)')
+
+# Handshake results PyMySQL keeps on the Connection, which is recreated for
+# every checkout while the socket stays authenticated.
+_HANDSHAKE_ATTRS = ('protocol_version', 'server_version', 'server_thread_id',
+                    'server_capabilities', 'server_language', 'server_charset',
+                    'client_flag', 'host_info', 'salt', '_auth_plugin_name')
+
+_MISSING = object()
+
+# COM_CHANGE_USER builds on PyMySQL internals: its password scramble and
+# its auth switch handling. Without them a socket stays with the user it
+# logged in as, and a checkout for another user opens a new socket.
+_CAN_CHANGE_USER = (hasattr(pymysql.connections, '_scramble')
+                    and hasattr(pymysql.connections.Connection, '_process_auth'))
+
+# Reads that single-flight may share: plain SELECT and SHOW statements, but
+# nothing that locks, writes or depends on the session that runs it.
+_SHAREABLE_READ = re.compile(r'\s*(SELECT|SHOW)\b', re.IGNORECASE)
+_SESSION_DEPENDENT = re.compile(
+    r'@|\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bINTO\b'
+    r'|\b(LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|CONNECTION_ID|GET_LOCK'
+    r'|RELEASE_LOCK|IS_USED_LOCK|SLEEP|BENCHMARK)\s*\(',
+    re.IGNORECASE)
+
+# Reads whose result changes even if the tables don't: not worth caching.
+_NONDETERMINISTIC = re.compile(
+    r'\b(NOW|SYSDATE|CURDATE|CURTIME|UNIX_TIMESTAMP|UTC_DATE|UTC_TIME'
+    r'|UTC_TIMESTAMP|RAND|UUID|UUID_SHORT)\s*\('
+    r'|\bCURRENT_(DATE|TIME|TIMESTAMP|USER)\b|\bLOCALTIME(STAMP)?\b',
+    re.IGNORECASE)
+
+# Quoted strings and identifiers, or runs of whitespace between them.
+_SQL_WHITESPACE = re.compile(
+    r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`)|\s+""")
+
+# Errors after which InnoDB has rolled back, so the whole transaction can
+# simply be run again.
+RETRYABLE_ERRORS = frozenset([ER.LOCK_DEADLOCK, ER.LOCK_WAIT_TIMEOUT])
 
 
 class AgnosticBase(object):
@@ -20,52 +89,827 @@ class AgnosticBase(object):
     def __repr__(self):
         return '%s(%r)' % (self.__class__.__name__, self.delegate)
 
+    def _with_timeout(self, connection, start, timeout, callback):
+        # Run start(), which returns a Future for a statement on the
+        # PoolConnection `connection`. After `timeout` seconds the call
+        # fails and the statement is killed; the connection's next command
+        # waits until both the statement and the KILL have ended, lest the
+        # KILL hit it.
+        loop = self.get_io_loop()
+        future = self._framework.get_future(loop)
+        retval = self._framework.future_or_callback(future, callback, loop)
+        killing = []
+
+        def expired():
+            connection._draining = MotorGreenletEvent(loop, self._framework)
+            killing.append(self._kill_query(connection))
+            future.set_exception(errors.QueryTimeout(
+                ER.QUERY_INTERRUPTED, 'Query exceeded its timeout and was killed'))
+
+        handle = self._framework.call_later(loop, timeout, expired)
+        start().add_done_callback(
+            functools.partial(self._on_finished, connection, future, handle, killing))
+        return retval
+
+    def _on_finished(self, connection, future, handle, killing, finished):
+        self._framework.call_later_cancel(self.get_io_loop(), handle)
+        if killing:
+            # The caller has its QueryTimeout already.
+            finished.exception()
+            killing[0].add_done_callback(lambda _: self._drained(connection))
+            return
+
+        try:
+            result = finished.result()
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def _drained(self, connection):
+        draining, connection._draining = connection._draining, None
+        if draining is not None:
+            draining.set()
+
+    @motor_coroutine
+    def _kill_query(self, connection):
+        # KILL QUERY from another socket; the statement then fails with
+        # ER_QUERY_INTERRUPTED and its own socket stays usable. The socket
+        # is forced, beyond max_size if need be: the statements to kill
+        # may be what holds the pool's sockets.
+        side = connection.conn_pool.get_connection(**connection.credentials())
+        side.delegate.force_socket = True
+        try:
+            yield side.connect()
+            yield side.query('KILL QUERY %d' % connection.thread_id())
+        except Exception:
+            # Still running on the server, but at least end the wait.
+            sock_info = connection.sock_info
+            if sock_info is not None:
+                sock_info.close()
+        finally:
+            side.close()
+
+
+def _to_text(value, encoding='utf8'):
+    if value is None or isinstance(value, text_type):
+        return value
+    return value.decode(encoding)
+
+
+def _normalize_sql(sql):
+    """Collapse whitespace outside quotes, so formatting differences don't
+    make equal queries look different."""
+    return _SQL_WHITESPACE.sub(
+        lambda match: match.group(1) or ' ', sql).strip()
+
+
+def socket_labels(sock_info):
+    """What an idle socket is indexed by in its SocketPool; see
+    PoolConnection._socket_preferences."""
+    session = sock_info.session
+    if session is None:
+        return ()
+    return (('db', session.user, session.db), ('user', session.user))
+
+
+def _supports_reset_connection(server_version):
+    if 'MariaDB' in server_version:
+        # MariaDB reports e.g. "5.5.5-10.2.6-MariaDB".
+        server_version = server_version.replace('5.5.5-', '', 1)
+        minimum = (10, 2, 4)
+    else:
+        minimum = (5, 7, 3)
+    match = _VERSION.search(server_version)
+    return bool(match) and tuple(map(int, match.groups())) >= minimum
+
+
+class SessionState(object):
+    """
+    Server-side session state of one pooled MySQL socket.
+
+    Lives on the SocketInfo, so it outlives the PoolConnection that checked
+    the socket out. Changes that would not alter the state are skipped
+    locally; when the socket goes back to the pool, whatever the checkout
+    changed is restored.
+    """
+
+    def __init__(self, user, db, charset):
+        self.user = user
+        self.db = db
+        self.charset = charset
+        self.server_status = 0
+        self.variables = {}
+        self.handshake = {}
+        self.compressed = False
+        # A raw USE/SET statement changed something we don't parse.
+        self.unknown = False
+        self.initial_db = db
+        self.initial_charset = charset
+        self.initial_autocommit = None
+
+    @property
+    def autocommit(self):
+        return bool(self.server_status & SERVER_STATUS.SERVER_STATUS_AUTOCOMMIT)
+
+    @property
+    def in_transaction(self):
+        return bool(self.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS)
+
+    @property
+    def supports_reset(self):
+        return _supports_reset_connection(self.handshake.get('server_version', ''))
+
+    def is_clean(self):
+        return (not self.unknown
+                and not self.in_transaction
+                and not self.variables
+                and self.db == self.initial_db
+                and self.charset == self.initial_charset
+                and (self.initial_autocommit is None
+                     or self.autocommit == self.initial_autocommit))
+
+    def save_handshake(self, connection):
+        for attr in _HANDSHAKE_ATTRS:
+            if hasattr(connection, attr):
+                self.handshake[attr] = getattr(connection, attr)
+        self.initial_autocommit = connection.autocommit_mode
+
+    def restore_handshake(self, connection):
+        for attr, value in self.handshake.items():
+            setattr(connection, attr, value)
+        connection.charset = self.charset
+        connection.encoding = charset_by_name(self.charset).encoding
+
+
+class PoolResult(pymysql.connections.MySQLResult):
+    # Column names, if rows were decoded into dicts for a PoolDictCursor.
+    dict_keys = None
+
+    # On Python 3, rows are parsed in place from the socket buffer; see
+    # packet.py. Other packets still go through PyMySQL's MysqlPacket.
+    def _read_row_or_eof(self):
+        """The next row, or None after the result's EOF packet."""
+        payload = read_payload(self.connection)
+        if is_eof(payload) or is_error(payload):
+            self._read_eof(payload)
+            return None
+        return parse_row(payload, self.converters)
+
+    def _read_eof(self, payload):
+        packet = pymysql.connections.MysqlPacket(bytes(payload),
+                                                 self.connection.encoding)
+        packet.check_error()
+        self._check_packet_is_eof(packet)
+
+    def _read_rowdata_packet(self):
+        if not PY3:
+            return super(PoolResult, self)._read_rowdata_packet()
+
+        decoder = self.connection.conn_pool.decode_executor
+        if decoder is not None:
+            rows = self._decode_rows(decoder)
+        else:
+            rows = []
+            while True:
+                row = self._read_row_or_eof()
+                if row is None:
+                    break
+                rows.append(row)
+
+        self.connection = None
+        self.affected_rows = len(rows)
+        self.rows = tuple(rows)
+
+    def _decode_rows(self, decoder):
+        # Read the whole result first, then decode it here or, if it's big,
+        # on the executor.
+        conn = self.connection
+        payloads = []
+        nbytes = 0
+        while True:
+            payload = read_payload(conn)
+            if is_eof(payload) or is_error(payload):
+                self._read_eof(payload)
+                break
+            payloads.append(bytes(payload))
+            nbytes += len(payload)
+
+        keys = dict_type = None
+        if conn._row_dict_type is not None and payloads:
+            keys = self._column_names()
+            dict_type = conn._row_dict_type
+            self.dict_keys = keys
+
+        if decoder.should_offload(nbytes):
+            pool = conn.conn_pool
+            return decoder.run(pool.io_loop, pool.framework, parse_rows,
+                               payloads, self.converters, keys, dict_type)
+        return parse_rows(payloads, self.converters, keys, dict_type)
+
+    def _column_names(self):
+        # Like PyMySQL's DictCursor.
+        names = []
+        for field in self.fields:
+            name = field.name
+            if name in names:
+                name = field.table_name + '.' + name
+            names.append(name)
+        return names
+
+    def _read_rowdata_packet_unbuffered(self):
+        if not PY3:
+            return super(PoolResult, self)._read_rowdata_packet_unbuffered()
+
+        if not self.unbuffered_active:
+            return
+
+        row = self._read_row_or_eof()
+        if row is None:
+            self.unbuffered_active = False
+            self.connection = None
+            self.rows = None
+            return
+
+        self.affected_rows = 1
+        self.rows = (row,)
+        return row
+
+    def _read_load_local_packet(self, first_packet):
+        # The server asks for a file. Only send data load_local() prepared;
+        # never open whatever file name the server supplied.
+        conn = self.connection
+        source = conn._local_infile
+        try:
+            if source is None:
+                raise errors.OperationalError(
+                    "LOAD DATA LOCAL INFILE is only supported through load_data()")
+            while True:
+                chunk = source.read()
+                if not chunk:
+                    break
+                for start in range(0, len(chunk), MAX_PACKET_SIZE):
+                    conn.write_packet(chunk[start:start + MAX_PACKET_SIZE])
+                flush = getattr(conn.socket, 'flush', None)
+                if flush is not None:
+                    # Backpressure: don't take another chunk until this one
+                    # is on the wire.
+                    flush()
+        except Exception:
+            if source is not None:
+                source.abort()
+            conn.write_packet(b'')
+            try:
+                conn._read_packet()
+            except pymysql.err.MySQLError:
+                pass
+            raise
+
+        conn.write_packet(b'')
+        ok_packet = conn._read_packet()
+        if not ok_packet.is_ok_packet():
+            raise pymysql.err.OperationalError(2014, "Commands Out of Sync")
+        self._read_ok_packet(ok_packet)
+
 
 class PoolConnection(pymysql.connections.Connection):
+    _session = None
+    _local_infile = None
+    # Set by PoolDictCursor while it runs a query.
+    _row_dict_type = None
+    sock_info = None
+    # Tables written in the open transaction, for the result cache; None
+    # if unknown.
+    _uncommitted = frozenset()
+    # Take a socket even if the pool is at max_size.
+    force_socket = False
+    # A MotorGreenletEvent while a statement that timed out is still
+    # running; see AgnosticBase._with_timeout.
+    _draining = None
+    # The replica pool that picked this connection for reads, until it
+    # connects or is closed; see MysqlRoutingPool.read_connection.
+    _picked_by = None
+
     def set_conn_pool(self, conn_pool):
         self.conn_pool = conn_pool
 
+    # PyMySQL assigns server_status after every OK/EOF packet. Keep it with
+    # the socket, so a later checkout knows the autocommit and transaction
+    # state without asking the server.
+    @property
+    def server_status(self):
+        if self._session is None:
+            return 0
+        return self._session.server_status
+
+    @server_status.setter
+    def server_status(self, value):
+        if self._session is not None:
+            self._session.server_status = value
+            uncommitted = self._uncommitted
+            if (uncommitted is None or uncommitted) and not self._session.in_transaction:
+                # Committed, or rolled back: either way the transaction's
+                # writes are settled.
+                self._uncommitted = frozenset()
+                self._invalidate(uncommitted)
+
+    @property
+    def in_transaction(self):
+        return self._session is not None and self._session.in_transaction
+
     def connect(self, sock=None):
         try:
-            self.sock_info = self.conn_pool.get_sock_info()
+            self.sock_info = self._get_sock_info()
             self.socket = self.sock_info.sock
             self._rfile = self.socket.makefile('rb')
             self._next_seq_id = 0
             if not self.sock_info.connected:
+                self._session = SessionState(_to_text(self.user), _to_text(self.db),
+                                             self.charset)
+                self.sock_info.session = self._session
                 self._get_server_information()
+                compress = (self.conn_pool.compress
+                            and self.server_capabilities & CLIENT.COMPRESS)
+                if compress:
+                    self.client_flag |= CLIENT.COMPRESS
                 self._request_authentication()
-
-                if self.sql_mode is not None:
-                    c = self.cursor()
-                    c.execute("SET sql_mode=%s", (self.sql_mode,))
-
-                if self.init_command is not None:
-                    c = self.cursor()
-                    c.execute(self.init_command)
-                    c.close()
-                    self.commit()
-
-                if self.autocommit_mode is not None:
-                    self.autocommit(self.autocommit_mode)
-
+                if compress:
+                    # Both sides switch right after the auth OK packet.
+                    self._session.compressed = True
+                    self._start_compression()
+                self._init_session()
+                self._session.save_handshake(self)
                 self.sock_info.connected = True
+            else:
+                self._session = self.sock_info.session
+                self._session.restore_handshake(self)
+                if self._session.compressed:
+                    self._start_compression()
+                self._switch_tenant()
         except BaseException as e:
+            self._unpick()
             self._rfile = None
-            if self.socket is not None:
-                self.socket.close()
+            self.socket = None
+            self._session = None
+            if self.sock_info is not None:
+                self.sock_info.close()
+                self.conn_pool.return_sock_info(self.sock_info)
+                self.sock_info = None
             if isinstance(e, (OSError, IOError, errors.SocketError)):
                 exc = errors.OperationalError(
                     2003, "Can't connect to MySQL server on %r (%s)" % (self.host, e))
                 raise exc
             raise
+        self._unpick()
+        self.conn_pool.checked_out(self)
 
-    def close(self):
-        """Send the quit message and close the socket"""
-        self.conn_pool.return_sock_info(self.sock_info)
+    def _unpick(self):
+        pool, self._picked_by = self._picked_by, None
+        if pool is not None:
+            pool.picked -= 1
+
+    def __del__(self):
+        # Never connected nor closed.
+        self._unpick()
+        parent_del = getattr(super(PoolConnection, self), '__del__', None)
+        if parent_del is not None:
+            parent_del()
+
+    def _get_sock_info(self):
+        prefer = self._socket_preferences()
+        while True:
+            sock_info = self.conn_pool.get_sock_info(prefer, self.force_socket,
+                                                     not _CAN_CHANGE_USER)
+            session = sock_info.session
+            if _CAN_CHANGE_USER or session is None or not self._needs_change_user(session):
+                return sock_info
+            # Handed over straight from another checkout, but logged in as
+            # someone else: open a new one.
+            sock_info.close()
+            self.conn_pool.return_sock_info(sock_info)
+
+    def _socket_preferences(self):
+        # Idle sockets to prefer, by socket_labels(): one logged in as our
+        # user with our database selected, then one that only needs
+        # COM_INIT_DB. Any other needs COM_CHANGE_USER.
+        user, db = _to_text(self.user), _to_text(self.db)
+        prefer = [('db', user, db)]
+        if db is not None or _CAN_CHANGE_USER:
+            prefer.append(('user', user))
+        return prefer
+
+    def _needs_change_user(self, session):
+        db = _to_text(self.db)
+        return session.user != _to_text(self.user) or (db is None and session.db is not None)
+
+    def _switch_tenant(self):
+        # The socket may be another (user, database)'s.
+        session = self._session
+        db = _to_text(self.db)
+        if self._needs_change_user(session):
+            self.change_user(self.user, self.password, db)
+            self.conn_pool.user_switches += 1
+        elif session.db != db:
+            self.select_db(db)
+            session.initial_db = db
+            self.conn_pool.db_switches += 1
+
+    def change_user(self, user, password, db=None):
+        """Log in again as `user` over this socket, with COM_CHANGE_USER.
+
+        The server resets the session as for a new connection, so the
+        settings made when the socket was opened are applied again. Needs
+        PyMySQL internals that only some versions have; raises
+        NotSupportedError without them.
+        """
+        if not _CAN_CHANGE_USER:
+            raise pymysql.err.NotSupportedError(
+                "COM_CHANGE_USER needs PyMySQL's _scramble and _process_auth")
+        session = self._session
+        charset_id = charset_by_name(self.charset).id
+        name = user.encode(self.encoding) if isinstance(user, text_type) else user
+        authresp = b''
+        if self._auth_plugin_name in ('', 'mysql_native_password'):
+            authresp = pymysql.connections._scramble(password.encode('latin1'), self.salt)
+
+        data = name + b'\0'
+        if self.server_capabilities & CLIENT.SECURE_CONNECTION:
+            data += struct.pack('B', len(authresp)) + authresp
+        else:
+            data += authresp + b'\0'
+        data += (db or '').encode(self.encoding) + b'\0'
+        data += struct.pack('<H', charset_id)
+        if self.server_capabilities & CLIENT.PLUGIN_AUTH:
+            plugin = self._auth_plugin_name or 'mysql_native_password'
+            if isinstance(plugin, text_type):
+                plugin = plugin.encode('ascii')
+            data += plugin + b'\0'
+
+        self._execute_command(COMMAND.COM_CHANGE_USER, data)
+        packet = self._read_packet()
+        if packet.is_auth_switch_request():
+            # As in PyMySQL's _request_authentication.
+            packet.read_uint8()
+            plugin_name = packet.read_string()
+            self._process_auth(plugin_name, packet)
+
+        self.user, self.password, self.db = user, password, db
+        session.user = _to_text(user)
+        session.db = session.initial_db = db
+        session.charset = self.charset
+        session.variables.clear()
+        session.unknown = False
+        # Autocommit is back at the server's default until _init_session.
+        session.server_status = 0
+        self._init_session()
+
+    def credentials(self):
+        """The user, password and database this connection logs in with, as
+        keyword arguments for the pool's get_connection()."""
+        return {'user': _to_text(self.user),
+                'password': self.password,
+                'database': _to_text(self.db)}
+
+    def _start_compression(self):
+        self._rfile = CompressedStream(self._rfile, self.conn_pool.compress_threshold)
+
+    def _execute_command(self, command, sql):
+        draining = self._draining
+        if draining is not None:
+            draining.wait()
+        if isinstance(self._rfile, CompressedStream):
+            self._rfile.start_command()
+        super(PoolConnection, self)._execute_command(command, sql)
+
+    def _write_bytes(self, data):
+        if isinstance(self._rfile, CompressedStream):
+            data = self._rfile.frame(data)
+        super(PoolConnection, self)._write_bytes(data)
+
+    def _read_packet(self, packet_type=pymysql.connections.MysqlPacket):
+        packet = packet_type(bytes(read_payload(self)), self.encoding)
+        packet.check_error()
+        return packet
+
+    def _init_session(self):
+        cursor_class = pymysql.cursors.Cursor
+        if self.sql_mode is not None:
+            c = self.cursor(cursor_class)
+            c.execute("SET sql_mode=%s", (self.sql_mode,))
+            c.close()
+
+        if self.init_command is not None:
+            c = self.cursor(cursor_class)
+            c.execute(self.init_command)
+            c.close()
+            self.commit()
+
+        if self.autocommit_mode is not None:
+            self.autocommit(self.autocommit_mode)
+
+    def close(self, discard=False):
+        """Return the socket to the pool.
+
+        If this checkout changed the session state, the socket is restored
+        on a greenlet first and only then handed back. Pass ``discard=True``
+        to close the socket instead, e.g. when its state is unknown.
+        """
+        self._unpick()
+        sock_info, session = self.sock_info, self._session
         self.sock_info = None
+        if self._draining is not None:
+            # A statement that timed out is still reading from it.
+            discard = True
+        result = self._result
+        if result is not None and getattr(result, 'unbuffered_active', False):
+            # An unbuffered result isn't read to its end; don't let
+            # PyMySQL try to, nor anyone reuse the socket.
+            result.unbuffered_active = False
+            discard = True
+        if sock_info is None:
+            return
+
+        self.conn_pool.checked_in(self)
+
+        if discard:
+            sock_info.close()
+
+        if session is None or sock_info.closed or session.is_clean():
+            self._detach()
+            self.conn_pool.return_sock_info(sock_info)
+        else:
+            # close() is synchronous and may run on any greenlet, so start
+            # the restore from the event loop. It runs on a copy holding
+            # the socket, so this connection may connect() again at once.
+            restorer = copy.copy(self)
+            self._detach()
+            self.conn_pool.framework.call_soon(
+                self.conn_pool.io_loop,
+                lambda: greenlet.greenlet(restorer._restore_and_return).switch(sock_info))
+
+    def _detach(self):
+        self._session = None
         self.socket = None
         self._rfile = None
 
+    def _restore_and_return(self, sock_info):
+        # Runs on a child greenlet.
+        try:
+            self._restore_session()
+        except Exception:
+            sock_info.close()
+        finally:
+            self._detach()
+            self.conn_pool.return_sock_info(sock_info)
+
+    def _restore_session(self):
+        session = self._session
+        if session.supports_reset:
+            # One round trip: rolls back, drops session and user variables,
+            # restores the handshake charset and server default autocommit.
+            self._execute_command(COM_RESET_CONNECTION, b'')
+            self._read_ok_packet()
+            session.variables.clear()
+            session.unknown = False
+            session.charset = session.initial_charset
+            self.charset = session.charset
+            self.encoding = charset_by_name(self.charset).encoding
+            self.autocommit_mode = session.initial_autocommit
+            self._init_session()
+        elif session.unknown or session.variables:
+            raise errors.OperationalError(
+                CR.CR_NOT_IMPLEMENTED, "Server %s can't reset session state" %
+                session.handshake.get('server_version'))
+        else:
+            if session.in_transaction:
+                self.rollback()
+            self.set_charset(session.initial_charset)
+            if session.initial_autocommit is not None:
+                self.autocommit(session.initial_autocommit)
+
+        if session.initial_db is not None:
+            self.select_db(session.initial_db)
+
+    def select_db(self, db):
+        """Set current db, unless it is current already."""
+        db = _to_text(db, self.encoding)
+        if self._session is not None and self._session.db == db:
+            return
+        super(PoolConnection, self).select_db(db)
+        if self._session is not None:
+            self._session.db = db
+
+    def set_charset(self, charset):
+        """Set the connection charset, unless it is current already."""
+        if self._session is not None and self._session.charset == charset:
+            self.charset = charset
+            self.encoding = charset_by_name(charset).encoding
+            return
+        super(PoolConnection, self).set_charset(charset)
+        if self._session is not None:
+            self._session.charset = charset
+
+    def set_session_variable(self, name, value):
+        """SET SESSION `name` to `value`, unless it has that value already."""
+        if not _VARIABLE_NAME.match(name):
+            raise ValueError("Invalid session variable name %r" % name)
+        session = self._session
+        if session is not None and session.variables.get(name, _MISSING) == value:
+            return
+        self._execute_command(COMMAND.COM_QUERY,
+                              "SET SESSION %s = %s" % (name, self.escape(value)))
+        self._read_ok_packet()
+        if session is not None:
+            session.variables[name] = value
+
+    def load_local(self, sql, source):
+        """Run a LOAD DATA LOCAL INFILE statement, sending the chunks
+        `source` produces as the file contents."""
+        self._local_infile = source
+        try:
+            return self.query(sql)
+        finally:
+            self._local_infile = None
+
+    def _read_query_result(self, unbuffered=False):
+        # As in PyMySQL, but with a PoolResult.
+        result = PoolResult(self)
+        if unbuffered:
+            try:
+                result.init_unbuffered_query()
+            except:
+                result.unbuffered_active = False
+                result.connection = None
+                raise
+        else:
+            result.read()
+        self._result = result
+        if result.server_status is not None:
+            self.server_status = result.server_status
+        return result.affected_rows
+
+    def read_rows(self, count):
+        """Up to `count` more rows, as dicts, of the result of a query run
+        with ``unbuffered=True``; none once it has all been read."""
+        result = self._result
+        if result is None or not result.unbuffered_active:
+            return []
+        keys = result._column_names()
+        rows = []
+        while len(rows) < count:
+            row = result._read_rowdata_packet_unbuffered()
+            if row is None:
+                break
+            rows.append(dict(zip(keys, row)))
+        return rows
+
+    def query(self, sql, unbuffered=False):
+        if self._session is not None:
+            head = sql[:8]
+            if not isinstance(head, text_type):
+                head = head.decode('latin1')
+            match = _SESSION_STATEMENT.match(head)
+            if match:
+                # Transaction and autocommit changes show up in
+                # server_status; anything else we must forget.
+                if match.group(1).upper() == 'USE':
+                    self._session.db = None
+                else:
+                    self._session.unknown = True
+                    self._session.charset = None
+
+        if self.conn_pool.result_cache is None:
+            return super(PoolConnection, self).query(sql, unbuffered)
+
+        text = sql if isinstance(sql, text_type) else sql.decode(self.encoding)
+        tables = written_tables(text)
+        try:
+            return super(PoolConnection, self).query(sql, unbuffered)
+        finally:
+            if tables is None or tables:
+                if self.in_transaction:
+                    # Other connections can't see the writes yet, and the
+                    # result of a read now may be cached; drop it on commit.
+                    if tables is None or self._uncommitted is None:
+                        self._uncommitted = None
+                    else:
+                        self._uncommitted = self._uncommitted | tables
+                self._invalidate(tables)
+
+    def _invalidate(self, tables):
+        result_cache = self.conn_pool.result_cache
+        if tables is None:
+            result_cache.clear()
+        else:
+            for table in tables:
+                result_cache.invalidate(table)
+
+
+class PoolDictCursor(pymysql.cursors.DictCursor):
+    """A DictCursor whose rows a DecodeExecutor may build off the loop."""
+
+    def _query(self, q):
+        conn = self._get_db()
+        conn._row_dict_type = self.dict_type
+        try:
+            return super(PoolDictCursor, self)._query(q)
+        finally:
+            conn._row_dict_type = None
+
+    def _do_get_result(self):
+        keys = getattr(self._get_db()._result, 'dict_keys', None)
+        if keys is None:
+            super(PoolDictCursor, self)._do_get_result()
+        else:
+            # Already dicts; skip DictCursorMixin's conversion.
+            pymysql.cursors.Cursor._do_get_result(self)
+            self._fields = keys
+            self._rows = list(self._rows)
+
+    def _format(self, query, args, conn):
+        template = None
+        if PY3 and isinstance(query, text_type):
+            template = formatter.templates.get(query)
+        if template is not None and template.accepts(args):
+            return template.format(args, conn)
+        return query % self._escape_args(args, conn)
+
+    def mogrify(self, query, args=None):
+        # Python 2 formats bytes, as PyMySQL does.
+        if not PY3 or args is None:
+            return super(PoolDictCursor, self).mogrify(query, args)
+        return self._format(query, args, self._get_db())
+
+    def _do_execute_many(self, prefix, values, postfix, args, max_stmt_length, encoding):
+        # PyMySQL's, with each row formatted from the compiled `values`.
+        if not PY3:
+            return super(PoolDictCursor, self)._do_execute_many(
+                prefix, values, postfix, args, max_stmt_length, encoding)
+        conn = self._get_db()
+        if isinstance(prefix, text_type):
+            prefix = prefix.encode(encoding)
+        if isinstance(postfix, text_type):
+            postfix = postfix.encode(encoding)
+        sql = bytearray(prefix)
+        rows = 0
+        for index, arg in enumerate(args):
+            v = self._format(values, arg, conn).encode(encoding, 'surrogateescape')
+            if index and len(sql) + len(v) + len(postfix) + 1 > max_stmt_length:
+                rows += self.execute(sql + postfix)
+                sql = bytearray(prefix)
+            elif index:
+                sql += b','
+            sql += v
+        rows += self.execute(sql + postfix)
+        self.rowcount = rows
+        return rows
+
+    def cacheable_read(self, query, args=None):
+        """The shared_read_key() and tables of a read that a ResultCache may
+        keep, or None."""
+        session = self.connection._session
+        if session is None or not session.is_clean():
+            # Cached results are loaded on a fresh pooled connection.
+            return None
+        key = self.shared_read_key(query, args)
+        if key is None or _NONDETERMINISTIC.search(key[-1]):
+            return None
+        tables = read_tables(key[-1])
+        if tables is None:
+            return None
+        return key, tables
+
+    def shared_read_key(self, query, args=None):
+        """What identifies this read for single-flight, or None if the
+        result might differ from one connection to another."""
+        session = self.connection._session
+        if (session is None or session.in_transaction or session.unknown
+                or session.db is None):
+            return None
+
+        sql = self.mogrify(query, args)
+        if not isinstance(sql, text_type):
+            sql = sql.decode(self.connection.encoding)
+        if not _SHAREABLE_READ.match(sql) or _SESSION_DEPENDENT.search(sql):
+            return None
+
+        return (session.user, session.db, session.charset,
+                tuple(sorted(session.variables.items())),
+                _normalize_sql(sql))
+
+    def snapshot(self):
+        """The results of the last execute(), for set_snapshot()."""
+        return (self._executed, self.rowcount, self.description,
+                self.lastrowid, self._rows)
+
+    def set_snapshot(self, snapshot):
+        """Take the results of another cursor's execute() as our own."""
+        (self._executed, self.rowcount, self.description,
+         self.lastrowid, self._rows) = snapshot
+        self._last_executed = self._executed
+        self._result = None
+        self.rownumber = 0
+
 
 class AgnosticConnection(AgnosticBase):
     __motor_class_name__ = 'MysqlClient'
@@ -84,12 +928,13 @@ class AgnosticConnection(AgnosticBase):
     literal = DelegateMethod()
     escape_string = DelegateMethod()
     cursor = DelegateMethod()
-    query = AsyncCommand()
     next_result = AsyncCommand()
     affected_rows = DelegateMethod()
     kill = AsyncCommand()
     ping = AsyncCommand()
     set_charset = AsyncCommand()
+    set_session_variable = AsyncCommand()
+    in_transaction = ReadOnlyProperty()
     connect = AsyncCommand()
     write_packet = AsyncWrite()
     insert_id = AsyncCommand()
@@ -98,14 +943,21 @@ class AgnosticConnection(AgnosticBase):
     get_host_info = DelegateMethod()
     get_proto_info = DelegateMethod()
     get_server_info = DelegateMethod()
+    read_rows = AsyncRead()
+
+    _load_local = AsyncCommand(attr_name='load_local')
+    _query = AsyncCommand(attr_name='query')
 
     def __init__(self, pool, *args, **kwargs):
         self.io_loop = self._framework.get_event_loop()
         cursor_class = create_class_with_framework(AgnosticCursor, self._framework, self.__module__)
+        # Even with local_infile, PoolResult refuses file requests
+        # load_data() didn't start.
+        kwargs.setdefault('local_infile', pool.local_infile)
+        kwargs.setdefault('user', pool.user)
+        kwargs.setdefault('password', pool.password)
+        kwargs.setdefault('database', pool.database)
         delegate = self.__delegate_class__(host=pool.host,
-                                           user=pool.user,
-                                           password=pool.password,
-                                           database=pool.database,
                                            port=pool.port,
                                            defer_connect=True,
                                            autocommit=True,
@@ -115,20 +967,106 @@ class AgnosticConnection(AgnosticBase):
         delegate.set_conn_pool(pool)
         super(self.__class__, self).__init__(delegate)
 
+    def query(self, sql, unbuffered=False, callback=None, timeout=None):
+        """Run `sql`, like PyMySQL's :meth:`~pymysql.connections.Connection.query`.
+
+        With `timeout`, a statement still running after that many seconds
+        is stopped with ``KILL QUERY`` over another of the pool's sockets,
+        and the call fails with :exc:`~asyncdb.errors.QueryTimeout`. This
+        connection stays usable.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the number of affected rows.
+        """
+        if timeout is None:
+            return self._query(sql, unbuffered, callback=callback)
+        return self._with_timeout(
+            self.delegate, functools.partial(self._query, sql, unbuffered),
+            timeout, callback)
+
+    def load_data(self, table, columns, rows, callback=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE, max_chunks=DEFAULT_MAX_CHUNKS):
+        """Bulk-insert `rows` with LOAD DATA LOCAL INFILE.
+
+        `rows` is an iterable, or in Python 3.5 and newer an asynchronous
+        iterable, of sequences with one value per name in `columns`. Rows
+        are encoded as tab-separated text into chunks of about `chunk_size`
+        bytes and streamed to the server while they're produced; at most
+        `max_chunks` chunks are buffered, and the next row is only pulled
+        once the socket has caught up.
+
+        The pool must have been created with ``local_infile=True``.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the number of rows loaded.
+        """
+        if not self.delegate.conn_pool.local_infile:
+            raise errors.ConfigurationError(
+                "load_data() needs a pool created with local_infile=True")
+        if not 0 < chunk_size <= MAX_PACKET_SIZE:
+            raise ValueError('chunk_size must be between 1 and %d, not %r'
+                             % (MAX_PACKET_SIZE, chunk_size))
+        loop = self.get_io_loop()
+        future = self._framework.get_future(loop)
+        retval = self._framework.future_or_callback(future, callback, loop)
+
+        pipe = ChunkPipe(loop, self._framework, max_chunks)
+        sql = load_data_sql(table, columns, self.delegate.charset)
+        self._load_local(sql, pipe,
+                         callback=functools.partial(self._on_loaded, future, pipe))
+        self._produce(pipe, rows, chunk_size)
+        return retval
+
+    def _on_loaded(self, future, pipe, result, error):
+        # E.g. the table doesn't exist: the server never asked for data.
+        pipe.abort()
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @motor_coroutine
+    def _produce(self, pipe, rows, chunk_size):
+        encoder = RowEncoder(self.delegate.encoding, chunk_size)
+        try:
+            if hasattr(rows, '__aiter__'):
+                iterator = rows.__aiter__()
+                while not pipe.aborted:
+                    try:
+                        row = yield iterator.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    chunk = encoder.add(row)
+                    if chunk:
+                        yield pipe.put(chunk)
+            else:
+                for row in rows:
+                    if pipe.aborted:
+                        break
+                    chunk = encoder.add(row)
+                    if chunk:
+                        yield pipe.put(chunk)
+            chunk = encoder.flush()
+            if chunk:
+                yield pipe.put(chunk)
+        except Exception as exc:
+            pipe.finish(exc)
+        else:
+            pipe.finish()
+
     def get_io_loop(self):
         return self.io_loop
 
 
 class AgnosticCursor(AgnosticBase):
     __motor_class_name__ = 'MysqlCursor'
-    __delegate_class__ = pymysql.cursors.DictCursor
+    __delegate_class__ = PoolDictCursor
 
     close = AsyncCommand()
     setinputsizes = DelegateMethod()
     setoutputsizes = DelegateMethod()
     nextset = AsyncRead()
     mogrify = DelegateMethod()
-    execute = AsyncCommand()
     executemany = AsyncCommand()
     callproc = AsyncCommand()
     fetchone = DelegateMethod()
@@ -136,10 +1074,484 @@ class AgnosticCursor(AgnosticBase):
     fetchall = DelegateMethod()
     scroll = DelegateMethod()
 
+    _execute = AsyncCommand(attr_name='execute')
+
     def __init__(self, connection, *args, **kwargs):
         self.io_loop = self._framework.get_event_loop()
         delegate = self.__delegate_class__(connection)
         super(self.__class__, self).__init__(delegate)
 
+    def execute(self, query, args=None, callback=None, timeout=None):
+        """Execute a query; same parameters as PyMySQL's
+        :meth:`~pymysql.cursors.Cursor.execute`.
+
+        If the pool was created with a ``result_cache``, a SELECT outside a
+        transaction, on a connection whose session is as the pool set it
+        up, may be answered from the cache. If it was created with
+        ``single_flight=True``, a SELECT or SHOW identical to one still
+        running on another connection, outside a transaction, waits for
+        that one's rows instead of querying the server again.
+
+        With `timeout`, a query still running after that many seconds is
+        killed and the call fails with :exc:`~asyncdb.errors.QueryTimeout`;
+        see :meth:`MysqlClient.query`. Such a call always runs its own
+        query, never a cached or shared one.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the number of affected rows.
+        """
+        if timeout is not None:
+            return self._with_timeout(
+                self.delegate.connection,
+                functools.partial(self._execute, query, args),
+                timeout, callback)
+
+        pool = self.delegate.connection.conn_pool
+        cached = None
+        if pool.result_cache is not None:
+            cached = self.delegate.cacheable_read(query, args)
+        if cached is not None:
+            key, tables = cached
+            load = functools.partial(self._execute_shared, query, args)
+            if pool.single_flight is not None:
+                load = functools.partial(pool.single_flight.do, key, load)
+            # A stale result is refreshed in the background, maybe after
+            # this cursor's connection has gone back to the pool.
+            refresh = functools.partial(pool._fetch_snapshot, query, args,
+                                        self.delegate.connection.credentials())
+            shared = pool.result_cache.fetch(key, tables, load, self.get_io_loop(),
+                                             self._framework, refresh)
+        else:
+            key = None
+            if pool.single_flight is not None:
+                key = self.delegate.shared_read_key(query, args)
+            if key is None:
+                return self._execute(query, args, callback=callback)
+            shared = pool.single_flight.do(
+                key, functools.partial(self._execute_shared, query, args))
+
+        loop = self.get_io_loop()
+        future = self._framework.get_future(loop)
+        retval = self._framework.future_or_callback(future, callback, loop)
+        shared.add_done_callback(functools.partial(self._on_shared, future))
+        return retval
+
+    def _execute_shared(self, query, args):
+        future = self._framework.get_future(self.get_io_loop())
+
+        def executed(result, error):
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(self.delegate.snapshot())
+
+        self._execute(query, args, callback=executed)
+        return future
+
+    def _on_shared(self, future, shared):
+        try:
+            snapshot = shared.result()
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            self.delegate.set_snapshot(snapshot)
+            future.set_result(self.delegate.rowcount)
+
+    def get_io_loop(self):
+        return self.io_loop
+
+
+def is_retryable(error):
+    """True if `error` is a MySQL deadlock or lock wait timeout."""
+    return (isinstance(error, pymysql.err.MySQLError)
+            and bool(error.args)
+            and error.args[0] in RETRYABLE_ERRORS)
+
+
+class AgnosticTransaction(AgnosticBase):
+    __motor_class_name__ = 'MysqlTransaction'
+    __delegate_class__ = PoolConnection
+
+    def __init__(self, pool, retries=0, backoff=0.05, max_backoff=1.0,
+                 credentials=None):
+        """Don't construct a transaction yourself, call
+        :meth:`MysqlConnPool.transaction`.
+
+        The delegate is the connection pinned for the current attempt, or
+        ``None`` outside of one.
+        """
+        self.io_loop = self._framework.get_event_loop()
+        self.pool = pool
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.credentials = credentials or {}
+        self.connection = None
+        super(self.__class__, self).__init__(None)
+
+    if PY35:
+        exec(textwrap.dedent("""
+        async def __aenter__(self):
+            await self._begin()
+            return self.connection
+
+        async def __aexit__(self, exc_type, exc_val, exc_tb):
+            if exc_type is None:
+                await self._commit()
+            else:
+                await self._rollback()
+        """), globals(), locals())
+
+    def run(self, func, *args, **kwargs):
+        """Run ``func(connection, *args, **kwargs)`` in a transaction.
+
+        `func` must return a Future, e.g. be a ``gen.coroutine``. Every
+        statement it runs through `connection` uses the same socket. The
+        transaction commits when the Future resolves and rolls back if it
+        raises; on a deadlock or lock wait timeout the whole call is retried
+        up to `retries` times with jittered exponential backoff.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the result of `func`::
+
+            @gen.coroutine
+            def transfer(conn, src, dst, amount):
+                cursor = conn.cursor()
+                yield cursor.execute(
+                    "UPDATE account SET balance=balance-%s WHERE id=%s",
+                    (amount, src))
+                yield cursor.execute(
+                    "UPDATE account SET balance=balance+%s WHERE id=%s",
+                    (amount, dst))
+
+            yield pool.transaction(retries=3).run(transfer, 1, 2, 100)
+
+        In Python 3.5 and newer, a transaction is also an asynchronous
+        context manager; it can't be retried that way::
+
+            async with pool.transaction() as conn:
+                await conn.cursor().execute(...)
+        """
+        loop = self.get_io_loop()
+        callback = kwargs.pop('callback', None)
+        future = self._framework.get_future(loop)
+        retval = self._framework.future_or_callback(future, callback, loop)
+        self._run(future, func, args, kwargs)
+        return retval
+
+    @motor_coroutine
+    def _run(self, future, func, args, kwargs):
+        attempt = 0
+        while True:
+            try:
+                yield self._begin()
+                result = yield func(self.connection, *args, **kwargs)
+                yield self._commit()
+            except Exception as exc:
+                yield self._rollback()
+                if attempt < self.retries and is_retryable(exc):
+                    attempt += 1
+                    yield self._sleep(attempt)
+                    continue
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            return
+
+    @motor_coroutine
+    def _begin(self):
+        connection = self.pool.get_connection(**self.credentials)
+        try:
+            yield connection.connect()
+            yield connection.begin()
+        except Exception:
+            connection.close(discard=True)
+            raise
+        self.connection = connection
+        self.delegate = connection.delegate
+
+    @motor_coroutine
+    def _commit(self):
+        connection = self._release()
+        try:
+            yield connection.commit()
+        except Exception:
+            connection.close(discard=True)
+            raise
+        connection.close()
+
+    @motor_coroutine
+    def _rollback(self):
+        connection = self._release()
+        if connection is None:
+            return
+        try:
+            yield connection.rollback()
+        except Exception:
+            # The original error matters more; just don't reuse the socket.
+            connection.close(discard=True)
+        else:
+            connection.close()
+
+    def _release(self):
+        connection, self.connection, self.delegate = self.connection, None, None
+        return connection
+
+    def _sleep(self, attempt):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        future = self._framework.get_future(self.get_io_loop())
+        self._framework.call_later(
+            self.get_io_loop(), delay, functools.partial(future.set_result, None))
+        return future
+
+    def get_io_loop(self):
+        return self.io_loop
+
+
+DEFAULT_SCAN_BATCH_SIZE = 1000
+
+
+class AgnosticTableScan(AgnosticBase):
+    __motor_class_name__ = 'MysqlTableScan'
+    __delegate_class__ = None
+
+    def __init__(self, pool, table, key='id', chunks=8, concurrency=4,
+                 columns=None, batch_size=DEFAULT_SCAN_BATCH_SIZE,
+                 batches=False, boundaries=None):
+        """Don't construct a scan yourself, call
+        :meth:`MysqlConnPool.parallel_scan`.
+        """
+        self.io_loop = self._framework.get_event_loop()
+        self.pool = pool
+        self.table = table
+        self.key = key
+        self.chunks = chunks
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batches = batches
+        self.boundaries = boundaries
+        if columns is None:
+            self._select = '*'
+        else:
+            if key not in columns:
+                columns = [key] + list(columns)
+            self._select = ', '.join(quote_identifier(column) for column in columns)
+
+        self.started = False
+        self.closed = False
+        self._ranges = collections.deque()
+        self._workers = 0
+        self._error = None
+        # Batches fetched and not yet consumed, and pages being read; at
+        # most `concurrency` together.
+        self._buffer = collections.deque()
+        self._reading = 0
+        self._rows = collections.deque()
+        self._waiters = []
+        self._room = []
+        super(self.__class__, self).__init__(None)
+
+    if PY35:
+        exec(textwrap.dedent("""
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if self._ready() or await self.fetch_next:
+                return self.next_object()
+            raise StopAsyncIteration()
+        """), globals(), locals())
+
+    @property
+    def fetch_next(self):
+        """A Future that resolves to True once :meth:`next_object` has a
+        row, or a batch, to return, and to False at the end of the scan.
+        Starts the scan on first use."""
+        future = self._framework.get_future(self.get_io_loop())
+        if not self.started:
+            self.started = True
+            self._start()
+        if self._ready():
+            future.set_result(True)
+        elif self._error is not None:
+            future.set_exception(self._error)
+        elif self._finished():
+            future.set_result(False)
+        else:
+            self._waiters.append(future)
+        return future
+
+    def next_object(self):
+        """The next row, or with ``batches=True`` the next list of rows, or
+        None if :attr:`fetch_next` hasn't said there is one."""
+        if not self._ready():
+            return None
+        if self.batches:
+            item = self._buffer.popleft()
+        else:
+            if not self._rows:
+                self._rows.extend(self._buffer.popleft())
+            item = self._rows.popleft()
+        self._wake(self._room)
+        return item
+
+    def map_concurrent(self, function, concurrency=DEFAULT_MAP_CONCURRENCY,
+                       ordered=False, on_result=None, callback=None):
+        """Call ``function(row)`` for each row, or with ``batches=True``
+        each batch, several at once.
+
+        `function` must return a Future, e.g. be a ``gen.coroutine``. At
+        most `concurrency` calls run at once, and the scan is only read
+        when there's room for another, so it's never read ahead of the
+        results. With `ordered`, results keep the scan's order; otherwise
+        they're in the order they finish.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the list of results, or if `on_result` is given, to the number of
+        rows: each result is passed to `on_result` as it comes instead of
+        being kept. The first error stops the map and is raised; calls
+        already running are left to finish.
+        """
+        io_loop = self.get_io_loop()
+        mapper = ConcurrentMap(io_loop, self._framework, self, function,
+                               concurrency, ordered, on_result)
+        retval = self._framework.future_or_callback(
+            mapper.future, callback, io_loop)
+        mapper.start()
+        return retval
+
+    def close(self):
+        """Stop the scan; workers quit after the page they're reading."""
+        self.closed = True
+        self._ranges.clear()
+        self._buffer.clear()
+        self._rows.clear()
+        self._wake(self._room)
+        self._wake(self._waiters, False)
+
+    def _ready(self):
+        if self.batches:
+            return bool(self._buffer)
+        return bool(self._rows or self._buffer)
+
+    def _finished(self):
+        return self.closed or (self.started and not self._workers and not self._ranges)
+
+    def _wake(self, waiters, result=True):
+        waiting = list(waiters)
+        del waiters[:]
+        for future in waiting:
+            if not future.done():
+                future.set_result(result)
+
+    @motor_coroutine
+    def _start(self):
+        self._workers += 1
+        try:
+            boundaries = self.boundaries
+            if boundaries is None:
+                boundaries = yield self._framework.yieldable(self._split())
+            lows = [None] + list(boundaries)
+            highs = list(boundaries) + [None]
+            self._ranges.extend(zip(lows, highs))
+            for _ in range(min(self.concurrency, len(self._ranges))):
+                self._work()
+        except Exception as exc:
+            self._fail(exc)
+        finally:
+            self._worker_done()
+
+    def _split(self):
+        # Even integer boundaries between MIN(key) and MAX(key); a key
+        # that isn't an integer is scanned as one range.
+        future = self._framework.get_future(self.get_io_loop())
+        key = quote_identifier(self.key)
+        sql = 'SELECT MIN(%s) AS lo, MAX(%s) AS hi FROM %s' % (
+            key, key, quote_identifier(self.table))
+
+        def split(cursor):
+            row = cursor.fetchone()
+            lo, hi = row['lo'], row['hi']
+            if (not isinstance(lo, numbers.Integral) or not isinstance(hi, numbers.Integral)
+                    or isinstance(lo, bool)):
+                return []
+            step = max(1, (hi - lo + 1) // self.chunks)
+            return list(range(lo + step, hi + 1, step))[:self.chunks - 1]
+
+        return self.pool._fetch(sql, None, split, cached=False)
+
+    def _page(self, low, high, after):
+        # Keyset pagination over [low, high). The statement is %-formatted
+        # with `args`, so a % in an identifier is doubled.
+        key = quote_identifier(self.key).replace('%', '%%')
+        conditions, args = [], []
+        if after is not None:
+            conditions.append('%s > %%s' % key)
+            args.append(after)
+        elif low is not None:
+            conditions.append('%s >= %%s' % key)
+            args.append(low)
+        if high is not None:
+            conditions.append('%s < %%s' % key)
+            args.append(high)
+        sql = 'SELECT %s FROM %s' % (self._select, quote_identifier(self.table))
+        sql = sql.replace('%', '%%')
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY %s LIMIT %d' % (key, self.batch_size)
+        return sql, args
+
+    @motor_coroutine
+    def _work(self):
+        self._workers += 1
+        connection = self.pool.get_connection()
+        try:
+            yield connection.connect()
+            cursor = connection.cursor()
+            while self._ranges and not self.closed and self._error is None:
+                low, high = self._ranges.popleft()
+                after = None
+                while not self.closed and self._error is None:
+                    if len(self._buffer) + self._reading >= self.concurrency:
+                        room = self._framework.get_future(self.get_io_loop())
+                        self._room.append(room)
+                        yield room
+                        continue
+                    sql, args = self._page(low, high, after)
+                    self._reading += 1
+                    try:
+                        # Past the result cache; a scan's pages would evict it.
+                        yield cursor._execute(sql, args)
+                    finally:
+                        self._reading -= 1
+                    rows = cursor.fetchall()
+                    if rows and not self.closed:
+                        self._buffer.append(rows)
+                        self._wake(self._waiters)
+                    if len(rows) < self.batch_size:
+                        break
+                    after = rows[-1][self.key]
+        except Exception as exc:
+            self._fail(exc)
+        finally:
+            connection.close()
+            self._worker_done()
+
+    def _fail(self, exc):
+        if self._error is None:
+            self._error = exc
+        self._ranges.clear()
+        self._wake(self._room)
+        waiting = list(self._waiters)
+        del self._waiters[:]
+        for future in waiting:
+            if not future.done():
+                future.set_exception(exc)
+
+    def _worker_done(self):
+        self._workers -= 1
+        if self._finished() and not self._ready():
+            self._wake(self._waiters, False)
+
     def get_io_loop(self):
         return self.io_loop
@@ -0,0 +1,161 @@
+"""Compiled SQL templates for client-side parameter interpolation.
+
+PyMySQL formats a query with ``query % escaped_args`` after escaping each
+argument through its generic converters. A :class:`Template` is the query
+split at its placeholders once, so a repeated execute only escapes the
+arguments, by a per-type table, and joins.
+"""
+
+from __future__ import unicode_literals, absolute_import
+
+import collections
+import re
+
+import pymysql.connections
+import pymysql.converters
+from pymysql.constants import SERVER_STATUS
+
+from ..pycompat import string_types
+
+# Distinct queries whose templates are kept.
+DEFAULT_MAX_TEMPLATES = 1024
+
+_CONVERSION = re.compile(r'%(?:\(([^()]*)\))?(.?)', re.DOTALL)
+
+
+def _escape_table():
+    # PyMySQL's escaping of text without NO_BACKSLASH_ESCAPES, for
+    # versions that don't have it as a table.
+    table = ['%c' % x for x in range(128)]
+    for char, escaped in (('\0', '\\0'), ('\\', '\\\\'), ('\n', '\\n'),
+                          ('\r', '\\r'), ('\032', '\\Z'), ('"', '\\"'),
+                          ("'", "\\'")):
+        table[ord(char)] = escaped
+    return table
+
+
+_ESCAPE_TABLE = getattr(pymysql.converters, '_escape_table', None) or _escape_table()
+_NO_BACKSLASH_ESCAPES = SERVER_STATUS.SERVER_STATUS_NO_BACKSLASH_ESCAPES
+_CONNECTION_ESCAPE = pymysql.connections.Connection.escape
+# Text depends on the server's NO_BACKSLASH_ESCAPES mode, and containers
+# recurse with a charset; both are left to conn.escape().
+_COMPOUND = (pymysql.converters.escape_dict, pymysql.converters.escape_sequence)
+
+
+def _encoders_for(conn):
+    """PyMySQL's encoders, by exact type as its escape_item looks them up,
+    or None if `conn` has encoders or an escape() of its own that only
+    ``conn.escape()`` is sure to honour."""
+    encoders = pymysql.converters.encoders
+    if conn.encoders is not encoders or type(conn).escape is not _CONNECTION_ESCAPE:
+        return None
+    return encoders
+
+
+class Template(object):
+    """A query split at its ``%s`` or its ``%(name)s`` placeholders."""
+
+    __slots__ = ('literals', 'names', 'size')
+
+    def __init__(self, literals, names):
+        self.literals = literals
+        # None for positional placeholders.
+        self.names = names
+        self.size = len(literals) - 1
+
+    def accepts(self, args):
+        if self.names is None:
+            return isinstance(args, (tuple, list)) and len(args) == self.size
+        return isinstance(args, dict)
+
+    def format(self, args, conn):
+        """The query with `args` escaped for `conn` in place, as
+        ``conn.escape()`` would. Call only if :meth:`accepts` `args`."""
+        if self.names is not None:
+            args = [args[name] for name in self.names]
+        elif not args:
+            return self.literals[0]
+        encoders = _encoders_for(conn)
+        if encoders is None:
+            return ''.join([self.literals[0]] + [
+                part for arg, literal in zip(args, self.literals[1:])
+                for part in (conn.escape(arg), literal)])
+        no_backslash = conn.server_status & _NO_BACKSLASH_ESCAPES
+        parts = [self.literals[0]]
+        for arg, literal in zip(args, self.literals[1:]):
+            if isinstance(arg, string_types):
+                if no_backslash:
+                    parts.append("'" + arg.replace("'", "''") + "'")
+                else:
+                    parts.append("'" + arg.translate(_ESCAPE_TABLE) + "'")
+            else:
+                # Looked up in PyMySQL's own dict, so encoders registered
+                # since are used.
+                encoder = encoders.get(type(arg))
+                if encoder is None or encoder in _COMPOUND:
+                    parts.append(conn.escape(arg))
+                else:
+                    parts.append(encoder(arg))
+            parts.append(literal)
+        return ''.join(parts)
+
+
+def compile_template(query):
+    """A :class:`Template` for `query`, or None if it uses a conversion
+    other than ``%s`` and ``%%``, or mixes positional and named
+    placeholders; those are left to the ``%`` operator."""
+    literals = []
+    names = []
+    named = None
+    literal = []
+    position = 0
+    for match in _CONVERSION.finditer(query):
+        literal.append(query[position:match.start()])
+        position = match.end()
+        name, conversion = match.groups()
+        if conversion == '%' and name is None:
+            literal.append('%')
+            continue
+        if conversion != 's' or named is (name is None):
+            return None
+        named = name is not None
+        literals.append(''.join(literal))
+        literal = []
+        names.append(name)
+    literal.append(query[position:])
+    literals.append(''.join(literal))
+    return Template(literals, names if named else None)
+
+
+class TemplateCache(object):
+    """Templates by query, the least recently compiled dropped first once
+    there are `max_templates` of them."""
+
+    def __init__(self, max_templates=DEFAULT_MAX_TEMPLATES):
+        self.max_templates = max_templates
+        self._templates = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        """The template for `query`, or None if it can't be compiled."""
+        try:
+            template = self._templates[query]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return template
+
+        self.misses += 1
+        template = compile_template(query)
+        self._templates[query] = template
+        if len(self._templates) > self.max_templates:
+            self._templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        self._templates.clear()
+
+
+templates = TemplateCache()
@@ -0,0 +1,169 @@
+"""Streaming rows to LOAD DATA LOCAL INFILE."""
+
+from __future__ import unicode_literals, absolute_import
+
+import collections
+import datetime
+import decimal
+import re
+
+from ..event import MotorGreenletEvent
+from ..pycompat import text_type
+
+# Rows are buffered into chunks of about this many bytes; each chunk is one
+# packet on the wire.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# A packet of 0xFFFFFF bytes is continued by the next one, so file data
+# goes out in packets shorter than that; larger chunks are split.
+MAX_PACKET_SIZE = 0xFFFFFF - 1
+
+# Encoded chunks queued between the row producer and the socket.
+DEFAULT_MAX_CHUNKS = 4
+
+# What ESCAPED BY '\\' needs escaped in a field.
+_SPECIAL = re.compile(b'[\\\\\t\n\r\0]')
+_ESCAPES = {
+    b'\\': b'\\\\',
+    b'\t': b'\\t',
+    b'\n': b'\\n',
+    b'\r': b'\\r',
+    b'\0': b'\\0',
+}
+
+
+def _escape_special(match):
+    return _ESCAPES[match.group(0)]
+
+
+def quote_identifier(name):
+    """Backtick-quote a possibly dotted identifier, like "db.table"."""
+    return '.'.join('`%s`' % part.replace('`', '``') for part in name.split('.'))
+
+
+def load_data_sql(table, columns, charset):
+    return ("LOAD DATA LOCAL INFILE 'asyncdb' INTO TABLE %s CHARACTER SET %s"
+            " FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'"
+            " LINES TERMINATED BY '\\n' (%s)" % (
+                quote_identifier(table),
+                charset,
+                ', '.join(quote_identifier(column) for column in columns)))
+
+
+def encode_field(value, encoding):
+    if value is None:
+        return b'\\N'
+    if isinstance(value, bool):
+        return b'1' if value else b'0'
+    if isinstance(value, bytes):
+        data = value
+    elif isinstance(value, text_type):
+        data = value.encode(encoding)
+    elif isinstance(value, (datetime.datetime, datetime.date, datetime.time,
+                            datetime.timedelta, decimal.Decimal, int, float)):
+        data = str(value).encode('ascii')
+    else:
+        data = text_type(value).encode(encoding)
+    return _SPECIAL.sub(_escape_special, data)
+
+
+def encode_row(row, encoding):
+    return b'\t'.join([encode_field(value, encoding) for value in row]) + b'\n'
+
+
+class RowEncoder(object):
+    """Encodes rows into chunks of about `chunk_size` bytes."""
+
+    def __init__(self, encoding, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self._lines = []
+        self._size = 0
+
+    def add(self, row):
+        """Encode `row`. Returns a full chunk, or None."""
+        line = encode_row(row, self.encoding)
+        self._lines.append(line)
+        self._size += len(line)
+        if self._size >= self.chunk_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Returns the partial chunk, or None if it's empty."""
+        if not self._lines:
+            return None
+        chunk = b''.join(self._lines)
+        self._lines = []
+        self._size = 0
+        return chunk
+
+
+class ChunkPipe(object):
+    """
+    A bounded queue of encoded chunks between a producer coroutine on the
+    event loop and the child greenlet writing them to the socket.
+
+    The producer waits on the Future from put() while `max_chunks` chunks
+    are queued; the greenlet pauses in read() until a chunk or the end of
+    input arrives.
+    """
+
+    def __init__(self, io_loop, framework, max_chunks=DEFAULT_MAX_CHUNKS):
+        self.io_loop = io_loop
+        self._framework = framework
+        self.max_chunks = max_chunks
+        self._chunks = collections.deque()
+        self._readable = MotorGreenletEvent(io_loop, framework)
+        self._writable = None
+        self._error = None
+        self.done = False
+        self.aborted = False
+
+    # Producer side, on the main greenlet.
+    def put(self, chunk):
+        """Queue `chunk`. Returns a Future that resolves when there's room
+        for another one."""
+        future = self._framework.get_future(self.io_loop)
+        if not self.aborted:
+            self._chunks.append(chunk)
+            self._readable.set()
+
+        if self.aborted or len(self._chunks) < self.max_chunks:
+            future.set_result(None)
+        else:
+            self._writable = future
+        return future
+
+    def finish(self, error=None):
+        """No more chunks. If `error` is given, read() raises it."""
+        self._error = error
+        self.done = True
+        self._readable.set()
+
+    # Consumer side, on a child greenlet.
+    def read(self):
+        """The next chunk, or b'' at the end of input."""
+        while not self._chunks and not self.done:
+            self._readable.clear()
+            self._readable.wait()
+
+        if self._chunks:
+            chunk = self._chunks.popleft()
+            self._wake_producer()
+            return chunk
+
+        if self._error is not None:
+            raise self._error
+        return b''
+
+    def abort(self):
+        """The consumer gave up; let the producer run to completion."""
+        self.aborted = True
+        self._chunks.clear()
+        self._wake_producer()
+
+    def _wake_producer(self):
+        writable, self._writable = self._writable, None
+        if writable is not None:
+            self._framework.call_soon(self.io_loop, writable.set_result, None)
@@ -0,0 +1,126 @@
+"""MySQL packet reading and text-protocol row parsing without slicing.
+
+PyMySQL's MysqlPacket slices a new bytes object for every header and
+field. Here a row is parsed straight from the payload buffer through a
+memoryview, and the only objects created per column are the final
+Python values.
+"""
+
+from __future__ import unicode_literals, absolute_import
+
+import struct
+
+from pymysql import err
+
+from ..pycompat import PY3
+
+MAX_PACKET_LEN = 2 ** 24 - 1
+
+NULL_COLUMN = 251
+UNSIGNED_SHORT_COLUMN = 252
+UNSIGNED_INT24_COLUMN = 253
+
+_unpack_header = struct.Struct('<HBB').unpack_from
+_unpack_uint64 = struct.Struct('<Q').unpack_from
+
+
+def _read_exactly(read, n):
+    try:
+        data = read(n)
+    except (IOError, OSError) as e:
+        raise err.OperationalError(
+            2013, "Lost connection to MySQL server during query (%s)" % (e,))
+    if len(data) < n:
+        raise err.OperationalError(
+            2013, "Lost connection to MySQL server during query")
+    return data
+
+
+def read_payload(connection):
+    """Read one packet from `connection` and return its payload.
+
+    On Python 3 the payload is a memoryview when the connection's read
+    file can hand out views of its buffer, else bytes. A payload split over several
+    packets because of its size is joined into bytes.
+    """
+    rfile = connection._rfile
+    read = rfile.read
+    if PY3:
+        read = getattr(rfile, 'read_view', read)
+    parts = None
+    while True:
+        low, high, packet_number = _unpack_header(_read_exactly(read, 4))
+        length = low + (high << 16)
+        if packet_number != connection._next_seq_id:
+            raise err.InternalError(
+                "Packet sequence number wrong - got %d expected %d" % (
+                    packet_number, connection._next_seq_id))
+        connection._next_seq_id = (connection._next_seq_id + 1) % 256
+
+        payload = _read_exactly(read, length)
+        if length < MAX_PACKET_LEN and parts is None:
+            return payload
+
+        # https://dev.mysql.com/doc/internals/en/sending-more-than-16mbyte.html
+        if parts is None:
+            parts = []
+        parts.append(bytes(payload))
+        if length < MAX_PACKET_LEN:
+            return b''.join(parts)
+
+
+def is_eof(payload):
+    return payload[0] == 0xfe and len(payload) < 9
+
+
+def is_error(payload):
+    return payload[0] == 0xff
+
+
+def parse_row(data, converters):
+    """Decode a text-protocol row from `data`, bytes or a memoryview.
+
+    `converters` is MySQLResult.converters: an (encoding, converter) pair
+    per column. Text is decoded straight from the buffer.
+    """
+    row = []
+    append = row.append
+    pos = 0
+    for encoding, converter in converters:
+        length = data[pos]
+        if length < NULL_COLUMN:
+            pos += 1
+        elif length == NULL_COLUMN:
+            pos += 1
+            append(None)
+            continue
+        elif length == UNSIGNED_SHORT_COLUMN:
+            length = data[pos + 1] | data[pos + 2] << 8
+            pos += 3
+        elif length == UNSIGNED_INT24_COLUMN:
+            length = data[pos + 1] | data[pos + 2] << 8 | data[pos + 3] << 16
+            pos += 4
+        else:
+            length = _unpack_uint64(data, pos + 1)[0]
+            pos += 9
+
+        end = pos + length
+        if encoding is not None:
+            value = str(data[pos:end], encoding)
+        else:
+            value = bytes(data[pos:end])
+        pos = end
+
+        if converter is not None:
+            value = converter(value)
+        append(value)
+    return tuple(row)
+
+
+def parse_rows(payloads, converters, keys=None, dict_type=dict):
+    """Decode a list of row payloads; into `dict_type` instances if `keys`,
+    the column names, are given. Runs on a DecodeExecutor."""
+    rows = [parse_row(payload, converters) for payload in payloads]
+    if keys is not None:
+        rows = [dict_type(zip(keys, row)) for row in rows]
+    return rows
@@ -0,0 +1,354 @@
+"""Routing MySQL queries to shards by key, and scatter-gather over them."""
+
+from __future__ import unicode_literals, absolute_import
+
+import bisect
+import collections
+import functools
+import heapq
+import operator
+import zlib
+
+from ..limit import ConcurrencyLimit
+from ..pycompat import text_type
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+# Rows a streaming scatter reads from a shard at a time.
+DEFAULT_STREAM_BATCH_SIZE = 100
+
+
+class HashShardMap(object):
+    """Spreads keys evenly over `shards` shards by a CRC32 of the key, the
+    same in every process."""
+
+    def __init__(self, shards):
+        self.shards = shards
+
+    def shard_for(self, key):
+        if not isinstance(key, (bytes, text_type)):
+            key = text_type(key)
+        if isinstance(key, text_type):
+            key = key.encode('utf8')
+        return (zlib.crc32(key) & 0xffffffff) % self.shards
+
+
+class RangeShardMap(object):
+    """Keys below ``bounds[0]`` go to shard 0, keys from ``bounds[i - 1]``
+    and below ``bounds[i]`` to shard i, and the rest to the last shard."""
+
+    def __init__(self, bounds):
+        self.bounds = sorted(bounds)
+        self.shards = len(self.bounds) + 1
+
+    def shard_for(self, key):
+        return bisect.bisect_right(self.bounds, key)
+
+
+class _Descending(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _sort_key(order_by):
+    # MySQL puts NULLs first in ascending order, last in descending.
+    def key(row):
+        values = []
+        for column, descending in order_by:
+            value = row[column]
+            value = (value is not None, value)
+            values.append(_Descending(value) if descending else value)
+        return values
+    return key
+
+
+def _merge(results, key, limit):
+    # k-way merge of rows each shard returned in order, stopping at limit.
+    heap = []
+    for shard, rows in enumerate(results):
+        if rows:
+            heap.append((key(rows[0]), shard, 0))
+    heapq.heapify(heap)
+    merged = []
+    while heap and (limit is None or len(merged) < limit):
+        _, shard, position = heapq.heappop(heap)
+        rows = results[shard]
+        merged.append(rows[position])
+        position += 1
+        if position < len(rows):
+            heapq.heappush(heap, (key(rows[position]), shard, position))
+    return merged
+
+
+class _Stream(object):
+    # One shard's unbuffered result in a streaming merge. `fetching` while
+    # its connection is connecting, querying or reading.
+    __slots__ = ('connection', 'rows', 'fetching', 'exhausted', 'done')
+
+    def __init__(self, done):
+        self.connection = None
+        self.rows = collections.deque()
+        self.fetching = False
+        self.exhausted = False
+        # Resolved once the connection is closed, freeing the shard's slot.
+        self.done = done
+
+
+class _StreamMerge(object):
+    """Merges the rows `query` returns on each of `shards`, already sorted
+    by `key`, as they're read: each shard's result is read unbuffered,
+    `batch_size` rows at a time and only once the merge has used up the
+    last, and every shard's connection is closed once `limit` rows are
+    out."""
+
+    def __init__(self, sharded, shards, query, args, key, limit, batch_size, future):
+        self.sharded = sharded
+        self.query = query
+        self.args = args
+        self.key = key
+        self.limit = limit
+        self.batch_size = batch_size
+        self.future = future
+        self.merged = []
+        self._shards = shards
+        self._streams = []
+        # Heads of the streams that have rows, as (key, stream index), and
+        # the streams that must be read before the next row is known.
+        self._heap = []
+        self._missing = set(range(len(shards)))
+
+    def start(self):
+        framework = self.sharded.framework
+        for index, shard in enumerate(self._shards):
+            stream = _Stream(framework.get_future(self.sharded.io_loop))
+            self._streams.append(stream)
+            self.sharded.limits[shard].run(
+                functools.partial(self._open, index, shard))
+        self._step()
+
+    def _open(self, index, shard):
+        stream = self._streams[index]
+        if self.future.done():
+            stream.done.set_result(None)
+            return stream.done
+        connection = stream.connection = self.sharded.pools[shard].get_connection()
+
+        def connected(result, error):
+            if error:
+                stream.fetching = False
+                return self._failed(index, error)
+            if self.future.done():
+                stream.fetching = False
+                return self._close(stream)
+            try:
+                sql = connection.cursor().mogrify(self.query, self.args)
+            except Exception as exc:
+                stream.fetching = False
+                return self._failed(index, exc)
+            connection.query(sql, unbuffered=True, callback=queried)
+
+        def queried(result, error):
+            stream.fetching = False
+            if error:
+                return self._failed(index, error)
+            self._fetch(index)
+
+        stream.fetching = True
+        connection.connect(callback=connected)
+        return stream.done
+
+    def _fetch(self, index):
+        stream = self._streams[index]
+        if self.future.done():
+            self._close(stream, discard=True)
+            return
+        stream.fetching = True
+        stream.connection.read_rows(
+            self.batch_size, callback=functools.partial(self._fetched, index))
+
+    def _fetched(self, index, rows, error):
+        stream = self._streams[index]
+        stream.fetching = False
+        if error:
+            return self._failed(index, error)
+        if not rows:
+            stream.exhausted = True
+            self._close(stream)
+        elif self.future.done():
+            self._close(stream, discard=True)
+            return
+        stream.rows.extend(rows)
+        self._missing.discard(index)
+        if stream.rows:
+            heapq.heappush(self._heap, (self.key(stream.rows[0]), index))
+        self._step()
+
+    def _step(self):
+        # Emit rows while every stream's next row is known.
+        while (not self.future.done() and not self._missing and self._heap
+               and not self._full()):
+            _, index = heapq.heappop(self._heap)
+            stream = self._streams[index]
+            self.merged.append(stream.rows.popleft())
+            if stream.rows:
+                heapq.heappush(self._heap, (self.key(stream.rows[0]), index))
+            elif not stream.exhausted and not self._full():
+                self._missing.add(index)
+                self._fetch(index)
+        if self.future.done():
+            return
+        if self._full() or not self._missing and not self._heap:
+            self.future.set_result(self.merged)
+            self._stop()
+
+    def _full(self):
+        return self.limit is not None and len(self.merged) >= self.limit
+
+    def _failed(self, index, error):
+        self._close(self._streams[index], discard=True)
+        if not self.future.done():
+            self.future.set_exception(error)
+            self._stop()
+
+    def _stop(self):
+        # Streams still reading close when their read ends; the rest of an
+        # unbuffered result is left unread, so the socket is closed.
+        for stream in self._streams:
+            if stream.connection is not None and not stream.fetching:
+                self._close(stream, discard=not stream.exhausted)
+
+    def _close(self, stream, discard=False):
+        if stream.connection is not None:
+            stream.connection.close(discard=discard)
+            stream.connection = None
+        if not stream.done.done():
+            stream.done.set_result(None)
+
+
+class ShardedMysqlPool(object):
+    def __init__(self, pools, shard_map, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        Routes queries to one of `pools`, a :class:`MysqlConnPool` per
+        shard, by a shard key.
+
+        :Parameters:
+          - `pools`: the shards' pools, indexed as `shard_map` numbers them
+          - `shard_map`: a :class:`HashShardMap` or :class:`RangeShardMap`,
+            or any object with a ``shard_for(key)`` method
+          - `max_concurrency`: most queries this router runs at once on
+            each shard; the rest queue, so a scatter can't take every
+            socket of a shard's pool
+        """
+        if not pools:
+            raise ValueError('ShardedMysqlPool needs at least one pool')
+        self.pools = list(pools)
+        self.shard_map = shard_map
+        self.framework = self.pools[0].framework
+        self.io_loop = self.pools[0].io_loop
+        self.limits = [ConcurrencyLimit(self.io_loop, self.framework, max_concurrency)
+                       for _ in self.pools]
+
+    def shard_for(self, key):
+        return self.shard_map.shard_for(key)
+
+    def pool_for(self, key):
+        """The pool of the shard that holds `key`."""
+        return self.pools[self.shard_for(key)]
+
+    def get_connection(self, key):
+        """A :class:`MysqlClient` on the shard that holds `key`. Not counted
+        against `max_concurrency`."""
+        return self.pool_for(key).get_connection()
+
+    def execute(self, key, query, args=None, callback=None):
+        """Run `query` on the shard that holds `key`.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the list of rows.
+        """
+        future = self._run(self.shard_for(key), query, args)
+        return self.framework.future_or_callback(future, callback, self.io_loop)
+
+    def scatter(self, query, args=None, keys=None, order_by=None, limit=None,
+                stream=False, batch_size=DEFAULT_STREAM_BATCH_SIZE, callback=None):
+        """Run `query` on every shard, or the shards holding `keys`, at once
+        and gather the rows.
+
+        Without `order_by`, rows come in shard order. With `order_by`, a
+        list of column names, or of ``(column, descending)`` pairs, each
+        shard's rows must already be sorted that way, as by an ORDER BY in
+        `query`; they're merged in that order and only the first `limit`
+        kept. Give `query` the same LIMIT, plus any offset, so no shard
+        sends more rows than can make the cut.
+
+        By default every shard's rows are read in full before they're
+        merged. With `stream` and `order_by`, each shard's result is read
+        unbuffered, `batch_size` rows at a time, as the merge needs them,
+        and the reading stops once `limit` rows are merged: memory is
+        bounded by `batch_size` rows per shard, and the shards' sockets
+        are closed rather than drained. Streamed results bypass the
+        pool's result cache and single flight, and hold a connection to
+        every shard until they're done.
+
+        Takes an optional callback, or returns a Future that resolves to
+        the list of rows.
+        """
+        if keys is None:
+            shards = list(range(len(self.pools)))
+        else:
+            shards = sorted(set(self.shard_for(key) for key in keys))
+
+        if stream and not order_by:
+            raise ValueError('scatter() streams only with order_by')
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1, not %r' % batch_size)
+
+        future = self.framework.get_future(self.io_loop)
+        retval = self.framework.future_or_callback(future, callback, self.io_loop)
+        if order_by is not None:
+            order_by = [(column, False) if isinstance(column, (bytes, text_type))
+                        else tuple(column) for column in order_by]
+        if stream:
+            _StreamMerge(self, shards, query, args, _sort_key(order_by), limit,
+                         batch_size, future).start()
+            return retval
+
+        results = [None] * len(shards)
+        remaining = [len(shards)]
+
+        def gathered(index, shard_future):
+            if future.done():
+                return
+            try:
+                results[index] = shard_future.result()
+            except Exception as exc:
+                future.set_exception(exc)
+                return
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+            if order_by:
+                future.set_result(_merge(results, _sort_key(order_by), limit))
+            else:
+                rows = [row for shard_rows in results for row in shard_rows]
+                future.set_result(rows if limit is None else rows[:limit])
+
+        if not shards:
+            future.set_result([])
+        for index, shard in enumerate(shards):
+            self._run(shard, query, args).add_done_callback(
+                functools.partial(gathered, index))
+        return retval
+
+    def _run(self, shard, query, args):
+        pool = self.pools[shard]
+        return self.limits[shard].run(functools.partial(
+            pool._fetch, query, args, operator.methodcaller('fetchall')))
@@ -0,0 +1,106 @@
+"""Which tables a SQL statement reads or writes, for ResultCache tags.
+
+This is a keyword scan, not a parser. It may name a table a statement
+doesn't touch, which only costs an extra invalidation, and it gives up on
+statements it doesn't know rather than miss a write.
+"""
+
+from __future__ import unicode_literals, absolute_import
+
+import re
+
+_IDENT = r'(?:`(?:[^`]|``)+`|[\w$]+)'
+_NAME = r'%s(?:\s*\.\s*%s)?' % (_IDENT, _IDENT)
+
+# An alias mustn't swallow the keyword after a table name.
+_KEYWORD = (r'(?:JOIN|INNER|LEFT|RIGHT|OUTER|CROSS|NATURAL|STRAIGHT_JOIN|WHERE|ON'
+            r'|USING|GROUP|ORDER|LIMIT|HAVING|FOR|LOCK|UNION|SET|WINDOW|INTO'
+            r'|PARTITION|USE|IGNORE|FORCE)\b')
+_REF = r'%s(?:\s+(?:AS\s+)?(?!%s)%s)?' % (_NAME, _KEYWORD, _IDENT)
+
+_LITERAL = re.compile(r"""'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*\"""")
+
+# Table lists after FROM, JOIN and USING, like "a, b AS x".
+_TABLE_LIST = re.compile(r'\b(?:FROM|JOIN|USING)\s+(%s(?:\s*,\s*%s)*)' % (_REF, _REF),
+                         re.IGNORECASE)
+_FIRST_NAME = re.compile(_NAME)
+
+_INSERT = re.compile(
+    r'\s*(?:INSERT|REPLACE)\s+(?:(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE)\s+)*'
+    r'(?:INTO\s+)?(%s)' % _NAME, re.IGNORECASE)
+_UPDATE = re.compile(
+    r'\s*UPDATE\s+(?:(?:LOW_PRIORITY|IGNORE)\s+)*(.*?)\s+SET\b',
+    re.IGNORECASE | re.DOTALL)
+_DELETE = re.compile(
+    r'\s*DELETE\s+(?:(?:LOW_PRIORITY|QUICK|IGNORE)\s+)*(.*?)\s*\bFROM\b',
+    re.IGNORECASE | re.DOTALL)
+_TABLE_STATEMENT = re.compile(
+    r'\s*(?:TRUNCATE(?:\s+TABLE)?|(?:ALTER|DROP|RENAME|OPTIMIZE|ANALYZE|REPAIR)'
+    r'(?:\s+TEMPORARY)?\s+TABLES?(?:\s+IF\s+EXISTS)?)\s+(%s(?:\s*(?:,|\bTO\b)\s*%s)*)'
+    % (_NAME, _NAME), re.IGNORECASE)
+_LOAD_DATA = re.compile(r'\s*LOAD\s+(?:DATA|XML)\b.*?\bINTO\s+TABLE\s+(%s)' % _NAME,
+                        re.IGNORECASE | re.DOTALL)
+_READ_ONLY = re.compile(
+    r'\s*(?:SELECT|SHOW|EXPLAIN|DESCRIBE|DESC|BEGIN|START|COMMIT|ROLLBACK'
+    r'|SAVEPOINT|RELEASE|SET|USE|DO|HELP|XA)\b', re.IGNORECASE)
+_SELECT = re.compile(r'\s*SELECT\b', re.IGNORECASE)
+
+
+def _table(name):
+    # The last part of a possibly qualified name: a write to db.t and a
+    # read from t are taken to be the same table.
+    part = re.findall(_IDENT, name)[-1]
+    if part.startswith('`'):
+        part = part[1:-1].replace('``', '`')
+    return part.lower()
+
+
+def _names(table_list):
+    return [_table(_FIRST_NAME.match(ref.strip()).group(0))
+            for ref in re.split(r'\s*(?:,|\bTO\b)\s*', table_list, flags=re.IGNORECASE)
+            if ref.strip()]
+
+
+def _listed_tables(sql):
+    tables = set()
+    for match in _TABLE_LIST.finditer(sql):
+        tables.update(_names(match.group(1)))
+    return tables
+
+
+def read_tables(sql):
+    """The tables a SELECT reads, or None if `sql` isn't a SELECT or names
+    no table."""
+    sql = _LITERAL.sub('?', sql)
+    if not _SELECT.match(sql):
+        return None
+    return frozenset(_listed_tables(sql)) or None
+
+
+def written_tables(sql):
+    """The tables `sql` may modify: empty if it doesn't write, None if it's
+    not understood and may write anything."""
+    sql = _LITERAL.sub('?', sql)
+    match = _INSERT.match(sql)
+    if match:
+        return frozenset([_table(match.group(1))])
+
+    match = _UPDATE.match(sql)
+    if match:
+        return frozenset(_listed_tables('FROM ' + match.group(1)))
+
+    if re.match(r'\s*DELETE\b', sql, re.IGNORECASE):
+        tables = _listed_tables(sql)
+        match = _DELETE.match(sql)
+        if match and match.group(1):
+            # Multiple-table syntax: DELETE t1, t2 FROM ...
+            tables.update(_names(match.group(1)))
+        return frozenset(tables) or None
+
+    match = _TABLE_STATEMENT.match(sql) or _LOAD_DATA.match(sql)
+    if match:
+        return frozenset(_names(match.group(1)))
+
+    if _READ_ONLY.match(sql) and not re.search(r'\bINTO\s+(?!OUTFILE|DUMPFILE|@)', sql, re.IGNORECASE):
+        return frozenset()
+    return None
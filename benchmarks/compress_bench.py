@@ -0,0 +1,70 @@
+"""Latency and bytes read for a large MySQL result with and without the
+compressed protocol. E.g.:
+
+    PYTHONPATH=. python benchmarks/compress_bench.py --port=3306 --query="select * from big_table"
+"""
+
+import time
+
+import tornado.gen
+import tornado.ioloop
+from tornado.options import define, options, parse_command_line
+
+from asyncdb.mysql import TorMysqlPool
+from asyncdb.mysql.compress import CompressedStream
+
+define('host', default='127.0.0.1')
+define('port', default=3306)
+define('user', default='root')
+define('password', default='root')
+define('database', default='test')
+define('query', default='select * from big_table')
+define('runs', default=5)
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+@tornado.gen.coroutine
+def run(compress):
+    pool = TorMysqlPool(options.host, options.port, options.user,
+                        options.password, options.database, compress=compress)
+    latencies = []
+    received = decompressed = 0
+    rows = 0
+    for _ in range(options.runs):
+        connection = pool.get_connection()
+        yield connection.connect()
+        stream = connection.delegate._rfile
+        if isinstance(stream, CompressedStream):
+            start_received = stream.bytes_received
+            start_decompressed = stream.bytes_decompressed
+        cursor = connection.cursor()
+        start = time.time()
+        yield cursor.execute(options.query)
+        latencies.append(time.time() - start)
+        rows = len(cursor.fetchall())
+        if isinstance(stream, CompressedStream):
+            received += stream.bytes_received - start_received
+            decompressed += stream.bytes_decompressed - start_decompressed
+        connection.close()
+
+    line = 'compress=%-5s rows=%d  median query=%7.1f ms' % (
+        compress, rows, 1000 * median(latencies))
+    if received:
+        line += '  %d bytes/query read, %d decompressed' % (
+            received // options.runs, decompressed // options.runs)
+    print(line)
+
+
+@tornado.gen.coroutine
+def main():
+    yield run(False)
+    yield run(True)
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    tornado.ioloop.IOLoop.current().run_sync(main)
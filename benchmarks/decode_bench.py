@@ -0,0 +1,105 @@
+"""Event loop lag while large MySQL results are decoded.
+
+Runs the same big SELECT with decoding on the IOLoop, on a thread pool and
+on a process pool, while a heartbeat measures how late the loop runs
+callbacks. E.g.:
+
+    PYTHONPATH=. python benchmarks/decode_bench.py --port=3306 --query="select * from big_table"
+"""
+
+import concurrent.futures
+import time
+
+import tornado.gen
+import tornado.ioloop
+from tornado.options import define, options, parse_command_line
+
+from asyncdb.decode import DecodeExecutor
+from asyncdb.mysql import TorMysqlPool
+
+define('host', default='127.0.0.1')
+define('port', default=3306)
+define('user', default='root')
+define('password', default='root')
+define('database', default='test')
+define('query', default='select * from big_table')
+define('runs', default=5)
+define('interval', default=0.005, help='heartbeat interval in seconds')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Heartbeat(object):
+    def __init__(self, interval):
+        self.interval = interval
+        self.lags = []
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.lags = []
+        self._schedule(time.time())
+
+    def stop(self):
+        self.running = False
+
+    def _schedule(self, now):
+        deadline = now + self.interval
+        tornado.ioloop.IOLoop.current().call_at(
+            tornado.ioloop.IOLoop.current().time() + self.interval,
+            self._beat, deadline)
+
+    def _beat(self, deadline):
+        now = time.time()
+        self.lags.append(max(0.0, now - deadline))
+        if self.running:
+            self._schedule(now)
+
+
+@tornado.gen.coroutine
+def run(name, decode_executor):
+    pool = TorMysqlPool(options.host, options.port, options.user,
+                        options.password, options.database,
+                        decode_executor=decode_executor)
+    heartbeat = Heartbeat(options.interval)
+    latencies = []
+    lags = []
+    rows = 0
+    for _ in range(options.runs):
+        connection = pool.get_connection()
+        yield connection.connect()
+        cursor = connection.cursor()
+        heartbeat.start()
+        start = time.time()
+        yield cursor.execute(options.query)
+        latencies.append(time.time() - start)
+        heartbeat.stop()
+        rows = len(cursor.fetchall())
+        connection.close()
+        lags.extend(heartbeat.lags)
+        yield tornado.gen.sleep(0.1)
+
+    print('%-8s rows=%d  median query=%6.1f ms  loop lag p99=%6.1f ms  max=%6.1f ms' % (
+        name, rows,
+        1000 * percentile(latencies, 0.5),
+        1000 * percentile(lags, 0.99),
+        1000 * max(lags)))
+
+
+@tornado.gen.coroutine
+def main():
+    threads = concurrent.futures.ThreadPoolExecutor(2)
+    processes = concurrent.futures.ProcessPoolExecutor(2)
+    yield run('loop', None)
+    yield run('threads', DecodeExecutor(threads, threshold=0))
+    yield run('process', DecodeExecutor(processes, threshold=0))
+    threads.shutdown()
+    processes.shutdown()
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    tornado.ioloop.IOLoop.current().run_sync(main)
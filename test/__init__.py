@@ -0,0 +1,14 @@
+from __future__ import unicode_literals, absolute_import
+
+import functools
+
+from tornado import gen
+
+
+def run_on_loop(test):
+    """Run a generator test method as a coroutine on ``self.io_loop``."""
+    @functools.wraps(test)
+    def wrapped(self):
+        self.io_loop.run_sync(functools.partial(gen.coroutine(test), self),
+                              timeout=10)
+    return wrapped
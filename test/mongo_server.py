@@ -0,0 +1,217 @@
+"""A minimal mongod on a thread, for tests that need a socket.
+
+It answers isMaster, and any other command with ok, and runs queries on
+the documents in :attr:`collections`: a spec of equalities, $gt, $gte,
+$lt, $lte and $in, maybe under $and, sorted on one key. Cursors are
+read with getMore, each maybe held for :attr:`get_more_delay` seconds,
+and killed with killCursors. :attr:`fail_get_more` getMores in a row
+find the cursor gone.
+"""
+
+from __future__ import unicode_literals, absolute_import
+
+import itertools
+import socket
+import struct
+import threading
+import time
+
+import bson
+
+OP_REPLY = 1
+OP_QUERY = 2004
+OP_GET_MORE = 2005
+OP_KILL_CURSORS = 2007
+
+_CURSOR_NOT_FOUND = 1
+
+_OPERATORS = {
+    '$gt': lambda value, arg: value is not None and value > arg,
+    '$gte': lambda value, arg: value is not None and value >= arg,
+    '$lt': lambda value, arg: value is not None and value < arg,
+    '$lte': lambda value, arg: value is not None and value <= arg,
+    '$in': lambda value, arg: value in arg,
+}
+
+
+def _get(document, path):
+    for name in path.split('.'):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(name)
+    return document
+
+
+def _matches(document, spec):
+    for key, condition in spec.items():
+        if key == '$and':
+            if not all(_matches(document, part) for part in condition):
+                return False
+            continue
+        value = _get(document, key)
+        if isinstance(condition, dict) and condition and all(
+                name.startswith('$') for name in condition):
+            if not all(_OPERATORS[name](value, arg)
+                       for name, arg in condition.items()):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _cstring(data, pos):
+    end = data.index(b'\0', pos)
+    return data[pos:end].decode('utf8'), end + 1
+
+
+class MongoServer(object):
+    def __init__(self):
+        self._listener = socket.socket()
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(64)
+        self.port = self._listener.getsockname()[1]
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1000)
+        self._closed = False
+        # Namespace: list of documents.
+        self.collections = {}
+        # Every query and getMore, as (op, namespace, number to return),
+        # and the spec of every query.
+        self.operations = []
+        self.specs = []
+        # Ids of the cursors killed.
+        self.killed = []
+        self.get_more_delay = 0
+        self.fail_get_more = 0
+        # Cursor id: [namespace, documents left, starting from].
+        self._cursors = {}
+
+    def start(self):
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._closed = True
+        try:
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._listener.close()
+
+    @property
+    def get_mores(self):
+        return [n for op, _, n in self.operations if op == OP_GET_MORE]
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, _ = self._listener.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(target=self._serve, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, sock):
+        try:
+            while True:
+                length, request_id, _, op = struct.unpack('<iiii', _recv(sock, 16))
+                reply = self._handle(op, _recv(sock, length - 16))
+                if reply is not None:
+                    body = struct.pack('<iqii', *reply[:3] + (len(reply[3]),)) + b''.join(
+                        bson.BSON.encode(document) for document in reply[3])
+                    sock.sendall(struct.pack('<iiii', 16 + len(body), next(self._ids),
+                                             request_id, OP_REPLY) + body)
+        except (EOFError, socket.error):
+            pass
+        finally:
+            sock.close()
+
+    def _handle(self, op, data):
+        # Returns (flags, cursor id, starting from, documents), or None.
+        if op == OP_QUERY:
+            namespace, pos = _cstring(data, 4)
+            skip, to_return = struct.unpack('<ii', data[pos:pos + 8])
+            spec = bson.decode_all(data[pos + 8:])[0]
+            if namespace.endswith('.$cmd'):
+                return 0, 0, 0, [self._command(spec.get('$query', spec))]
+            return self._query(namespace, spec, skip, to_return)
+
+        if op == OP_GET_MORE:
+            namespace, pos = _cstring(data, 4)
+            to_return, cursor_id = struct.unpack('<iq', data[pos:pos + 12])
+            with self._lock:
+                self.operations.append((op, namespace, to_return))
+            if self.get_more_delay:
+                time.sleep(self.get_more_delay)
+            with self._lock:
+                if self.fail_get_more:
+                    self.fail_get_more -= 1
+                    self._cursors.pop(cursor_id, None)
+                cursor = self._cursors.get(cursor_id)
+                if cursor is None:
+                    return _CURSOR_NOT_FOUND, 0, 0, []
+                return self._batch(cursor_id, cursor, to_return)
+
+        if op == OP_KILL_CURSORS:
+            count, = struct.unpack('<i', data[4:8])
+            cursor_ids = struct.unpack('<%dq' % count, data[8:8 + 8 * count])
+            with self._lock:
+                self.killed.extend(cursor_ids)
+                for cursor_id in cursor_ids:
+                    self._cursors.pop(cursor_id, None)
+        return None
+
+    def _command(self, command):
+        if next(iter(command)).lower() == 'ismaster':
+            return {'ismaster': True, 'maxWireVersion': 2, 'minWireVersion': 0,
+                    'maxBsonObjectSize': 16 * 1024 * 1024,
+                    'maxMessageSizeBytes': 48000000, 'ok': 1.0}
+        return {'ok': 1.0}
+
+    def _query(self, namespace, spec, skip, to_return):
+        sort = None
+        if '$query' in spec:
+            sort = spec.get('$orderby')
+            spec = spec['$query']
+        with self._lock:
+            self.operations.append((OP_QUERY, namespace, to_return))
+            self.specs.append(spec)
+            documents = [document for document in self.collections.get(namespace, [])
+                         if _matches(document, spec)]
+        if sort:
+            (key, direction), = sort.items()
+            documents.sort(key=lambda document: _get(document, key),
+                           reverse=direction < 0)
+        documents = documents[skip:]
+        if to_return < 0 or to_return == 1:
+            return 0, 0, 0, documents[:abs(to_return)]
+
+        with self._lock:
+            cursor_id = next(self._ids)
+            cursor = self._cursors[cursor_id] = [namespace, documents, 0]
+            return self._batch(cursor_id, cursor, to_return or 101)
+
+    def _batch(self, cursor_id, cursor, to_return):
+        # Under the lock.
+        _, documents, starting_from = cursor
+        count = to_return or len(documents)
+        batch, cursor[1] = documents[:count], documents[count:]
+        cursor[2] += len(batch)
+        if not cursor[1]:
+            del self._cursors[cursor_id]
+            cursor_id = 0
+        return 0, cursor_id, starting_from, batch
+
+
+def _recv(sock, n):
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
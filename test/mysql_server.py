@@ -0,0 +1,244 @@
+"""A minimal MySQL server on a thread, for tests that need a socket.
+
+It accepts any login and understands a handful of statements: SELECT
+SLEEP(n), which ends early with ER_QUERY_INTERRUPTED once KILL QUERY
+names its connection, KILL QUERY, and SELECT <integer>; it answers a
+statement in :attr:`results`, or one :attr:`handler` returns a result
+for, with its rows, and one in :attr:`errors` with its next error.
+BEGIN, COMMIT and ROLLBACK set the in-transaction status flag, and LOAD
+DATA LOCAL INFILE asks for the file and keeps its packets in
+:attr:`loads`. Anything else gets an OK packet.
+"""
+
+from __future__ import unicode_literals, absolute_import
+
+import re
+import socket
+import struct
+import threading
+import time
+
+ER_QUERY_INTERRUPTED = 1317
+
+_CAPABILITIES = 0xffffffff & ~(1 << 11) & ~(1 << 5)   # no SSL, no compression
+_SLEEP = re.compile(r'\s*SELECT\s+SLEEP\(([\d.]+)\)', re.IGNORECASE)
+_KILL = re.compile(r'\s*KILL\s+(?:QUERY\s+)?(\d+)', re.IGNORECASE)
+_SELECT_INT = re.compile(r'\s*SELECT\s+(\d+)\s*$', re.IGNORECASE)
+_BEGIN = re.compile(r'\s*(?:BEGIN|START\s+TRANSACTION)\b', re.IGNORECASE)
+_END = re.compile(r'\s*(?:COMMIT|ROLLBACK)\b', re.IGNORECASE)
+_LOAD_LOCAL = re.compile(r'\s*LOAD\s+DATA\s+LOCAL\s+INFILE\b', re.IGNORECASE)
+
+_VAR_STRING = 253
+
+_STATUS_IN_TRANS = 1
+_STATUS_AUTOCOMMIT = 2
+
+
+def _lenenc(data):
+    return struct.pack('B', len(data)) + data
+
+
+def _lenenc_int(n):
+    if n < 251:
+        return struct.pack('B', n)
+    return b'\xfd' + struct.pack('<I', n)[:3]
+
+
+class MysqlServer(object):
+    def __init__(self):
+        self._listener = socket.socket()
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(64)
+        self.port = self._listener.getsockname()[1]
+        self._lock = threading.Lock()
+        self._next_id = 100
+        self._killed = set()
+        self._closed = False
+        # Every statement run, as (connection id, SQL).
+        self.statements = []
+        # SQL: (columns, rows), rows any iterable of tuples of bytes or
+        # None, read as the rows are sent. A column is a name, or a
+        # (name, pymysql.constants.FIELD_TYPE) pair; the default is
+        # VAR_STRING.
+        self.results = {}
+        # Called with other statements' SQL; returns (columns, rows) too,
+        # or None.
+        self.handler = None
+        # SQL: list of (code, message), popped each time it runs until empty.
+        self.errors = {}
+        # The file of each LOAD DATA LOCAL INFILE, as a list of packets.
+        self.loads = []
+        self.connections = 0
+
+    def start(self):
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._closed = True
+        try:
+            # Wakes the accepting thread, which close() alone doesn't.
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._listener.close()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, _ = self._listener.accept()
+            except socket.error:
+                return
+            with self._lock:
+                self._next_id += 1
+                self.connections += 1
+                thread_id = self._next_id
+            thread = threading.Thread(target=self._serve, args=(sock, thread_id))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, sock, thread_id):
+        session = _Session(sock)
+        try:
+            session.write(b'\x0a5.7.30-test\0' + struct.pack('<I', thread_id)
+                          + b'abcdefgh\0' + struct.pack('<HBHH', _CAPABILITIES & 0xffff,
+                                                         33, 2, _CAPABILITIES >> 16)
+                          + b'\x15' + b'\0' * 10 + b'ijklmnopqrst\0'
+                          + b'mysql_native_password\0')
+            session.read()
+            session.ok()
+            while True:
+                packet = session.read()
+                command = bytearray(packet[:1])[0]
+                if command == 0x01:
+                    return
+                if command == 0x03:
+                    self._query(session, thread_id, packet[1:].decode('utf8'))
+                else:
+                    session.ok()
+        except (EOFError, socket.error):
+            pass
+        finally:
+            sock.close()
+
+    def _query(self, session, thread_id, sql):
+        with self._lock:
+            self.statements.append((thread_id, sql))
+        match = _SLEEP.match(sql)
+        if match:
+            deadline = time.time() + float(match.group(1))
+            while time.time() < deadline and thread_id not in self._killed:
+                time.sleep(0.01)
+            with self._lock:
+                killed = thread_id in self._killed
+                self._killed.discard(thread_id)
+            if killed:
+                session.error(ER_QUERY_INTERRUPTED, 'Query execution was interrupted')
+            else:
+                session.result('SLEEP', b'0')
+            return
+
+        with self._lock:
+            errors = self.errors.get(sql)
+            error = errors.pop(0) if errors else None
+        if error is not None:
+            session.error(*error)
+            return
+
+        if _BEGIN.match(sql):
+            session.status |= _STATUS_IN_TRANS
+        elif _END.match(sql):
+            session.status &= ~_STATUS_IN_TRANS
+
+        if _LOAD_LOCAL.match(sql):
+            session.write(b'\xfb' + b'asyncdb')
+            packets = []
+            while True:
+                packet = session.read()
+                if not packet:
+                    break
+                packets.append(packet)
+            with self._lock:
+                self.loads.append(packets)
+            session.ok(sum(packet.count(b'\n') for packet in packets))
+            return
+
+        match = _KILL.match(sql)
+        if match:
+            with self._lock:
+                self._killed.add(int(match.group(1)))
+            session.ok()
+            return
+
+        result = self.results.get(sql)
+        if result is None and self.handler is not None:
+            result = self.handler(sql)
+        if result is not None:
+            session.rows(*result)
+            return
+
+        match = _SELECT_INT.match(sql)
+        if match:
+            session.result(match.group(1), match.group(1).encode('ascii'))
+        else:
+            session.ok()
+
+
+class _Session(object):
+    def __init__(self, sock):
+        self.sock = sock
+        self.seq = 0
+        self.status = _STATUS_AUTOCOMMIT
+
+    def _recv(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def read(self):
+        header = bytearray(self._recv(4))
+        self.seq = (header[3] + 1) % 256
+        return self._recv(header[0] | header[1] << 8 | header[2] << 16)
+
+    def write(self, payload):
+        self.sock.sendall(struct.pack('<I', len(payload))[:3]
+                          + struct.pack('B', self.seq) + payload)
+        self.seq = (self.seq + 1) % 256
+
+    def ok(self, affected_rows=0):
+        self.write(b'\0' + _lenenc_int(affected_rows) + b'\0'
+                   + struct.pack('<HH', self.status, 0))
+
+    def error(self, code, message):
+        self.write(b'\xff' + struct.pack('<H', code) + b'#HY000'
+                   + message.encode('utf8'))
+
+    def eof(self):
+        self.write(b'\xfe' + struct.pack('<HH', 0, self.status))
+
+    def result(self, column, value):
+        self.rows([column], [(value,)])
+
+    def rows(self, columns, rows):
+        self.write(struct.pack('B', len(columns)))
+        for column in columns:
+            if isinstance(column, tuple):
+                column, field_type = column
+            else:
+                field_type = _VAR_STRING
+            name = column.encode('utf8')
+            self.write(_lenenc(b'def') + _lenenc(b'') + _lenenc(b'') + _lenenc(b'')
+                       + _lenenc(name) + _lenenc(name) + b'\x0c'
+                       + struct.pack('<HIBHB', 33, 255, field_type, 0, 0) + b'\0\0')
+        self.eof()
+        for row in rows:
+            self.write(b''.join(b'\xfb' if value is None else _lenenc(value)
+                                for value in row))
+        self.eof()
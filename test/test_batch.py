@@ -0,0 +1,153 @@
+from __future__ import unicode_literals, absolute_import
+
+import operator
+import unittest
+
+from tornado import ioloop
+
+from asyncdb.batch import BatchLoader
+from asyncdb.frameworks import tornado as framework
+from asyncdb.mysql import TorMysqlPool
+
+from . import run_on_loop
+from .mysql_server import MysqlServer
+
+
+class BatchLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        # Keys of each fetch, and the keys whose fetch fails.
+        self.fetches = []
+        self.failing = set()
+
+    def tearDown(self):
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    def fetch(self, keys):
+        self.fetches.append(keys)
+        future = framework.get_future(self.io_loop)
+        if self.failing.intersection(keys):
+            future.set_exception(KeyError(keys))
+        else:
+            # Out of order, and nothing for negative keys.
+            future.set_result([{'id': key} for key in reversed(keys) if key >= 0])
+        return future
+
+    def loader(self, **kwargs):
+        return BatchLoader(self.io_loop, framework, self.fetch,
+                           operator.itemgetter('id'), **kwargs)
+
+    @run_on_loop
+    def test_batched(self):
+        loader = self.loader()
+        items = yield [loader.load(1), loader.load(2), loader.load(-1), loader.load(1)]
+        self.assertEqual([{'id': 1}, {'id': 2}, None, {'id': 1}], items)
+        self.assertEqual([[1, 2, -1]], self.fetches)
+        self.assertEqual(1, loader.batches)
+        self.assertEqual(1, loader.cache_hits)
+
+        # Later passes of the loop fetch only what isn't cached.
+        items = yield loader.load_many([2, 3])
+        self.assertEqual([{'id': 2}, {'id': 3}], items)
+        self.assertEqual([[1, 2, -1], [3]], self.fetches)
+
+    @run_on_loop
+    def test_max_batch_size(self):
+        loader = self.loader(max_batch_size=2)
+        items = yield loader.load_many(range(5))
+        self.assertEqual([{'id': i} for i in range(5)], items)
+        self.assertEqual([[0, 1], [2, 3], [4]], self.fetches)
+
+    @run_on_loop
+    def test_no_cache(self):
+        loader = self.loader(cache=False)
+        yield [loader.load(1), loader.load(1)]
+        yield loader.load(1)
+        # Loads in one pass still share a fetch.
+        self.assertEqual([[1], [1]], self.fetches)
+
+    @run_on_loop
+    def test_prime_and_clear(self):
+        loader = self.loader()
+        loader.prime(1, {'id': 1, 'primed': True})
+        item = yield loader.load(1)
+        self.assertEqual({'id': 1, 'primed': True}, item)
+        self.assertEqual([], self.fetches)
+
+        # Priming doesn't replace a loaded item.
+        loader.prime(1, {'id': 1})
+        item = yield loader.load(1)
+        self.assertTrue(item['primed'])
+
+        loader.clear(1)
+        item = yield loader.load(1)
+        self.assertEqual({'id': 1}, item)
+        self.assertEqual([[1]], self.fetches)
+
+    @run_on_loop
+    def test_failed_batch(self):
+        self.failing.add(3)
+        loader = self.loader(max_batch_size=2)
+        futures = [loader.load(key) for key in range(4)]
+        # Only the keys in the failed fetch fail.
+        self.assertEqual({'id': 0}, (yield futures[0]))
+        self.assertEqual({'id': 1}, (yield futures[1]))
+        for future in futures[2:]:
+            with self.assertRaises(KeyError):
+                yield future
+        with self.assertRaises(KeyError):
+            yield loader.load_many([0, 3])
+
+        # Failed keys aren't cached, so a later load tries again.
+        self.failing.clear()
+        item = yield loader.load(3)
+        self.assertEqual({'id': 3}, item)
+        self.assertEqual([[0, 1], [2, 3], [3], [3]], self.fetches)
+
+    @run_on_loop
+    def test_fetch_raising(self):
+        def fetch(keys):
+            raise KeyError(keys)
+
+        loader = BatchLoader(self.io_loop, framework, fetch,
+                             operator.itemgetter('id'))
+        with self.assertRaises(KeyError):
+            yield loader.load(1)
+
+
+class TableLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MysqlServer().start()
+        self.pool = TorMysqlPool('127.0.0.1', self.server.port, 'root', 'root',
+                                 'test', max_size=2)
+
+    def tearDown(self):
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @run_on_loop
+    def test_one_query(self):
+        self.server.results["SELECT `id`, `name` FROM `user` WHERE `id` IN ('2', '1', '9')"] = (
+            ['id', 'name'], [(b'1', b'ann'), (b'2', b'bob')])
+        loader = self.pool.loader('user', columns=['name'])
+        items = yield [loader.load('2'), loader.load('1'), loader.load('9')]
+        self.assertEqual([{'id': '2', 'name': 'bob'}, {'id': '1', 'name': 'ann'}, None],
+                         items)
+        self.assertEqual(1, len(self.server.statements))
+
+    @run_on_loop
+    def test_percent_in_identifiers(self):
+        self.server.results["SELECT * FROM `100%` WHERE `k%s` IN ('a')"] = (
+            ['k%s'], [(b'a',)])
+        loader = self.pool.loader('100%', key='k%s')
+        item = yield loader.load('a')
+        self.assertEqual({'k%s': 'a'}, item)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+from __future__ import unicode_literals, absolute_import
+
+import textwrap
+import unittest
+
+from tornado import gen, ioloop
+from tornado.concurrent import Future
+
+from asyncdb.errors import CallbackTypeError
+from asyncdb.mongo import MotorClient
+from asyncdb.pycompat import PY35
+
+from . import run_on_loop
+from .mongo_server import MongoServer
+
+
+class BatchesTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MongoServer().start()
+        self.server.collections['db.c'] = [{'_id': i} for i in range(25)]
+        self.client = MotorClient('127.0.0.1', self.server.port, io_loop=self.io_loop)
+        self.collection = self.client.db.c
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    def each_batch(self, cursor, stop_after=None):
+        # Resolves to the ids of each batch, and the error or None.
+        done = Future()
+        batches = []
+
+        def callback(batch, error):
+            if batch is None:
+                done.set_result((batches, error))
+                return None
+            batches.append([document['_id'] for document in batch])
+            if len(batches) == stop_after:
+                done.set_result((batches, None))
+                return False
+
+        cursor.each_batch(callback)
+        return done
+
+    def ids(self, start, stop):
+        return list(range(start, stop))
+
+    @run_on_loop
+    def test_each_batch(self):
+        batches, error = yield self.each_batch(self.collection.find().batch_size(10))
+        self.assertIsNone(error)
+        self.assertEqual([self.ids(0, 10), self.ids(10, 20), self.ids(20, 25)], batches)
+
+    @run_on_loop
+    def test_each_batch_with_prefetch(self):
+        cursor = self.collection.find(prefetch=True).batch_size(10)
+        batches, error = yield self.each_batch(cursor)
+        self.assertIsNone(error)
+        self.assertEqual(self.ids(0, 25), sum(batches, []))
+
+    @run_on_loop
+    def test_each_batch_cancelled(self):
+        cursor = self.collection.find().batch_size(10)
+        batches, _ = yield self.each_batch(cursor, stop_after=1)
+        self.assertEqual([self.ids(0, 10)], batches)
+        yield gen.sleep(0.05)
+        self.assertEqual([], self.server.get_mores)
+        yield cursor.close()
+
+    @run_on_loop
+    def test_each_batch_error(self):
+        self.server.fail_get_more = 1
+        batches, error = yield self.each_batch(self.collection.find().batch_size(10))
+        self.assertEqual([self.ids(0, 10)], batches)
+        self.assertIsNotNone(error)
+
+    def test_each_batch_needs_callback(self):
+        self.assertRaises(CallbackTypeError, self.collection.find().each_batch, None)
+
+    @run_on_loop
+    def test_next_batch(self):
+        cursor = self.collection.find().batch_size(10)
+        self.assertEqual([], cursor.next_batch())
+        batches = []
+        while (yield cursor.fetch_next):
+            batches.append([document['_id'] for document in cursor.next_batch()])
+        self.assertEqual([self.ids(0, 10), self.ids(10, 20), self.ids(20, 25)], batches)
+
+    if PY35:
+        exec(textwrap.dedent("""
+        async def read_batches(self, cursor):
+            batches = []
+            async for batch in cursor.batches():
+                batches.append([document['_id'] for document in batch])
+            return batches
+        """), globals(), locals())
+
+        @run_on_loop
+        def test_batches(self):
+            cursor = self.collection.find().batch_size(10)
+            batches = yield self.read_batches(cursor)
+            self.assertEqual([self.ids(0, 10), self.ids(10, 20), self.ids(20, 25)],
+                             batches)
+
+
+if __name__ == '__main__':
+    unittest.main()
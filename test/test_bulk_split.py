@@ -0,0 +1,77 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+import pymongo.errors
+from tornado import ioloop
+
+from asyncdb.frameworks import tornado as framework
+from asyncdb.mongo import MotorClient
+from asyncdb.mongo.core import MIN_BULK_SPLIT_SIZE
+
+
+class SplitBulkTest(unittest.TestCase):
+    """An unordered bulk write split in two, its parts ended by the test."""
+
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.client = MotorClient('127.0.0.1', 1, io_loop=self.io_loop, _connect=False)
+        self.bulk = self.client.db.c.initialize_unordered_bulk_op()
+        for i in range(2 * MIN_BULK_SPLIT_SIZE):
+            self.bulk.insert({'_id': i})
+        self.parts = []
+        self.bulk._execute_part = self._execute_part
+
+    def tearDown(self):
+        self.client.close()
+        self.io_loop.close(all_fds=True)
+
+    def _execute_part(self, ops, args, kwargs):
+        self.parts.append(framework.get_future(self.io_loop))
+        return self.parts[-1]
+
+    def execute(self):
+        future = self.bulk.execute(concurrency=2)
+        self.assertEqual(2, len(self.parts))
+        return future
+
+    def test_results_are_merged(self):
+        future = self.execute()
+        self.parts[0].set_result({'nInserted': MIN_BULK_SPLIT_SIZE, 'nModified': 0})
+        self.parts[1].set_exception(pymongo.errors.BulkWriteError({
+            'nInserted': MIN_BULK_SPLIT_SIZE - 1, 'nModified': 0,
+            'writeErrors': [{'index': 3, 'code': 11000, 'errmsg': 'dup'}]}))
+        with self.assertRaises(pymongo.errors.BulkWriteError) as context:
+            future.result()
+        details = context.exception.details
+        self.assertEqual(2 * MIN_BULK_SPLIT_SIZE - 1, details['nInserted'])
+        self.assertEqual([MIN_BULK_SPLIT_SIZE + 3],
+                         [error['index'] for error in details['writeErrors']])
+
+    def test_other_error_keeps_the_other_parts_results(self):
+        future = self.execute()
+        self.parts[0].set_result({'nInserted': MIN_BULK_SPLIT_SIZE, 'nModified': 0})
+        self.parts[1].set_exception(pymongo.errors.AutoReconnect('connection closed'))
+        with self.assertRaises(pymongo.errors.BulkWriteError) as context:
+            future.result()
+        details = context.exception.details
+        self.assertEqual(MIN_BULK_SPLIT_SIZE, details['nInserted'])
+        self.assertEqual(0, details['nModified'])
+        errors = details['writeErrors']
+        self.assertEqual(list(range(MIN_BULK_SPLIT_SIZE, 2 * MIN_BULK_SPLIT_SIZE)),
+                         [error['index'] for error in errors])
+        self.assertEqual({'index': MIN_BULK_SPLIT_SIZE, 'code': None,
+                          'errmsg': 'connection closed',
+                          'op': {'_id': MIN_BULK_SPLIT_SIZE}}, errors[0])
+
+    def test_every_part_failing_raises_the_error(self):
+        future = self.execute()
+        self.parts[1].set_exception(pymongo.errors.AutoReconnect('second'))
+        self.parts[0].set_exception(pymongo.errors.AutoReconnect('first'))
+        with self.assertRaises(pymongo.errors.AutoReconnect) as context:
+            future.result()
+        self.assertEqual('first', str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+from asyncdb.cache import ResultCache
+from asyncdb.frameworks import tornado as framework
+
+
+class _Loader(object):
+    """load() hands out Futures the test resolves."""
+
+    def __init__(self):
+        self.futures = []
+
+    def __call__(self):
+        future = framework.get_future(None)
+        self.futures.append(future)
+        return future
+
+    def finish(self, value):
+        self.futures[-1].set_result(value)
+
+
+class ResultCacheTest(unittest.TestCase):
+    def fetch(self, cache, key, load, tags=('t',), refresh=None):
+        return cache.fetch(key, frozenset(tags), load, None, framework, refresh)
+
+    def test_hit_after_miss(self):
+        cache, load = ResultCache(), _Loader()
+        first = self.fetch(cache, 'k', load)
+        load.finish([{'id': 1}])
+        self.assertEqual([{'id': 1}], first.result())
+        second = self.fetch(cache, 'k', load)
+        self.assertEqual([{'id': 1}], second.result())
+        self.assertEqual(1, len(load.futures))
+        self.assertEqual((1, 1), (cache.misses, cache.hits))
+
+    def test_concurrent_misses_share_one_load(self):
+        cache, load = ResultCache(), _Loader()
+        first = self.fetch(cache, 'k', load)
+        second = self.fetch(cache, 'k', load)
+        load.finish(1)
+        self.assertEqual((1, 1), (first.result(), second.result()))
+        self.assertEqual(1, len(load.futures))
+
+    def test_callers_get_copies(self):
+        cache, load = ResultCache(), _Loader()
+        self.fetch(cache, 'k', load)
+        load.finish({'a': [1]})
+        self.fetch(cache, 'k', load).result()['a'].append(2)
+        self.assertEqual({'a': [1]}, self.fetch(cache, 'k', load).result())
+
+    def test_failed_load_is_not_cached(self):
+        cache, load = ResultCache(), _Loader()
+        future = self.fetch(cache, 'k', load)
+        load.futures[-1].set_exception(ValueError('boom'))
+        self.assertRaises(ValueError, future.result)
+        self.fetch(cache, 'k', load)
+        self.assertEqual(2, len(load.futures))
+
+    def test_invalidate_drops_tagged_results(self):
+        cache, load = ResultCache(), _Loader()
+        self.fetch(cache, 'a', load, tags=('t',))
+        load.finish(1)
+        self.fetch(cache, 'b', load, tags=('u',))
+        load.finish(2)
+        cache.invalidate('t')
+        self.assertEqual(1, cache.invalidations)
+        self.fetch(cache, 'a', load)
+        self.fetch(cache, 'b', load)
+        self.assertEqual(3, len(load.futures))
+
+    def test_invalidated_while_loading_is_not_stored(self):
+        cache, load = ResultCache(), _Loader()
+        self.fetch(cache, 'k', load)
+        cache.invalidate('t')
+        load.finish(1)
+        self.assertEqual(0, cache.stats()['entries'])
+
+    def test_clear(self):
+        cache, load = ResultCache(), _Loader()
+        self.fetch(cache, 'k', load)
+        load.finish(1)
+        cache.clear()
+        self.assertEqual((0, 0), (cache.stats()['entries'], cache.bytes))
+
+    def test_least_recently_used_is_evicted(self):
+        cache, load = ResultCache(), _Loader()
+        for key in 'abc':
+            self.fetch(cache, key, load)
+            load.finish('x' * 100)
+        cache.max_bytes = cache.bytes
+        self.fetch(cache, 'a', load)
+        self.fetch(cache, 'd', load)
+        load.finish('x' * 100)
+        self.assertEqual(['c', 'a', 'd'], list(cache._entries))
+        self.assertEqual(1, cache.evictions)
+
+    def test_too_large_result_is_not_stored(self):
+        cache, load = ResultCache(max_bytes=10), _Loader()
+        self.fetch(cache, 'k', load)
+        load.finish('x' * 100)
+        self.assertEqual(0, cache.stats()['entries'])
+
+    def test_stale_result_is_returned_while_refreshing(self):
+        cache, load = ResultCache(ttl=0, stale_ttl=60), _Loader()
+        refresh = _Loader()
+        self.fetch(cache, 'k', load)
+        load.finish(1)
+        stale = self.fetch(cache, 'k', load, refresh=refresh)
+        self.assertEqual(1, stale.result())
+        self.assertEqual(1, cache.stale_hits)
+        self.assertEqual(1, len(refresh.futures))
+        # One refresh at a time.
+        self.fetch(cache, 'k', load, refresh=refresh)
+        self.assertEqual(1, len(refresh.futures))
+        refresh.finish(2)
+        self.assertEqual(2, self.fetch(cache, 'k', load).result())
+
+    def test_expired_result_is_reloaded(self):
+        cache, load = ResultCache(ttl=0), _Loader()
+        self.fetch(cache, 'k', load)
+        load.finish(1)
+        future = self.fetch(cache, 'k', load)
+        self.assertFalse(future.done())
+        load.finish(2)
+        self.assertEqual(2, future.result())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+from __future__ import unicode_literals, absolute_import
+
+import datetime
+import unittest
+
+import bson
+import pymongo.errors
+from tornado import gen, ioloop
+
+from asyncdb.mongo import MotorClient
+from asyncdb.mongo.core import _split_ids
+
+from . import run_on_loop
+from .mongo_server import MongoServer
+
+
+class SplitIdsTest(unittest.TestCase):
+    def test_integers(self):
+        self.assertEqual([26, 51, 76], _split_ids(1, 100, 4))
+        self.assertEqual([5], _split_ids(0, 9, 2))
+        self.assertEqual([], _split_ids(7, 7, 4))
+        # More parts than _ids: a range for each.
+        self.assertEqual([1, 2], _split_ids(0, 2, 8))
+
+    def test_object_ids(self):
+        start = datetime.datetime(2016, 1, 1)
+        low = bson.ObjectId.from_datetime(start)
+        high = bson.ObjectId.from_datetime(start + datetime.timedelta(hours=4))
+        boundaries = _split_ids(low, high, 4)
+        self.assertEqual([start + datetime.timedelta(hours=hours)
+                          for hours in (1, 2, 3)],
+                         [boundary.generation_time.replace(tzinfo=None)
+                          for boundary in boundaries])
+        self.assertEqual(sorted(boundaries), boundaries)
+        self.assertTrue(low < boundaries[0] and boundaries[-1] < high)
+
+    def test_object_ids_too_close(self):
+        low = bson.ObjectId()
+        self.assertEqual([], _split_ids(low, bson.ObjectId(), 4))
+
+    def test_other_types(self):
+        self.assertEqual([], _split_ids(False, True, 2))
+        self.assertEqual([], _split_ids(1, 'z', 4))
+        self.assertEqual([], _split_ids('a', 'z', 4))
+
+
+class CollectionScanTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MongoServer().start()
+        self.server.collections['db.c'] = [{'_id': i, 'even': i % 2 == 0}
+                                           for i in range(100)]
+        self.client = MotorClient('127.0.0.1', self.server.port, io_loop=self.io_loop)
+        self.collection = self.client.db.c
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @gen.coroutine
+    def read(self, scan):
+        ids = []
+        while (yield scan.fetch_next):
+            ids.extend(document['_id'] for document in scan.next_object())
+        raise gen.Return(ids)
+
+    def ranges(self, specs=None):
+        # The _id condition of each range's query, past the two for the
+        # ends, by lower bound.
+        if specs is None:
+            specs = self.server.specs[2:]
+        conditions = [spec.get('_id') for spec in specs]
+        return sorted(conditions, key=lambda condition: (condition or {}).get('$gte', -1))
+
+    @run_on_loop
+    def test_every_document_once(self):
+        scan = self.collection.scan_parallel(4, batch_size=7)
+        ids = yield self.read(scan)
+        self.assertEqual(list(range(100)), sorted(ids))
+        self.assertEqual(0, scan.restarts)
+        self.assertEqual([{'$lt': 25}, {'$gte': 25, '$lt': 50},
+                          {'$gte': 50, '$lt': 75}, {'$gte': 75}],
+                         self.ranges())
+
+    @run_on_loop
+    def test_concurrency(self):
+        scan = self.collection.scan_parallel(4, concurrency=2, batch_size=10)
+        self.assertEqual(list(range(100)), sorted((yield self.read(scan))))
+        self.assertEqual(4, len(self.ranges()))
+
+    @run_on_loop
+    def test_spec(self):
+        scan = self.collection.scan_parallel(3, spec={'even': True})
+        self.assertEqual(list(range(0, 100, 2)), sorted((yield self.read(scan))))
+        for spec in self.server.specs[2:]:
+            self.assertEqual({'even': True}, spec['$and'][0])
+
+    @run_on_loop
+    def test_boundaries(self):
+        scan = self.collection.scan_parallel(boundaries=[10, 90])
+        self.assertEqual(list(range(100)), sorted((yield self.read(scan))))
+        # No queries for the ends.
+        self.assertEqual([{'$lt': 10}, {'$gte': 10, '$lt': 90}, {'$gte': 90}],
+                         self.ranges(self.server.specs))
+
+    @run_on_loop
+    def test_empty_collection(self):
+        self.server.collections['db.c'] = []
+        scan = self.collection.scan_parallel(4)
+        self.assertEqual([], (yield self.read(scan)))
+        # The whole range, in one cursor.
+        self.assertEqual([None], self.ranges())
+
+    @run_on_loop
+    def test_restart_after_cursor_lost(self):
+        self.server.fail_get_more = 1
+        scan = self.collection.scan_parallel(2, concurrency=1, batch_size=10)
+        self.assertEqual(list(range(100)), sorted((yield self.read(scan))))
+        self.assertEqual(1, scan.restarts)
+        # Reopened after the last _id the first batch read.
+        self.assertIn({'$gt': 9, '$lt': 50}, self.ranges())
+
+    @run_on_loop
+    def test_retries_run_out(self):
+        self.server.fail_get_more = 3
+        scan = self.collection.scan_parallel(2, concurrency=1, batch_size=10,
+                                             retries=2)
+        with self.assertRaises(pymongo.errors.CursorNotFound):
+            yield self.read(scan)
+        self.assertEqual(2, scan.restarts)
+
+    @run_on_loop
+    def test_max_buffered(self):
+        scan = self.collection.scan_parallel(4, batch_size=5, max_buffered=10)
+        self.assertTrue((yield scan.fetch_next))
+        yield gen.sleep(0.1)
+        # Each cursor stops once 10 wait, so at most a batch past that.
+        self.assertLessEqual(scan._buffered, 10 + 4 * 5)
+        self.assertLess(len(self.server.get_mores), 10)
+        self.assertEqual(list(range(100)), sorted((yield self.read(scan))))
+
+    @run_on_loop
+    def test_close(self):
+        scan = self.collection.scan_parallel(2, batch_size=5, max_buffered=5)
+        self.assertTrue((yield scan.fetch_next))
+        scan.close()
+        self.assertIsNone(scan.next_object())
+        self.assertFalse((yield scan.fetch_next))
+
+    def test_fields_must_keep_id(self):
+        self.assertRaises(pymongo.errors.InvalidOperation,
+                          self.collection.scan_parallel, fields={'_id': False})
+
+
+if __name__ == '__main__':
+    unittest.main()
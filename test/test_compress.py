@@ -0,0 +1,98 @@
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import struct
+import unittest
+import zlib
+
+from pymysql import err
+
+from asyncdb.mysql.compress import CompressedStream, MAX_FRAME_LEN
+
+
+def _header(data):
+    length, seq, uncompressed_length = struct.unpack('<3sB3s', data[:7])
+    return (struct.unpack('<I', length + b'\0')[0], seq,
+            struct.unpack('<I', uncompressed_length + b'\0')[0])
+
+
+class FrameTest(unittest.TestCase):
+    def test_short_payload_is_sent_uncompressed(self):
+        stream = CompressedStream(io.BytesIO(), threshold=50)
+        frame = stream.frame(b'x' * 10)
+        self.assertEqual((10, 0, 0), _header(frame))
+        self.assertEqual(b'x' * 10, frame[7:])
+
+    def test_long_payload_is_compressed(self):
+        stream = CompressedStream(io.BytesIO(), threshold=50)
+        frame = stream.frame(b'x' * 1000)
+        length, seq, uncompressed_length = _header(frame)
+        self.assertEqual(1000, uncompressed_length)
+        self.assertEqual(len(frame) - 7, length)
+        self.assertEqual(b'x' * 1000, zlib.decompress(frame[7:]))
+        self.assertEqual(len(frame), stream.bytes_sent)
+        self.assertEqual(1000, stream.bytes_uncompressed)
+
+    def test_incompressible_payload_is_sent_as_is(self):
+        data = os.urandom(200)
+        frame = CompressedStream(io.BytesIO(), threshold=10).frame(data)
+        self.assertEqual((len(data), 0, 0), _header(frame))
+        self.assertEqual(data, frame[7:])
+
+    def test_sequence_restarts_with_each_command(self):
+        stream = CompressedStream(io.BytesIO())
+        self.assertEqual(0, _header(stream.frame(b'a'))[1])
+        self.assertEqual(1, _header(stream.frame(b'b'))[1])
+        stream.start_command()
+        self.assertEqual(0, _header(stream.frame(b'c'))[1])
+
+    def test_empty_payload_is_one_frame(self):
+        self.assertEqual(7, len(CompressedStream(io.BytesIO()).frame(b'')))
+
+    def test_large_payload_is_split(self):
+        stream = CompressedStream(io.BytesIO())
+        frames = stream.frame(b'\0' * (MAX_FRAME_LEN + 10))
+        first_length, first_seq, first_uncompressed = _header(frames)
+        second = frames[7 + first_length:]
+        self.assertEqual((0, MAX_FRAME_LEN), (first_seq, first_uncompressed))
+        self.assertEqual((len(second) - 7, 1, 0), _header(second))
+
+
+class ReadTest(unittest.TestCase):
+    def test_read_round_trip(self):
+        writer = CompressedStream(io.BytesIO(), threshold=50)
+        data = ''.join('row %d,' % i for i in range(500)).encode('ascii')
+        frames = writer.frame(data[:100]) + writer.frame(data[100:])
+        reader = CompressedStream(io.BytesIO(frames))
+        self.assertEqual(data[:3], reader.read(3))
+        self.assertEqual(data[3:2000], reader.read(1997))
+        self.assertEqual(data[2000:], reader.read(len(data)))
+        self.assertEqual(len(frames), reader.bytes_received)
+        self.assertEqual(len(data), reader.bytes_decompressed)
+
+    def test_read_past_end_returns_what_is_left(self):
+        frames = CompressedStream(io.BytesIO()).frame(b'abc')
+        reader = CompressedStream(io.BytesIO(frames[:-1]))
+        self.assertEqual(b'', reader.read(3))
+        reader = CompressedStream(io.BytesIO(frames))
+        self.assertEqual(b'abc', reader.read(10))
+
+    def test_reply_continues_the_command_sequence(self):
+        server = CompressedStream(io.BytesIO())
+        server.frame(b'query')
+        # The reply's frame is numbered 1, after the command's.
+        client = CompressedStream(io.BytesIO(server.frame(b'reply')))
+        client.start_command()
+        client.frame(b'query')
+        self.assertEqual(b'reply', client.read(5))
+
+    def test_wrong_sequence_raises(self):
+        writer = CompressedStream(io.BytesIO())
+        frames = writer.frame(b'abc') + writer.frame(b'def')
+        reader = CompressedStream(io.BytesIO(frames[10:]))
+        self.assertRaises(err.InternalError, reader.read, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
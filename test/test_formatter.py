@@ -0,0 +1,124 @@
+from __future__ import unicode_literals, absolute_import
+
+import datetime
+import decimal
+import unittest
+
+import pymysql.connections
+import pymysql.converters
+import pymysql.cursors
+from pymysql.constants import SERVER_STATUS
+
+from asyncdb.mysql import formatter
+from asyncdb.mysql.formatter import TemplateCache, compile_template
+from asyncdb.pycompat import PY3
+
+
+class _Point(object):
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+def _escape_point(point, mapping=None):
+    return 'POINT(%d, %d)' % (point.x, point.y)
+
+
+class _QuotingConnection(pymysql.connections.Connection):
+    def escape(self, obj, mapping=None):
+        return '<%s>' % super(_QuotingConnection, self).escape(obj, mapping)
+
+
+@unittest.skipUnless(PY3, 'templates are used on Python 3 only')
+class TemplateTest(unittest.TestCase):
+    ARGS = (1, -2.5, None, True, "it's \\ \"x\"\n", b"b'\xff\0",
+            datetime.datetime(2020, 1, 2, 3, 4, 5, 6), datetime.date(2020, 1, 2),
+            datetime.time(1, 2, 3), datetime.timedelta(hours=-1, seconds=5),
+            decimal.Decimal('1.50'), [1, 'a'], (None, 2))
+
+    def connection(self, cls=pymysql.connections.Connection, server_status=0):
+        conn = cls(defer_connect=True)
+        conn.server_status = server_status
+        return conn
+
+    def assertMogrifies(self, query, args, conn=None):
+        conn = conn or self.connection()
+        expected = pymysql.cursors.Cursor(conn).mogrify(query, args)
+        template = compile_template(query)
+        self.assertTrue(template.accepts(args))
+        self.assertEqual(expected, template.format(args, conn))
+
+    def test_positional(self):
+        query = 'SELECT ' + ', '.join(['%s'] * len(self.ARGS)) + ' FROM t'
+        self.assertMogrifies(query, self.ARGS)
+
+    def test_named_and_percent(self):
+        self.assertMogrifies("SELECT %(a)s LIKE 'x%%' OR %(b)s = %(a)s",
+                             {'a': "o'k", 'b': 3})
+
+    def test_no_backslash_escapes(self):
+        conn = self.connection(
+            server_status=SERVER_STATUS.SERVER_STATUS_NO_BACKSLASH_ESCAPES)
+        self.assertMogrifies('SELECT %s, %s', ("it's \\", ["a'b"]), conn)
+
+    def test_encoder_registered_later(self):
+        pymysql.converters.encoders[_Point] = _escape_point
+        try:
+            self.assertMogrifies('SELECT %s', (_Point(1, 2),))
+        finally:
+            del pymysql.converters.encoders[_Point]
+        self.assertRaises(Exception, compile_template('SELECT %s').format,
+                          (_Point(1, 2),), self.connection())
+
+    def test_encoder_replaced_later(self):
+        encoders = pymysql.converters.encoders
+        original = encoders[int]
+        encoders[int] = lambda value, mapping=None: 'CAST(%d AS SIGNED)' % value
+        try:
+            self.assertMogrifies('SELECT %s', (7,))
+        finally:
+            encoders[int] = original
+        self.assertMogrifies('SELECT %s', (7,))
+
+    def test_connection_with_its_own_escape(self):
+        conn = self.connection(_QuotingConnection)
+        self.assertMogrifies('SELECT %s, %s', (1, 'a'), conn)
+        self.assertEqual('SELECT <1>', compile_template('SELECT %s').format((1,), conn))
+
+    def test_connection_with_its_own_encoders(self):
+        conn = self.connection()
+        conn.encoders = dict(conn.encoders)
+        conn.encoders[int] = lambda value, mapping=None: 'x'
+        # Whatever conn.escape() makes of them.
+        self.assertMogrifies('SELECT %s, %s', (1, 'a'), conn)
+
+    def test_no_args(self):
+        self.assertMogrifies('SELECT 1', ())
+
+    def test_escape_table_fallback(self):
+        self.assertEqual(pymysql.converters._escape_table, formatter._escape_table())
+
+
+class CompileTemplateTest(unittest.TestCase):
+    def test_unsupported_queries(self):
+        self.assertIsNone(compile_template('SELECT %d'))
+        self.assertIsNone(compile_template('SELECT %s, %(a)s'))
+
+    def test_literals(self):
+        template = compile_template("a %s b %% c %s")
+        self.assertEqual(['a ', ' b % c ', ''], template.literals)
+        self.assertIsNone(template.names)
+        self.assertFalse(template.accepts((1,)))
+        self.assertEqual(['a'], compile_template('%(a)s').names)
+
+    def test_cache(self):
+        cache = TemplateCache(max_templates=2)
+        first = cache.get('SELECT %s')
+        self.assertIs(first, cache.get('SELECT %s'))
+        cache.get('a %s')
+        cache.get('b %s')
+        self.assertEqual(['a %s', 'b %s'], list(cache._templates))
+        self.assertEqual((1, 3), (cache.hits, cache.misses))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+from asyncdb.frameworks import tornado as framework
+from asyncdb.limit import ConcurrencyLimit, ConcurrentMap
+
+
+def _future():
+    return framework.get_future(None)
+
+
+def _resolved(result):
+    future = _future()
+    future.set_result(result)
+    return future
+
+
+class _Cursor(object):
+    """Items through fetch_next and next_object(); with `deferred`, each
+    fetch_next waits for the test to call fetched()."""
+
+    def __init__(self, items, deferred=False):
+        self.items = list(items)
+        self.deferred = deferred
+        self.fetches = []
+        self._current = None
+
+    @property
+    def fetch_next(self):
+        if not self.deferred:
+            return _resolved(self._advance())
+        future = _future()
+        self.fetches.append(future)
+        return future
+
+    def fetched(self):
+        self.fetches.pop(0).set_result(self._advance())
+
+    def _advance(self):
+        if not self.items:
+            return False
+        self._current = self.items.pop(0)
+        return True
+
+    def next_object(self):
+        return self._current
+
+
+class _Calls(object):
+    """The function to map, handing out Futures the test resolves."""
+
+    def __init__(self):
+        self.futures = {}
+
+    def __call__(self, item):
+        self.futures[item] = _future()
+        return self.futures[item]
+
+    def finish(self, item, result=None):
+        self.futures[item].set_result(item * 10 if result is None else result)
+
+
+class ConcurrencyLimitTest(unittest.TestCase):
+    def test_runs_at_most_limit_at_once(self):
+        limit = ConcurrencyLimit(None, framework, 2)
+        started = []
+
+        def start():
+            future = _future()
+            started.append(future)
+            return future
+
+        results = [limit.run(start) for _ in range(4)]
+        self.assertEqual((2, 2, 2), (len(started), limit.active, limit.waiting))
+
+        started[1].set_result('b')
+        self.assertEqual('b', results[1].result())
+        self.assertEqual((3, 2, 1), (len(started), limit.active, limit.waiting))
+
+        for index, future in enumerate(started[:]):
+            if not future.done():
+                future.set_result(index)
+        started[3].set_result(3)
+        self.assertEqual([0, 'b', 2, 3], [result.result() for result in results])
+        self.assertEqual((0, 0), (limit.active, limit.waiting))
+
+    def test_waiting_start_in_order(self):
+        limit = ConcurrencyLimit(None, framework, 1)
+        order = []
+        first = _future()
+        limit.run(lambda: first)
+        for name in 'abc':
+            limit.run(lambda name=name: order.append(name) or _future())
+        first.set_result(None)
+        self.assertEqual(['a'], order)
+
+    def test_errors_free_the_slot(self):
+        limit = ConcurrencyLimit(None, framework, 1)
+
+        def fail():
+            raise ValueError('boom')
+
+        failing = _future()
+        first = limit.run(lambda: failing)
+        second = limit.run(fail)
+        third = limit.run(lambda: _future())
+        failing.set_exception(KeyError('k'))
+        self.assertRaises(KeyError, first.result)
+        self.assertRaises(ValueError, second.result)
+        self.assertFalse(third.done())
+        self.assertEqual(1, limit.active)
+
+    def test_limit_must_be_positive(self):
+        self.assertRaises(ValueError, ConcurrencyLimit, None, framework, 0)
+
+
+class ConcurrentMapTest(unittest.TestCase):
+    def map(self, cursor, calls, **kwargs):
+        concurrent_map = ConcurrentMap(None, framework, cursor, calls, **kwargs)
+        concurrent_map.start()
+        return concurrent_map
+
+    def test_reads_only_when_there_is_room(self):
+        cursor, calls = _Cursor([1, 2, 3, 4]), _Calls()
+        concurrent_map = self.map(cursor, calls, concurrency=2)
+        self.assertEqual([1, 2], sorted(calls.futures))
+        self.assertEqual([3, 4], cursor.items)
+        calls.finish(2)
+        self.assertEqual([1, 2, 3], sorted(calls.futures))
+        for item in (1, 3, 4):
+            calls.finish(item)
+        self.assertEqual([20, 10, 30, 40], concurrent_map.future.result())
+        self.assertEqual(4, concurrent_map.count)
+
+    def test_ordered_results_hold_their_room(self):
+        cursor, calls = _Cursor([1, 2, 3]), _Calls()
+        concurrent_map = self.map(cursor, calls, concurrency=2, ordered=True)
+        calls.finish(2)
+        # 2 is done but waits for 1, so 3 isn't started.
+        self.assertEqual([1, 2], sorted(calls.futures))
+        calls.finish(1)
+        calls.finish(3)
+        self.assertEqual([10, 20, 30], concurrent_map.future.result())
+
+    def test_deferred_fetches(self):
+        cursor, calls = _Cursor([1, 2], deferred=True), _Calls()
+        concurrent_map = self.map(cursor, calls, concurrency=4)
+        # One fetch at a time.
+        self.assertEqual(1, len(cursor.fetches))
+        cursor.fetched()
+        cursor.fetched()
+        calls.finish(1)
+        calls.finish(2)
+        self.assertFalse(concurrent_map.future.done())
+        cursor.fetched()
+        self.assertEqual([10, 20], concurrent_map.future.result())
+
+    def test_on_result(self):
+        cursor, calls, seen = _Cursor([1, 2]), _Calls(), []
+        concurrent_map = self.map(cursor, calls, on_result=seen.append)
+        calls.finish(1)
+        calls.finish(2)
+        self.assertEqual([10, 20], seen)
+        self.assertEqual(2, concurrent_map.future.result())
+        self.assertIsNone(concurrent_map.results)
+
+    def test_empty_cursor(self):
+        self.assertEqual([], self.map(_Cursor([]), _Calls()).future.result())
+
+    def test_first_error_stops_reading(self):
+        cursor, calls = _Cursor([1, 2, 3]), _Calls()
+        concurrent_map = self.map(cursor, calls, concurrency=1)
+        calls.futures[1].set_exception(ValueError('boom'))
+        self.assertRaises(ValueError, concurrent_map.future.result)
+        self.assertEqual([2, 3], cursor.items)
+
+    def test_function_raising(self):
+        def function(item):
+            raise KeyError(item)
+
+        concurrent_map = self.map(_Cursor([1]), function)
+        self.assertRaises(KeyError, concurrent_map.future.result)
+
+    def test_concurrency_must_be_positive(self):
+        self.assertRaises(ValueError, ConcurrentMap, None, framework,
+                          _Cursor([]), _Calls(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+from __future__ import unicode_literals, absolute_import
+
+import datetime
+import decimal
+import unittest
+
+import pymysql.err
+from pymysql.constants import ER
+from tornado import gen, ioloop
+
+from asyncdb import errors
+from asyncdb.frameworks import tornado as framework
+from asyncdb.mysql import TorMysqlPool
+from asyncdb.mysql.loader import (ChunkPipe, RowEncoder, encode_row,
+                                  load_data_sql, quote_identifier)
+
+from . import run_on_loop
+from .mysql_server import MysqlServer
+
+
+class EncodeTest(unittest.TestCase):
+    def test_fields(self):
+        row = (None, True, False, 7, 1.5, decimal.Decimal('2.50'),
+               datetime.datetime(2016, 1, 2, 3, 4, 5), b'raw', 'caf\xe9')
+        self.assertEqual(b'\\N\t1\t0\t7\t1.5\t2.50\t2016-01-02 03:04:05\traw\tcaf\xc3\xa9\n',
+                         encode_row(row, 'utf8'))
+
+    def test_special_characters_escaped(self):
+        self.assertEqual(b'a\\tb\\nc\\rd\\0e\\\\f\n',
+                         encode_row(('a\tb\nc\rd\0e\\f',), 'utf8'))
+        # The string 'NULL' or '\N' isn't NULL.
+        self.assertEqual(b'NULL\t\\\\N\n', encode_row(('NULL', '\\N'), 'utf8'))
+
+    def test_quote_identifier(self):
+        self.assertEqual('`db`.`t``x`', quote_identifier('db.t`x'))
+
+    def test_load_data_sql(self):
+        self.assertEqual(
+            "LOAD DATA LOCAL INFILE 'asyncdb' INTO TABLE `t` CHARACTER SET utf8"
+            " FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'"
+            " LINES TERMINATED BY '\\n' (`id`, `name`)",
+            load_data_sql('t', ['id', 'name'], 'utf8'))
+
+
+class RowEncoderTest(unittest.TestCase):
+    def test_chunks(self):
+        encoder = RowEncoder('utf8', chunk_size=10)
+        self.assertIsNone(encoder.add((1, 'a')))
+        self.assertIsNone(encoder.add((2, 'b')))
+        self.assertEqual(b'1\ta\n2\tb\n3\tc\n', encoder.add((3, 'c')))
+        self.assertIsNone(encoder.flush())
+        self.assertIsNone(encoder.add((4, 'd')))
+        self.assertEqual(b'4\td\n', encoder.flush())
+        self.assertIsNone(encoder.flush())
+
+    def test_row_larger_than_chunk(self):
+        encoder = RowEncoder('utf8', chunk_size=4)
+        self.assertEqual(b'12345678\n', encoder.add((12345678,)))
+
+
+class ChunkPipeTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+
+    def tearDown(self):
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @run_on_loop
+    def test_put_waits_while_full(self):
+        pipe = ChunkPipe(self.io_loop, framework, max_chunks=2)
+        self.assertTrue(pipe.put(b'a').done())
+        full = pipe.put(b'b')
+        self.assertFalse(full.done())
+
+        # abort() drops the chunks and lets the producer go on.
+        pipe.abort()
+        yield full
+        self.assertTrue(pipe.put(b'c').done())
+        self.assertEqual(0, len(pipe._chunks))
+
+
+class LoadDataTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MysqlServer().start()
+        self.pool = TorMysqlPool('127.0.0.1', self.server.port, 'root', 'root',
+                                 'test', max_size=2, local_infile=True)
+
+    def tearDown(self):
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    def statements(self):
+        return [sql.split(' ')[0] for _, sql in self.server.statements]
+
+    @run_on_loop
+    def test_rows_streamed_in_chunks(self):
+        rows = [(i, 'name %d' % i, None) for i in range(100)]
+        loaded = yield self.pool.load_data('t', ['id', 'name', 'x'], iter(rows),
+                                           chunk_size=200, max_chunks=1)
+        self.assertEqual(100, loaded)
+        self.assertEqual(['BEGIN', 'LOAD', 'COMMIT'], self.statements())
+
+        packets, = self.server.loads
+        self.assertGreater(len(packets), 1)
+        for packet in packets:
+            self.assertTrue(packet.endswith(b'\n'))
+        self.assertEqual(b''.join(encode_row(row, 'latin1') for row in rows),
+                         b''.join(packets))
+        self.assertEqual(1, len(self.pool.sock_pool.sockets))
+
+    @run_on_loop
+    def test_error_from_rows_rolls_back(self):
+        def rows():
+            yield (1, 'a')
+            raise ValueError('bad row')
+
+        with self.assertRaises(ValueError):
+            yield self.pool.load_data('t', ['id', 'name'], rows(), chunk_size=1)
+        self.assertEqual(['BEGIN', 'LOAD', 'ROLLBACK'], self.statements())
+        # The server got the rows before the error, then the end of file.
+        self.assertEqual([[b'1\ta\n']], self.server.loads)
+
+    @run_on_loop
+    def test_statement_rejected(self):
+        # PyMySQL's default charset.
+        sql = load_data_sql('missing', ['id'], 'latin1')
+        self.server.errors[sql] = [(ER.NO_SUCH_TABLE, "Table 'missing' doesn't exist")]
+        pulled = []
+
+        def rows():
+            for i in range(10000):
+                pulled.append(i)
+                yield (i,)
+
+        with self.assertRaises(pymysql.err.ProgrammingError):
+            yield self.pool.load_data('missing', ['id'], rows(), chunk_size=1,
+                                      max_chunks=1)
+        # The producer stopped once the load was over.
+        self.assertLess(len(pulled), 10000)
+        self.assertEqual([], self.server.loads)
+
+    @run_on_loop
+    def test_needs_local_infile(self):
+        pool = TorMysqlPool('127.0.0.1', self.server.port, 'root', 'root', 'test')
+        with self.assertRaises(errors.ConfigurationError):
+            yield pool.load_data('t', ['id'], [(1,)])
+
+    def test_chunk_size_checked(self):
+        connection = self.pool.get_connection()
+        self.assertRaises(ValueError, connection.load_data, 't', ['id'], [(1,)],
+                          chunk_size=0)
+        self.assertRaises(ValueError, connection.load_data, 't', ['id'], [(1,)],
+                          chunk_size=0xFFFFFF)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+from __future__ import unicode_literals, absolute_import
+
+import io
+import struct
+import unittest
+
+from pymysql import err
+
+from asyncdb.frameworks import tornado as tornado_framework
+from asyncdb.mysql.packet import (MAX_PACKET_LEN, is_eof, is_error, parse_row,
+                                  parse_rows, read_payload)
+from asyncdb.pycompat import PY3
+
+
+def _packet(payload, seq):
+    return struct.pack('<I', len(payload))[:3] + struct.pack('B', seq) + payload
+
+
+def _column(value):
+    if value is None:
+        return b'\xfb'
+    if len(value) < 251:
+        return struct.pack('B', len(value)) + value
+    if len(value) < 2 ** 16:
+        return b'\xfc' + struct.pack('<H', len(value)) + value
+    if len(value) < 2 ** 24:
+        return b'\xfd' + struct.pack('<I', len(value))[:3] + value
+    return b'\xfe' + struct.pack('<Q', len(value)) + value
+
+
+class _Connection(object):
+    def __init__(self, data):
+        self._rfile = io.BytesIO(data)
+        self._next_seq_id = 0
+
+
+class _Socket(object):
+    """Hands out at most `chunk` bytes per recv_some(), and records what
+    was asked for."""
+
+    def __init__(self, data, chunk):
+        self.data = data
+        self.chunk = chunk
+        self.requests = []
+
+    def recv_some(self, max_bytes):
+        self.requests.append(max_bytes)
+        n = min(max_bytes, self.chunk)
+        data, self.data = self.data[:n], self.data[n:]
+        return data
+
+
+class ReadPayloadTest(unittest.TestCase):
+    def test_packets_in_sequence(self):
+        connection = _Connection(_packet(b'one', 0) + _packet(b'two', 1))
+        self.assertEqual(b'one', bytes(read_payload(connection)))
+        self.assertEqual(b'two', bytes(read_payload(connection)))
+        self.assertEqual(2, connection._next_seq_id)
+
+    def test_wrong_sequence(self):
+        connection = _Connection(_packet(b'one', 3))
+        self.assertRaises(err.InternalError, read_payload, connection)
+
+    def test_truncated_packet(self):
+        connection = _Connection(_packet(b'one', 0)[:-1])
+        self.assertRaises(err.OperationalError, read_payload, connection)
+
+    def test_payload_split_over_packets(self):
+        first = b'a' * MAX_PACKET_LEN
+        connection = _Connection(_packet(first, 0) + _packet(b'bc', 1))
+        self.assertEqual(first + b'bc', read_payload(connection))
+        self.assertEqual(2, connection._next_seq_id)
+
+    def test_payload_of_exactly_max_length(self):
+        first = b'a' * MAX_PACKET_LEN
+        connection = _Connection(_packet(first, 0) + _packet(b'', 1))
+        self.assertEqual(first, read_payload(connection))
+
+    def test_eof_and_error(self):
+        self.assertTrue(is_eof(bytearray(b'\xfe\x00\x00\x02\x00')))
+        self.assertFalse(is_eof(bytearray(b'\xfe' + b'\x00' * 9)))
+        self.assertTrue(is_error(bytearray(b'\xff\x15\x04')))
+        self.assertFalse(is_error(bytearray(b'\x00')))
+
+
+@unittest.skipUnless(PY3, 'rows are parsed in place on Python 3 only')
+class ParseRowTest(unittest.TestCase):
+    def test_column_lengths(self):
+        values = [b'', b'x' * 250, b'y' * 251, b'z' * 70000, None]
+        data = b''.join(_column(value) for value in values)
+        converters = [(None, None)] * len(values)
+        self.assertEqual(tuple(values), parse_row(memoryview(data), converters))
+
+    def test_decoding_and_conversion(self):
+        data = _column('h\xe9'.encode('utf8')) + _column(b'42') + _column(None)
+        converters = [('utf8', None), ('ascii', int), ('ascii', int)]
+        self.assertEqual(('h\xe9', 42, None), parse_row(data, converters))
+
+    def test_parse_rows_into_dicts(self):
+        payloads = [_column(b'1') + _column(b'a'), _column(b'2') + _column(b'b')]
+        converters = [('ascii', int), ('ascii', None)]
+        self.assertEqual([(1, 'a'), (2, 'b')], parse_rows(payloads, converters))
+        self.assertEqual([{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}],
+                         parse_rows(payloads, converters, keys=('id', 'name')))
+
+
+class SockFileTest(unittest.TestCase):
+    def setUp(self):
+        self.partial_reads = tornado_framework.PARTIAL_READS
+
+    def tearDown(self):
+        tornado_framework.PARTIAL_READS = self.partial_reads
+
+    def test_small_reads_share_one_recv(self):
+        tornado_framework.PARTIAL_READS = True
+        sock = _Socket(b'abcdefgh', chunk=100)
+        sock_file = tornado_framework.SockFile(sock, bufsize=64)
+        self.assertEqual(b'abc', sock_file.read(3))
+        self.assertEqual(b'de', bytes(sock_file.read_view(2)))
+        self.assertEqual(b'fgh', sock_file.read(3))
+        self.assertEqual([64], sock.requests)
+
+    def test_read_spans_recvs(self):
+        tornado_framework.PARTIAL_READS = True
+        sock = _Socket(b'abcdefgh', chunk=3)
+        sock_file = tornado_framework.SockFile(sock, bufsize=4)
+        self.assertEqual(b'abcdefg', sock_file.read(7))
+        self.assertEqual(b'h', sock_file.read(5))
+
+    def test_without_partial_reads_asks_for_what_is_missing(self):
+        tornado_framework.PARTIAL_READS = False
+        sock = _Socket(b'abcdefgh', chunk=100)
+        sock_file = tornado_framework.SockFile(sock, bufsize=64)
+        self.assertEqual(b'abc', sock_file.read(3))
+        self.assertEqual(b'defgh', sock_file.read(5))
+        self.assertEqual([3, 5], sock.requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+from __future__ import unicode_literals, absolute_import
+
+import datetime
+import string
+import unittest
+
+import pymongo
+from bson import ObjectId
+
+from asyncdb.mongo.paging import (Page, after_spec, parse_token, sort_keys, token,
+                                  values_of)
+
+ASC, DESC = pymongo.ASCENDING, pymongo.DESCENDING
+
+
+class SortKeysTest(unittest.TestCase):
+    def test_id_is_appended(self):
+        self.assertEqual([('_id', ASC)], sort_keys(None))
+        self.assertEqual([('a', ASC), ('_id', ASC)], sort_keys('a'))
+        self.assertEqual([('a', ASC), ('b', DESC), ('_id', DESC)],
+                         sort_keys([('a', ASC), ('b', DESC)]))
+
+    def test_id_already_sorted_on(self):
+        self.assertEqual([('_id', DESC), ('a', ASC)],
+                         sort_keys([('_id', DESC), ('a', ASC)]))
+
+    def test_other_directions(self):
+        self.assertRaises(ValueError, sort_keys, [('loc', '2d')])
+
+
+class ValuesOfTest(unittest.TestCase):
+    def test_dotted_keys(self):
+        keys = [('a.b', ASC), ('_id', ASC)]
+        self.assertEqual([2, 1], values_of({'_id': 1, 'a': {'b': 2}}, keys))
+
+    def test_missing_key(self):
+        self.assertRaises(ValueError, values_of, {'_id': 1, 'a': 3},
+                          [('a.b', ASC), ('_id', ASC)])
+
+
+class TokenTest(unittest.TestCase):
+    def test_round_trip(self):
+        keys = sort_keys([('at', DESC), ('name', ASC)])
+        values = [datetime.datetime(2020, 1, 2, 3, 4, 5), 'x', ObjectId()]
+        after = token(keys, values)
+        # Safe in a URL as it is.
+        self.assertLessEqual(set(after), set(string.ascii_letters + string.digits + '-_='))
+        self.assertEqual(values, parse_token(after, keys))
+
+    def test_other_sort_order(self):
+        after = token(sort_keys('a'), [1, 2])
+        self.assertRaises(ValueError, parse_token, after, sort_keys([('a', DESC)]))
+        self.assertRaises(ValueError, parse_token, after, sort_keys('b'))
+
+    def test_invalid_token(self):
+        keys = sort_keys('a')
+        for after in ('', 'not a token', token(keys, [1, 2])[:-4]):
+            self.assertRaises(ValueError, parse_token, after, keys)
+
+
+class AfterSpecTest(unittest.TestCase):
+    def test_single_key(self):
+        self.assertEqual({'_id': {'$lt': 5}}, after_spec(None, [('_id', DESC)], [5]))
+
+    def test_keys_in_turn(self):
+        keys = [('a', ASC), ('b', DESC), ('_id', DESC)]
+        self.assertEqual({'$or': [{'a': {'$gt': 1}},
+                                  {'a': 1, 'b': {'$lt': 2}},
+                                  {'a': 1, 'b': 2, '_id': {'$lt': 3}}]},
+                         after_spec({}, keys, [1, 2, 3]))
+
+    def test_with_spec(self):
+        self.assertEqual({'$and': [{'x': 1}, {'_id': {'$gt': 5}}]},
+                         after_spec({'x': 1}, [('_id', ASC)], [5]))
+
+
+class PageTest(unittest.TestCase):
+    def test_sequence(self):
+        page = Page([{'_id': 1}, {'_id': 2}], 'next')
+        self.assertEqual(2, len(page))
+        self.assertEqual({'_id': 2}, page[1])
+        self.assertEqual([1, 2], [document['_id'] for document in page])
+
+
+if __name__ == '__main__':
+    unittest.main()
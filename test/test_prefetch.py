@@ -0,0 +1,107 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+import pymongo.errors
+from tornado import gen, ioloop
+
+from asyncdb.mongo import MotorClient
+
+from . import run_on_loop
+from .mongo_server import MongoServer
+
+
+class PrefetchTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MongoServer().start()
+        self.server.collections['db.c'] = [{'_id': i} for i in range(25)]
+        self.client = MotorClient('127.0.0.1', self.server.port, io_loop=self.io_loop)
+        self.collection = self.client.db.c
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @gen.coroutine
+    def read(self, cursor):
+        ids = []
+        while (yield cursor.fetch_next):
+            ids.append(cursor.next_object()['_id'])
+        raise gen.Return(ids)
+
+    @run_on_loop
+    def test_get_more_sent_ahead(self):
+        cursor = self.collection.find(prefetch=True).batch_size(10)
+        self.assertTrue((yield cursor.fetch_next))
+        yield gen.sleep(0.05)
+        # Sent while the first batch is still unread.
+        self.assertEqual(1, len(self.server.get_mores))
+        self.assertEqual(10, cursor._buffer_size() - len(cursor._data()))
+
+        ids = yield self.read(cursor)
+        self.assertEqual(list(range(25)), ids)
+        # Never more than one outstanding.
+        self.assertEqual(2, len(self.server.get_mores))
+
+    @run_on_loop
+    def test_not_without_prefetch(self):
+        cursor = self.collection.find().batch_size(10)
+        self.assertTrue((yield cursor.fetch_next))
+        yield gen.sleep(0.05)
+        self.assertEqual([], self.server.get_mores)
+        self.assertEqual(list(range(25)), (yield self.read(cursor)))
+
+    @run_on_loop
+    def test_to_list_and_next_batch(self):
+        documents = yield self.collection.find(prefetch=True).batch_size(7).to_list(None)
+        self.assertEqual(list(range(25)), [document['_id'] for document in documents])
+
+        cursor = self.collection.find(prefetch=True).batch_size(7)
+        documents = yield cursor.to_list(5)
+        self.assertEqual(list(range(5)), [document['_id'] for document in documents])
+        yield cursor.close()
+
+        cursor = self.collection.find(prefetch=True).batch_size(10)
+        yield cursor.fetch_next
+        cursor.next_object()
+        yield gen.sleep(0.05)
+        # The held batch comes before the prefetched one.
+        self.assertEqual(list(range(1, 20)),
+                         [document['_id'] for document in cursor.next_batch()])
+        self.assertTrue((yield cursor.fetch_next))
+        self.assertEqual(list(range(20, 25)),
+                         [document['_id'] for document in cursor.next_batch()])
+
+    @run_on_loop
+    def test_close_with_get_more_outstanding(self):
+        self.server.get_more_delay = 0.2
+        cursor = self.collection.find(prefetch=True).batch_size(10)
+        yield cursor.fetch_next
+        cursor_id = cursor.cursor_id
+        yield gen.sleep(0.05)
+        self.assertIsNotNone(cursor._getting_more)
+
+        # Waits for the getMore, then kills the cursor on the server.
+        yield cursor.close()
+        self.assertIsNone(cursor._getting_more)
+        self.assertEqual([cursor_id], self.server.killed)
+        self.assertEqual(0, cursor._buffer_size() - len(cursor._data()))
+
+    @run_on_loop
+    def test_failed_prefetch_raised_when_awaited(self):
+        self.server.fail_get_more = 1
+        cursor = self.collection.find(prefetch=True).batch_size(10)
+        ids = []
+        with self.assertRaises(pymongo.errors.OperationFailure):
+            while (yield cursor.fetch_next):
+                ids.append(cursor.next_object()['_id'])
+        # Every document read before the failure was returned first.
+        self.assertEqual(list(range(10)), ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
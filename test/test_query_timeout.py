@@ -0,0 +1,73 @@
+from __future__ import unicode_literals, absolute_import
+
+import time
+import unittest
+
+from tornado import gen, ioloop
+
+from asyncdb.errors import QueryTimeout
+from asyncdb.mysql import TorMysqlPool
+
+from . import run_on_loop
+from .mysql_server import MysqlServer
+
+
+class QueryTimeoutTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MysqlServer().start()
+        self.pool = TorMysqlPool('127.0.0.1', self.server.port, 'root', 'root',
+                                 'test', max_size=2)
+
+    def tearDown(self):
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @gen.coroutine
+    def connect(self):
+        connection = self.pool.get_connection()
+        yield connection.connect()
+        raise gen.Return(connection)
+
+    @run_on_loop
+    def test_timeout_kills_query(self):
+        connection = yield self.connect()
+        start = time.time()
+        with self.assertRaises(QueryTimeout):
+            yield connection.query('SELECT SLEEP(5)', timeout=0.1)
+        self.assertLess(time.time() - start, 1)
+
+        # Usable again once the statement has ended.
+        cursor = connection.cursor()
+        yield cursor.execute('SELECT 7')
+        self.assertEqual([{'7': '7'}], list(cursor.fetchall()))
+        connection.close()
+        self.assertIn('KILL QUERY', ' '.join(sql for _, sql in self.server.statements))
+
+    @run_on_loop
+    def test_timeout_with_pool_saturated(self):
+        # Every socket the pool may open runs a statement to be killed; the
+        # KILLs mustn't wait for one of them.
+        connections = yield [self.connect(), self.connect()]
+        start = time.time()
+        futures = [connection.query('SELECT SLEEP(5)', timeout=0.1)
+                   for connection in connections]
+        for future in futures:
+            with self.assertRaises(QueryTimeout):
+                yield future
+        self.assertLess(time.time() - start, 1)
+
+        for connection in connections:
+            cursor = connection.cursor()
+            yield cursor.execute('SELECT 1')
+            self.assertEqual([{'1': '1'}], list(cursor.fetchall()))
+            connection.close()
+
+    @run_on_loop
+    def test_statement_finishing_in_time(self):
+        connection = yield self.connect()
+        yield connection.query('SELECT SLEEP(0.01)', timeout=2)
+        connection.close()
+        self.assertNotIn('KILL', ' '.join(sql for _, sql in self.server.statements))
@@ -0,0 +1,135 @@
+from __future__ import unicode_literals, absolute_import
+
+import datetime
+import unittest
+
+import bson
+import pymongo.errors
+from bson.son import SON
+from tornado import ioloop
+
+from asyncdb.mongo import MotorClient, raw
+from asyncdb.mongo.raw import LazyDocument
+
+from . import run_on_loop
+from .mongo_server import MongoServer
+
+DOCUMENTS = [{'_id': 1, 'name': 'ann'},
+             {'_id': 2, 'tags': ['a', 'b'], 'nested': {'x': 1.5}},
+             {'_id': 3}]
+
+
+class SplitTest(unittest.TestCase):
+    def test_split(self):
+        data = b''.join(bson.BSON.encode(document) for document in DOCUMENTS)
+        documents = raw.split(data)
+        self.assertEqual(3, len(documents))
+        for document in documents:
+            self.assertIsInstance(document, bson.BSON)
+        self.assertEqual(data, b''.join(documents))
+        self.assertEqual(DOCUMENTS, [document.decode() for document in documents])
+
+    def test_split_range(self):
+        header = b'\0' * 20
+        data = header + b''.join(bson.BSON.encode(document) for document in DOCUMENTS)
+        end = len(data) - len(bson.BSON.encode(DOCUMENTS[-1]))
+        self.assertEqual(DOCUMENTS[:2],
+                         [document.decode() for document in raw.split(data, 20, end)])
+        self.assertEqual([], raw.split(data, 20, 20))
+
+
+class LazyDocumentTest(unittest.TestCase):
+    def test_decoded_on_first_read(self):
+        data = bson.BSON.encode(DOCUMENTS[1])
+        document = LazyDocument(data)
+        self.assertIsNone(document._document)
+        self.assertIn('bytes', repr(document))
+        self.assertIs(data, document.raw)
+
+        self.assertEqual(['a', 'b'], document['tags'])
+        self.assertEqual(DOCUMENTS[1], document.document)
+        self.assertEqual(DOCUMENTS[1], dict(document))
+        self.assertEqual(3, len(document))
+        self.assertEqual(1.5, document.get('nested')['x'])
+        self.assertIsNone(document.get('missing'))
+        self.assertRaises(KeyError, lambda: document['missing'])
+
+    def test_decode_options(self):
+        when = datetime.datetime(2016, 1, 2, 3, 4, 5)
+        data = bson.BSON.encode(SON([('b', 1), ('a', when)]))
+        document = LazyDocument(data, as_class=SON, tz_aware=True)
+        self.assertIsInstance(document.document, SON)
+        self.assertEqual(['b', 'a'], list(document))
+        self.assertIsNotNone(document['a'].tzinfo)
+
+    def test_from_document(self):
+        document = LazyDocument.from_document(DOCUMENTS[0])
+        self.assertEqual('ann', document['name'])
+        self.assertEqual(bson.BSON.encode(DOCUMENTS[0]), document.raw)
+        self.assertIn('ann', repr(document))
+
+    def test_read_only(self):
+        document = LazyDocument(bson.BSON.encode(DOCUMENTS[0]))
+        with self.assertRaises(TypeError):
+            document['name'] = 'bob'
+
+    def test_unpack_and_convert(self):
+        data = b''.join(bson.BSON.encode(document) for document in DOCUMENTS)
+        lazy = raw.unpack(data, raw.LAZY, 0, len(data))
+        self.assertEqual(DOCUMENTS, [document.document for document in lazy])
+        self.assertEqual(raw.split(data), raw.unpack(data, raw.RAW, 0, len(data)))
+
+        self.assertEqual(raw.split(data), raw.convert(DOCUMENTS, raw.RAW))
+        self.assertEqual(DOCUMENTS, [document.document
+                                     for document in raw.convert(DOCUMENTS, raw.LAZY)])
+
+
+class RawCursorTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MongoServer().start()
+        self.server.collections['db.c'] = [{'_id': i, 'name': 'doc %d' % i}
+                                           for i in range(25)]
+        self.client = MotorClient('127.0.0.1', self.server.port, io_loop=self.io_loop)
+        self.collection = self.client.db.c
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @run_on_loop
+    def test_raw(self):
+        documents = yield self.collection.find(raw=True).batch_size(10).to_list(None)
+        for document in documents:
+            self.assertIsInstance(document, bson.BSON)
+        self.assertEqual(self.server.collections['db.c'],
+                         [document.decode() for document in documents])
+        # Over the query and two getMores.
+        self.assertEqual(2, len(self.server.get_mores))
+
+    @run_on_loop
+    def test_lazy(self):
+        cursor = self.collection.find(lazy=True).batch_size(10)
+        names = []
+        while (yield cursor.fetch_next):
+            document = cursor.next_object()
+            self.assertIsInstance(document, LazyDocument)
+            names.append(document['name'])
+        self.assertEqual(['doc %d' % i for i in range(25)], names)
+
+    @run_on_loop
+    def test_other_cursors_decoded(self):
+        yield self.collection.find(raw=True).to_list(None)
+        document = yield self.collection.find_one({'_id': 3})
+        self.assertEqual({'_id': 3, 'name': 'doc 3'}, document)
+
+    def test_raw_or_lazy(self):
+        self.assertRaises(pymongo.errors.InvalidOperation,
+                          self.collection.find, raw=True, lazy=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
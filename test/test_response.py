@@ -0,0 +1,147 @@
+from __future__ import unicode_literals, absolute_import
+
+import struct
+import threading
+import unittest
+from concurrent import futures
+
+import bson
+import greenlet
+from pymongo import helpers
+from tornado import ioloop
+
+from asyncdb import meta
+from asyncdb.decode import DecodeExecutor
+from asyncdb.frameworks import tornado as framework
+from asyncdb.mongo import response
+
+from . import run_on_loop
+
+
+def _reply(documents, cursor_id=42, starting_from=0):
+    body = b''.join(bson.BSON.encode(document) for document in documents)
+    return struct.pack('<iqii', 0, cursor_id, starting_from,
+                       len(documents)) + body
+
+
+DOCUMENTS = [{'_id': i, 'name': 'doc %d' % i, 'tags': ['a', 'b'] * i,
+              'nested': {'i': i}}
+             for i in range(200)]
+
+
+class UnpackResponseTest(unittest.TestCase):
+    def test_matches_pymongo(self):
+        reply = _reply(DOCUMENTS)
+        self.assertEqual(response._unpack_response(reply),
+                         response.unpack_response(reply))
+
+    def test_matches_pymongo_in_pieces(self):
+        reply = _reply(DOCUMENTS)
+        old, response.PIECE_SIZE = response.PIECE_SIZE, 100
+        try:
+            self.assertEqual(response._unpack_response(reply),
+                             response.unpack_response(reply))
+        finally:
+            response.PIECE_SIZE = old
+
+
+class InstallTest(unittest.TestCase):
+    def tearDown(self):
+        self.assertEqual(0, response._installed)
+        self.assertIs(response._unpack_response, helpers._unpack_response)
+
+    def test_counted(self):
+        response.install()
+        response.install()
+        self.assertIs(response._unpack_response_off_loop,
+                      helpers._unpack_response)
+        response.uninstall()
+        self.assertIs(response._unpack_response_off_loop,
+                      helpers._unpack_response)
+        response.uninstall()
+
+    def test_only_while_running(self):
+        seen = []
+        parent = greenlet.getcurrent()
+
+        def call_method():
+            seen.append(helpers._unpack_response)
+            parent.switch()
+            seen.append(helpers._unpack_response)
+
+        child = greenlet.greenlet(meta._decoding_replies(call_method))
+        child.switch()
+        self.assertEqual(1, response._installed)
+        child.switch()
+        self.assertEqual([response._unpack_response_off_loop] * 2, seen)
+
+    def test_uninstalled_on_error(self):
+        def call_method():
+            raise ZeroDivisionError
+
+        child = greenlet.greenlet(meta._decoding_replies(call_method))
+        self.assertRaises(ZeroDivisionError, child.switch)
+
+
+class OffLoopTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.executor = futures.ThreadPoolExecutor(1)
+
+        # Threads unpack_response ran on.
+        self.threads = []
+        self.unpack_response = response.unpack_response
+
+        def unpack(*args, **kwargs):
+            self.threads.append(threading.current_thread())
+            return self.unpack_response(*args, **kwargs)
+
+        response.unpack_response = unpack
+
+    def tearDown(self):
+        response.unpack_response = self.unpack_response
+        self.executor.shutdown()
+        self.io_loop.close(all_fds=True)
+
+    def _decode(self, decoder, reply):
+        # As PyMongo would, on a greenlet stamped by meta.asynchronize.
+        future = framework.get_future(self.io_loop)
+
+        def call_method():
+            try:
+                result = helpers._unpack_response(reply)
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+        child = greenlet.greenlet(meta._decoding_replies(call_method))
+        child.decode_context = (decoder, self.io_loop, framework)
+        child.switch()
+        return future
+
+    @run_on_loop
+    def test_decoded_on_executor(self):
+        decoder = DecodeExecutor(self.executor, threshold=0)
+        reply = _reply(DOCUMENTS)
+        future = self._decode(decoder, reply)
+        result = yield future
+        self.assertEqual(response._unpack_response(reply), result)
+        self.assertEqual(1, len(self.threads))
+        self.assertIsNot(threading.current_thread(), self.threads[0])
+        self.assertEqual(1, decoder.offloaded)
+
+    @run_on_loop
+    def test_small_reply_inline(self):
+        decoder = DecodeExecutor(self.executor)
+        reply = _reply(DOCUMENTS[:1])
+        future = self._decode(decoder, reply)
+        result = yield future
+        self.assertEqual(response._unpack_response(reply), result)
+        self.assertEqual([], self.threads)
+        self.assertEqual(1, decoder.inline)
+
+
+if __name__ == '__main__':
+    unittest.main()
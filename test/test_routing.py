@@ -0,0 +1,99 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+from tornado import ioloop
+
+from asyncdb.errors import ConnectionFailure
+from asyncdb.mysql import TorMysqlRoutingPool
+
+from .mysql_server import MysqlServer
+
+
+class ReadBalancingTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.servers = [MysqlServer().start() for _ in range(2)]
+        self.pool = TorMysqlRoutingPool(
+            ('127.0.0.1', 1), [('127.0.0.1', server.port) for server in self.servers],
+            'root', 'root', 'test')
+        # No SHOW SLAVE STATUS checks; every replica is fit to read from.
+        self.pool.close()
+        for replica in self.pool.replicas:
+            replica.lag = 0
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    def ports(self, connections):
+        return sorted(connection.delegate.port for connection in connections)
+
+    def test_burst_is_spread_before_connecting(self):
+        connections = [self.pool.read_connection() for _ in range(4)]
+        first, second = sorted(server.port for server in self.servers)
+        self.assertEqual([first, first, second, second], self.ports(connections))
+        self.assertEqual([2, 2], [replica.picked for replica in self.pool.replicas])
+
+    def test_close_before_connecting_releases_pick(self):
+        connection = self.pool.read_connection()
+        connection.close()
+        self.assertEqual([0, 0], [replica.picked for replica in self.pool.replicas])
+
+    def test_connect_moves_pick_to_outstanding(self):
+        connection = self.pool.read_connection()
+        self.io_loop.run_sync(connection.connect, timeout=5)
+        self.assertEqual([0, 0], [r.picked for r in self.pool.replicas])
+        self.assertEqual(1, sum(r.outstanding for r in self.pool.replicas))
+        connection.close()
+        self.assertEqual(0, sum(r.outstanding for r in self.pool.replicas))
+
+    def test_failed_connect_releases_pick(self):
+        self.servers[0].stop()
+        self.servers[1].stop()
+        connection = self.pool.read_connection()
+        with self.assertRaises(Exception):
+            self.io_loop.run_sync(connection.connect, timeout=5)
+        self.assertEqual([0, 0], [replica.picked for replica in self.pool.replicas])
+
+
+class ReplicaHealthTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MysqlServer().start()
+        self.pool = TorMysqlRoutingPool(
+            ('127.0.0.1', 1), [('127.0.0.1', self.server.port)],
+            'root', 'root', 'test', max_size=1)
+        self.pool.close()
+        self.replica, = self.pool.replicas
+        self.replica.lag = 0
+
+    def tearDown(self):
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    def test_busy_replica_stays_in_rotation(self):
+        self.replica.sock_pool.wait_queue_timeout = 0.05
+        first = self.pool.read_connection()
+        self.io_loop.run_sync(first.connect, timeout=5)
+        second = self.pool.read_connection()
+        with self.assertRaises(ConnectionFailure):
+            self.io_loop.run_sync(second.connect, timeout=5)
+        self.assertEqual(0, self.replica.lag)
+        first.close()
+
+    def test_unreachable_replica_is_dropped(self):
+        self.server.stop()
+        connection = self.pool.read_connection()
+        with self.assertRaises(Exception):
+            self.io_loop.run_sync(connection.connect, timeout=5)
+        self.assertIsNone(self.replica.lag)
+
+
+if __name__ == '__main__':
+    unittest.main()
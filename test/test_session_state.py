@@ -0,0 +1,109 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+from pymysql.constants import CR, SERVER_STATUS
+
+from asyncdb import errors
+from asyncdb.mysql.core import (PoolConnection, SessionState,
+                                _supports_reset_connection)
+
+
+class _Connection(object):
+    protocol_version = 10
+    server_version = '5.7.21-log'
+    server_thread_id = (42,)
+    autocommit_mode = False
+    charset = 'latin1'
+    encoding = 'latin1'
+
+
+class SessionStateTest(unittest.TestCase):
+    def session(self):
+        session = SessionState('user', 'app', 'utf8')
+        session.save_handshake(_Connection())
+        return session
+
+    def test_new_session_is_clean(self):
+        self.assertTrue(self.session().is_clean())
+
+    def test_changed_db_or_charset_is_dirty(self):
+        session = self.session()
+        session.db = 'other'
+        self.assertFalse(session.is_clean())
+        session.db = 'app'
+        session.charset = 'latin1'
+        self.assertFalse(session.is_clean())
+        session.charset = 'utf8'
+        self.assertTrue(session.is_clean())
+
+    def test_variables_and_unknown_changes_are_dirty(self):
+        session = self.session()
+        session.variables['sql_mode'] = 'ANSI'
+        self.assertFalse(session.is_clean())
+        session = self.session()
+        session.unknown = True
+        self.assertFalse(session.is_clean())
+
+    def test_open_transaction_is_dirty(self):
+        session = self.session()
+        session.server_status = SERVER_STATUS.SERVER_STATUS_IN_TRANS
+        self.assertTrue(session.in_transaction)
+        self.assertFalse(session.is_clean())
+
+    def test_autocommit_must_match_handshake(self):
+        session = self.session()
+        session.server_status = SERVER_STATUS.SERVER_STATUS_AUTOCOMMIT
+        self.assertTrue(session.autocommit)
+        self.assertFalse(session.is_clean())
+        session.server_status = 0
+        self.assertTrue(session.is_clean())
+
+    def test_autocommit_ignored_before_handshake(self):
+        session = SessionState('user', 'app', 'utf8')
+        session.server_status = SERVER_STATUS.SERVER_STATUS_AUTOCOMMIT
+        self.assertTrue(session.is_clean())
+
+    def test_handshake_round_trip(self):
+        session = self.session()
+        session.charset = 'utf8mb4'
+        connection = _Connection()
+        connection.server_version = 'unset'
+        session.restore_handshake(connection)
+        self.assertEqual('5.7.21-log', connection.server_version)
+        self.assertEqual((42,), connection.server_thread_id)
+        self.assertEqual('utf8mb4', connection.charset)
+        self.assertEqual('utf8', connection.encoding)
+
+    def test_supports_reset(self):
+        self.assertTrue(self.session().supports_reset)
+        self.assertFalse(SessionState('user', 'app', 'utf8').supports_reset)
+
+    def test_reset_connection_versions(self):
+        self.assertFalse(_supports_reset_connection('5.6.40'))
+        self.assertTrue(_supports_reset_connection('5.7.3'))
+        self.assertTrue(_supports_reset_connection('8.0.11'))
+        self.assertFalse(_supports_reset_connection('5.5.5-10.1.30-MariaDB'))
+        self.assertTrue(_supports_reset_connection('5.5.5-10.2.6-MariaDB'))
+        self.assertFalse(_supports_reset_connection('unknown'))
+
+    def test_variables_without_reset_fail_restore(self):
+        session = SessionState('user', 'app', 'utf8')
+        connection = _Connection()
+        connection.server_version = '5.6.40'
+        session.save_handshake(connection)
+        session.variables['sql_mode'] = 'ANSI'
+        # Never connected.
+        pool_connection = PoolConnection.__new__(PoolConnection)
+        pool_connection._picked_by = None
+        pool_connection.socket = None
+        pool_connection._session = session
+        with self.assertRaises(errors.OperationalError) as context:
+            pool_connection._restore_session()
+        self.assertEqual(CR.CR_NOT_IMPLEMENTED, context.exception.args[0])
+        self.assertIn('5.6.40', context.exception.args[1])
+        pool_connection.__del__()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+from __future__ import unicode_literals, absolute_import
+
+import time
+import unittest
+
+from tornado import ioloop
+
+from asyncdb.mysql import TorMysqlPool
+from asyncdb.mysql.sharding import (HashShardMap, RangeShardMap, ShardedMysqlPool,
+                                    _merge, _sort_key)
+
+from . import run_on_loop
+from .mysql_server import MysqlServer
+
+QUERY = 'SELECT id FROM t ORDER BY id LIMIT 3'
+
+
+class ShardMapTest(unittest.TestCase):
+    def test_hash_is_stable(self):
+        shard_map = HashShardMap(4)
+        self.assertEqual(shard_map.shard_for('user:1'), shard_map.shard_for(b'user:1'))
+        self.assertEqual(shard_map.shard_for(42), shard_map.shard_for('42'))
+        self.assertTrue(all(0 <= shard_map.shard_for(i) < 4 for i in range(100)))
+
+    def test_range(self):
+        shard_map = RangeShardMap([300, 100])
+        self.assertEqual(3, shard_map.shards)
+        self.assertEqual([0, 1, 1, 2, 2], [shard_map.shard_for(key)
+                                           for key in (5, 100, 299, 300, 10 ** 6)])
+
+
+class SortKeyTest(unittest.TestCase):
+    def sort(self, rows, order_by):
+        return sorted(rows, key=_sort_key(order_by))
+
+    def test_ascending_nulls_first(self):
+        rows = [{'a': 2}, {'a': None}, {'a': 1}]
+        self.assertEqual([None, 1, 2], [row['a'] for row in self.sort(rows, [('a', False)])])
+
+    def test_descending_nulls_last(self):
+        rows = [{'a': 2}, {'a': None}, {'a': 1}]
+        self.assertEqual([2, 1, None], [row['a'] for row in self.sort(rows, [('a', True)])])
+
+    def test_mixed_directions(self):
+        rows = [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}, {'a': 1, 'b': 'z'}]
+        order_by = [('a', False), ('b', True)]
+        self.assertEqual([(1, 'z'), (1, 'x'), (2, 'y')],
+                         [(row['a'], row['b']) for row in self.sort(rows, order_by)])
+
+
+class MergeTest(unittest.TestCase):
+    def test_merges_sorted_shards(self):
+        key = _sort_key([('id', False)])
+        results = [[{'id': 1}, {'id': 4}], [], [{'id': 2}, {'id': 3}, {'id': 5}]]
+        self.assertEqual([1, 2, 3, 4, 5],
+                         [row['id'] for row in _merge(results, key, None)])
+
+    def test_limit(self):
+        key = _sort_key([('id', True)])
+        results = [[{'id': 9}, {'id': 1}], [{'id': 8}, {'id': 7}]]
+        self.assertEqual([9, 8, 7], [row['id'] for row in _merge(results, key, 3)])
+
+    def test_ties_keep_shard_order(self):
+        key = _sort_key([('n', False)])
+        results = [[{'n': 1, 'shard': 0}], [{'n': 1, 'shard': 1}]]
+        self.assertEqual([0, 1], [row['shard'] for row in _merge(results, key, None)])
+
+
+def _rows(ids, stall=None):
+    # Rows of `ids`; with `stall`, the server stalls that long after them
+    # before a last row.
+    for id_ in ids:
+        yield (id_.encode('ascii'),)
+    if stall is not None:
+        time.sleep(stall)
+        yield (b'99',)
+
+
+class ScatterTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.servers = [MysqlServer().start() for _ in range(2)]
+        self.pools = [TorMysqlPool('127.0.0.1', server.port, 'root', 'root', 'test')
+                      for server in self.servers]
+        self.sharded = ShardedMysqlPool(self.pools, HashShardMap(2))
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    def ids(self, rows):
+        return [row['id'] for row in rows]
+
+    @run_on_loop
+    def test_merged_in_order(self):
+        self.servers[0].results[QUERY] = (['id'], _rows(['01', '04', '05']))
+        self.servers[1].results[QUERY] = (['id'], _rows(['02', '03']))
+        rows = yield self.sharded.scatter(QUERY, order_by=['id'], limit=3)
+        self.assertEqual(['01', '02', '03'], self.ids(rows))
+
+    @run_on_loop
+    def test_streamed_in_order(self):
+        self.servers[0].results[QUERY] = (['id'], _rows(['01', '04', '05']))
+        self.servers[1].results[QUERY] = (['id'], _rows(['02', '03']))
+        rows = yield self.sharded.scatter(QUERY, order_by=['id'], stream=True,
+                                          batch_size=1)
+        self.assertEqual(['01', '02', '03', '04', '05'], self.ids(rows))
+        # Read to the end, so the sockets are reused.
+        self.assertEqual([1, 1], [len(pool.sock_pool.sockets) for pool in self.pools])
+
+    @run_on_loop
+    def test_stream_stops_at_limit(self):
+        # One shard would hold a buffered merge up for 5 seconds.
+        self.servers[0].results[QUERY] = (['id'], _rows(['01', '03', '05'], stall=5))
+        self.servers[1].results[QUERY] = (['id'], _rows(['02']))
+        start = time.time()
+        rows = yield self.sharded.scatter(QUERY, order_by=[('id', False)], limit=3,
+                                          stream=True, batch_size=2)
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(['01', '02', '03'], self.ids(rows))
+        # The unread result's socket is closed, not put back.
+        self.assertEqual(0, self.pools[0].sock_pool.motor_sock_counter)
+        self.assertEqual(1, len(self.pools[1].sock_pool.sockets))
+
+    def test_stream_needs_order_by(self):
+        self.assertRaises(ValueError, self.sharded.scatter, QUERY, stream=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
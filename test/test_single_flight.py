@@ -0,0 +1,141 @@
+from __future__ import unicode_literals, absolute_import
+
+import time
+import unittest
+
+from tornado import gen, ioloop
+
+from asyncdb.coalesce import SingleFlight
+from asyncdb.frameworks import tornado as framework
+from asyncdb.mysql import TorMysqlPool
+
+from . import run_on_loop
+from .mysql_server import MysqlServer
+
+QUERY = 'SELECT name FROM user WHERE id = 1'
+
+
+class _SlowRows(object):
+    """Rows the server sends after a pause, so identical queries overlap."""
+
+    def __iter__(self):
+        time.sleep(0.2)
+        return iter([(b'ann',), (b'bob',)])
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.flight = SingleFlight(self.io_loop, framework)
+        self.started = []
+
+    def tearDown(self):
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    def start(self):
+        future = framework.get_future(self.io_loop)
+        self.started.append(future)
+        return future
+
+    def test_shared(self):
+        first = self.flight.do('a', self.start)
+        second = self.flight.do('a', self.start)
+        other = self.flight.do('b', self.start)
+        self.assertEqual(2, len(self.started))
+        self.assertEqual(2, self.flight.in_flight)
+
+        result = {'rows': [1, 2]}
+        self.started[0].set_result(result)
+        self.assertIs(result, first.result())
+        # A copy each for later callers, so they can't see each other's changes.
+        self.assertEqual(result, second.result())
+        self.assertIsNot(result, second.result())
+        self.assertIsNot(result['rows'], second.result()['rows'])
+        self.assertFalse(other.done())
+
+        self.assertEqual(1, self.flight.hits)
+        self.assertEqual(2, self.flight.misses)
+        self.assertAlmostEqual(1 / 3.0, self.flight.hit_ratio)
+        self.assertEqual(1, self.flight.in_flight)
+
+    def test_next_call_starts_again(self):
+        self.flight.do('a', self.start)
+        self.started[0].set_result(1)
+        self.flight.do('a', self.start)
+        self.assertEqual(2, len(self.started))
+
+    def test_error_shared(self):
+        futures = [self.flight.do('a', self.start) for _ in range(3)]
+        self.started[0].set_exception(KeyError('a'))
+        for future in futures:
+            self.assertRaises(KeyError, future.result)
+        self.assertEqual(0, self.flight.in_flight)
+
+    def test_start_raising(self):
+        def start():
+            raise KeyError('a')
+
+        self.assertRaises(KeyError, self.flight.do, 'a', start)
+        self.assertEqual(0, self.flight.in_flight)
+        self.flight.do('a', self.start)
+        self.assertEqual(1, len(self.started))
+
+
+class SharedReadTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MysqlServer().start()
+        self.server.results[QUERY] = (['name'], _SlowRows())
+        self.pool = TorMysqlPool('127.0.0.1', self.server.port, 'root', 'root',
+                                 'test', max_size=5, single_flight=True)
+
+    def tearDown(self):
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @gen.coroutine
+    def select(self, query=QUERY, args=None, transaction=False):
+        connection = self.pool.get_connection()
+        yield connection.connect()
+        if transaction:
+            yield connection.begin()
+        cursor = connection.cursor()
+        count = yield cursor.execute(query, args)
+        rows = list(cursor.fetchall())
+        if transaction:
+            yield connection.commit()
+        connection.close()
+        raise gen.Return((count, rows))
+
+    def selects(self):
+        return sum(1 for _, sql in self.server.statements if sql == QUERY)
+
+    @run_on_loop
+    def test_identical_reads_shared(self):
+        results = yield [self.select(),
+                         self.select('SELECT name FROM user WHERE id = %s', (1,)),
+                         self.select()]
+        self.assertEqual(1, self.selects())
+        expected = (2, [{'name': 'ann'}, {'name': 'bob'}])
+        for result in results:
+            self.assertEqual(expected, result)
+
+        # Each caller has rows of its own.
+        results[0][1][0]['name'] = 'changed'
+        self.assertEqual('ann', results[1][1][0]['name'])
+        self.assertEqual('ann', results[2][1][0]['name'])
+        self.assertEqual(2, self.pool.single_flight.hits)
+
+    @run_on_loop
+    def test_reads_in_transaction_not_shared(self):
+        yield [self.select(transaction=True), self.select(transaction=True)]
+        self.assertEqual(2, self.selects())
+        self.assertEqual(0, self.pool.single_flight.hits)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+from tornado import ioloop
+
+from asyncdb.mongo import MotorClient, sizing
+from asyncdb.mongo.sizing import AdaptiveBatchSize
+
+from . import run_on_loop
+from .mongo_server import MongoServer
+
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class AdaptiveBatchSizeTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.time, sizing.time = sizing.time, self.clock
+
+    def tearDown(self):
+        sizing.time = self.time
+
+    def test_sized_by_bytes(self):
+        sizer = AdaptiveBatchSize(target_bytes=10000, min_size=2, max_size=1000)
+        # 100 bytes a document: 100 documents, but at most double the last.
+        self.assertEqual(20, sizer.arrived(10, 1000, 0))
+        self.assertEqual(40, sizer.arrived(20, 2000, 0))
+        self.assertEqual(80, sizer.arrived(40, 4000, 0))
+        self.assertEqual(100, sizer.arrived(80, 8000, 0))
+        self.assertEqual(100.0, sizer.document_bytes)
+
+    def test_shrinks_at_once(self):
+        sizer = AdaptiveBatchSize(target_bytes=10000, min_size=2, max_size=1000)
+        self.assertEqual(20, sizer.arrived(10, 1000, 0))
+        # Documents are now 1000 bytes: averaged with 100, 550 a document.
+        self.assertEqual(18, sizer.arrived(20, 20000, 0))
+        self.assertEqual(550.0, sizer.document_bytes)
+
+    def test_sized_by_consumer(self):
+        sizer = AdaptiveBatchSize(target_bytes=10 ** 9, target_latency=0.1,
+                                  min_size=2, max_size=1000)
+        sizer.arrived(100, 100, 0)
+        # 50 documents taken in 1s, none waiting: 5 in 0.1s.
+        self.clock.now += 1
+        self.assertEqual(5, sizer.arrived(100, 100, 50))
+        self.assertEqual(50.0, sizer.rate)
+
+    def test_time_waiting_not_counted(self):
+        sizer = AdaptiveBatchSize(target_bytes=10 ** 9, target_latency=0.1,
+                                  min_size=2, max_size=1000)
+        sizer.arrived(100, 100, 0)
+        # All 100 taken in 0.5s, then 1.5s waiting for the server.
+        self.clock.now += 0.5
+        sizer.waiting()
+        self.clock.now += 1.5
+        self.assertEqual(20, sizer.arrived(100, 100, 0))
+        self.assertEqual(200.0, sizer.rate)
+
+    def test_bounds(self):
+        sizer = AdaptiveBatchSize(target_bytes=100, min_size=5, max_size=50)
+        self.assertEqual(5, sizer.arrived(10, 100000, 0))
+        sizer = AdaptiveBatchSize(target_bytes=10 ** 9, min_size=5, max_size=50)
+        self.assertEqual(50, sizer.next_size(1000))
+        self.assertRaises(ValueError, AdaptiveBatchSize, min_size=1)
+        self.assertRaises(ValueError, AdaptiveBatchSize, min_size=10, max_size=5)
+
+    def test_clone(self):
+        sizer = AdaptiveBatchSize(target_bytes=10000, min_size=3, max_size=30)
+        sizer.arrived(10, 1000, 0)
+        clone = sizer.clone()
+        self.assertEqual((10000, 3, 30),
+                         (clone.target_bytes, clone.min_size, clone.max_size))
+        self.assertIsNone(clone.document_bytes)
+        self.assertEqual(0, clone.received)
+
+
+class AdaptiveCursorTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MongoServer().start()
+        self.server.collections['db.c'] = [{'_id': i, 'pad': 'x' * 100}
+                                           for i in range(200)]
+        self.client = MotorClient('127.0.0.1', self.server.port, io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @run_on_loop
+    def test_get_more_sizes(self):
+        cursor = self.client.db.c.find().batch_size(5).adaptive_batch_size(
+            target_bytes=3000, target_latency=100, min_size=2, max_size=1000)
+        ids = []
+        while (yield cursor.fetch_next):
+            ids.append(cursor.next_object()['_id'])
+        self.assertEqual(list(range(200)), ids)
+
+        # Documents of about 130 bytes: doubling from 5 up to about 23.
+        get_mores = self.server.get_mores
+        self.assertEqual([10, 20], get_mores[:2])
+        self.assertTrue(all(20 <= size <= 24 for size in get_mores[2:-1]), get_mores)
+        self.assertLess(cursor.batch_sizer.document_bytes, 140)
+        self.assertEqual(200, cursor.batch_sizer.received)
+
+    @run_on_loop
+    def test_clone_keeps_settings(self):
+        cursor = self.client.db.c.find().adaptive_batch_size(min_size=3)
+        yield cursor.fetch_next
+        clone = cursor.clone()
+        self.assertEqual(3, clone.batch_sizer.min_size)
+        self.assertEqual(0, clone.batch_sizer.received)
+        yield cursor.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
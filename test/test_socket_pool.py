@@ -0,0 +1,66 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+from tornado import ioloop
+
+from asyncdb.frameworks import tornado as framework
+from asyncdb.frameworks.pool import SocketInfo, SocketPool
+from asyncdb.mysql.core import SessionState, socket_labels
+
+
+class _Socket(object):
+    def close(self):
+        pass
+
+
+def _sock_info(user, db):
+    sock_info = SocketInfo(_Socket(), 0)
+    sock_info.session = SessionState(user, db, 'utf8')
+    return sock_info
+
+
+class SocketPoolLabelsTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.pool = SocketPool(self.io_loop, framework, ('127.0.0.1', 3306),
+                               4, 10, 10, labels=socket_labels)
+
+    def tearDown(self):
+        self.io_loop.close()
+
+    def idle(self, *sock_infos):
+        for sock_info in sock_infos:
+            self.pool.motor_sock_counter += 1
+            self.pool.maybe_return_socket(sock_info)
+
+    def test_preferred_label_first(self):
+        other, same_user, exact = (_sock_info('b', 'x'), _sock_info('a', 'y'),
+                                   _sock_info('a', 'x'))
+        self.idle(other, same_user, exact)
+        prefer = [('db', 'a', 'x'), ('user', 'a')]
+        self.assertIs(exact, self.pool.get_socket(prefer=prefer))
+        self.assertIs(same_user, self.pool.get_socket(prefer=prefer))
+        self.assertIs(other, self.pool.get_socket(prefer=prefer))
+        self.assertEqual({}, self.pool._labelled)
+
+    def test_index_follows_idle_sockets(self):
+        sock_info = _sock_info('a', 'x')
+        self.idle(sock_info)
+        self.assertIs(sock_info, self.pool.get_socket())
+        self.assertEqual({}, self.pool._labelled)
+
+        # Labelled again by its session when it comes back.
+        sock_info.session.db = 'y'
+        self.pool.maybe_return_socket(sock_info)
+        self.assertEqual({('db', 'a', 'y'), ('user', 'a')}, set(self.pool._labelled))
+        self.assertIs(sock_info, self.pool.get_socket(prefer=[('db', 'a', 'y')]))
+
+    def test_reset_clears_index(self):
+        self.idle(_sock_info('a', 'x'))
+        self.pool.reset()
+        self.assertEqual({}, self.pool._labelled)
+
+
+if __name__ == '__main__':
+    unittest.main()
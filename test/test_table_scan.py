@@ -0,0 +1,159 @@
+from __future__ import unicode_literals, absolute_import
+
+import re
+import unittest
+
+from pymysql.constants import FIELD_TYPE
+from tornado import gen, ioloop
+
+from asyncdb.mysql import TorMysqlPool
+
+from . import run_on_loop
+from .mysql_server import MysqlServer
+
+_MIN_MAX = re.compile(r'SELECT MIN\(`id`\) AS lo, MAX\(`id`\) AS hi FROM `t`$')
+_PAGE = re.compile(r'SELECT \* FROM `t`(?: WHERE (.*))? ORDER BY `id` LIMIT (\d+)$')
+_CONDITION = re.compile(r'`id` (>=|>|<) (\d+)$')
+
+
+class _Table(object):
+    """Answers a scan's statements over a table of integer ids."""
+
+    def __init__(self, ids):
+        self.ids = ids
+        # The ids of each page read.
+        self.pages = []
+
+    def __call__(self, sql):
+        columns = [('id', FIELD_TYPE.LONGLONG)]
+        if _MIN_MAX.match(sql):
+            return ([('lo', FIELD_TYPE.LONGLONG), ('hi', FIELD_TYPE.LONGLONG)],
+                    [(str(min(self.ids)).encode('ascii'),
+                      str(max(self.ids)).encode('ascii'))])
+        match = _PAGE.match(sql)
+        if match is None:
+            return None
+        ids = self.ids
+        if match.group(1):
+            for condition in match.group(1).split(' AND '):
+                op, value = _CONDITION.match(condition).groups()
+                value = int(value)
+                if op == '>=':
+                    ids = [id_ for id_ in ids if id_ >= value]
+                elif op == '>':
+                    ids = [id_ for id_ in ids if id_ > value]
+                else:
+                    ids = [id_ for id_ in ids if id_ < value]
+        ids = ids[:int(match.group(2))]
+        self.pages.append(ids)
+        return columns, [(str(id_).encode('ascii'),) for id_ in ids]
+
+
+class TableScanTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MysqlServer().start()
+        self.table = _Table(list(range(1, 101)))
+        self.server.handler = self.table
+        self.pool = TorMysqlPool('127.0.0.1', self.server.port, 'root', 'root',
+                                 'test', max_size=4)
+
+    def tearDown(self):
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @gen.coroutine
+    def read(self, scan):
+        items = []
+        while (yield scan.fetch_next):
+            items.append(scan.next_object())
+        raise gen.Return(items)
+
+    def statements(self):
+        return [sql for _, sql in self.server.statements if sql.startswith('SELECT')]
+
+    @run_on_loop
+    def test_ranges_between_min_and_max(self):
+        scan = self.pool.parallel_scan('t', chunks=4, concurrency=2, batch_size=7)
+        rows = yield self.read(scan)
+        ids = [row['id'] for row in rows]
+        self.assertEqual(list(range(1, 101)), sorted(ids))
+
+        # Four ranges split at 26, 51 and 76, each read in keyset pages.
+        starts = [sql for sql in self.statements() if '`id` > ' not in sql]
+        self.assertEqual(
+            ['SELECT * FROM `t` WHERE `id` < 26 ORDER BY `id` LIMIT 7',
+             'SELECT * FROM `t` WHERE `id` >= 26 AND `id` < 51 ORDER BY `id` LIMIT 7',
+             'SELECT * FROM `t` WHERE `id` >= 51 AND `id` < 76 ORDER BY `id` LIMIT 7',
+             'SELECT * FROM `t` WHERE `id` >= 76 ORDER BY `id` LIMIT 7',
+             'SELECT MIN(`id`) AS lo, MAX(`id`) AS hi FROM `t`'],
+            sorted(starts))
+        self.assertIn('SELECT * FROM `t` WHERE `id` > 7 AND `id` < 26 ORDER BY `id` LIMIT 7',
+                      self.statements())
+        for page in self.table.pages:
+            self.assertLessEqual(len(page), 7)
+        # Over `concurrency` connections.
+        self.assertEqual(2, len(set(thread_id for thread_id, sql in self.server.statements
+                                    if 'ORDER BY' in sql)))
+
+    @run_on_loop
+    def test_boundaries_and_batches(self):
+        scan = self.pool.parallel_scan('t', concurrency=3, batch_size=10, batches=True,
+                                       boundaries=[30, 60])
+        batches = yield self.read(scan)
+        self.assertEqual(list(range(1, 101)),
+                         sorted(row['id'] for batch in batches for row in batch))
+        for batch in batches:
+            self.assertLessEqual(len(batch), 10)
+        self.assertFalse(any('MIN(' in sql for sql in self.statements()))
+
+    @run_on_loop
+    def test_more_chunks_than_ids(self):
+        self.table.ids = [5, 6, 7]
+        scan = self.pool.parallel_scan('t', chunks=8)
+        rows = yield self.read(scan)
+        self.assertEqual([5, 6, 7], sorted(row['id'] for row in rows))
+
+    @run_on_loop
+    def test_key_not_an_integer(self):
+        self.server.results['SELECT MIN(`name`) AS lo, MAX(`name`) AS hi FROM `t`'] = (
+            ['lo', 'hi'], [(b'ann', b'zoe')])
+        self.server.results['SELECT `name` FROM `t` ORDER BY `name` LIMIT 1000'] = (
+            ['name'], [(b'ann',), (b'zoe',)])
+        scan = self.pool.parallel_scan('t', key='name', columns=['name'])
+        rows = yield self.read(scan)
+        # Read as a single range.
+        self.assertEqual([{'name': 'ann'}, {'name': 'zoe'}], rows)
+
+    @run_on_loop
+    def test_buffer_bounded_and_close(self):
+        scan = self.pool.parallel_scan('t', chunks=4, concurrency=2, batch_size=5)
+        self.assertTrue((yield scan.fetch_next))
+        yield gen.sleep(0.1)
+        # The workers wait while `concurrency` batches are unread, however
+        # many pages they had started.
+        self.assertEqual(2, len(scan._buffer))
+        pages = len(self.table.pages)
+
+        scan.close()
+        self.assertFalse((yield scan.fetch_next))
+        yield gen.sleep(0.1)
+        self.assertEqual(pages, len(self.table.pages))
+        self.assertEqual(0, scan._workers)
+
+    def test_page(self):
+        scan = self.pool.parallel_scan('100%', key='k%', columns=['a'])
+        self.assertEqual(('SELECT `k%%`, `a` FROM `100%%` ORDER BY `k%%` LIMIT 1000', []),
+                         scan._page(None, None, None))
+        self.assertEqual(('SELECT `k%%`, `a` FROM `100%%` WHERE `k%%` > %s AND `k%%` < %s'
+                          ' ORDER BY `k%%` LIMIT 1000', [3, 5]),
+                         scan._page(1, 5, 3))
+        self.assertEqual(('SELECT `k%%`, `a` FROM `100%%` WHERE `k%%` >= %s'
+                          ' ORDER BY `k%%` LIMIT 1000', [1]),
+                         scan._page(1, None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
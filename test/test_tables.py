@@ -0,0 +1,65 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+from asyncdb.mysql.tables import read_tables, written_tables
+
+
+class ReadTablesTest(unittest.TestCase):
+    def test_select(self):
+        self.assertEqual({'user'}, read_tables('SELECT * FROM user WHERE id = 1'))
+
+    def test_joins_and_aliases(self):
+        sql = ('SELECT * FROM db.user AS u, extra e JOIN `order` o'
+               ' ON o.user_id = u.id LEFT JOIN item USING (id) WHERE 1')
+        self.assertEqual({'user', 'order', 'item', 'extra'}, read_tables(sql))
+
+    def test_quoted_names(self):
+        self.assertEqual({'we`ird', 'user'},
+                         read_tables('select 1 from `db`.`we``ird`, USER'))
+
+    def test_literals_are_ignored(self):
+        self.assertEqual({'user'},
+                         read_tables("SELECT * FROM user WHERE name = 'a FROM b'"))
+
+    def test_not_a_select(self):
+        self.assertIsNone(read_tables('SHOW TABLES'))
+        self.assertIsNone(read_tables('SELECT 1'))
+
+
+class WrittenTablesTest(unittest.TestCase):
+    def test_insert_and_replace(self):
+        self.assertEqual({'user'}, written_tables('INSERT INTO db.user VALUES (1)'))
+        self.assertEqual({'user'}, written_tables('insert ignore user (id) values (1)'))
+        self.assertEqual({'user'}, written_tables('REPLACE INTO `user` SET id = 1'))
+
+    def test_update(self):
+        self.assertEqual({'user'}, written_tables('UPDATE user SET name = 1'))
+        self.assertEqual({'user', 'order'}, written_tables(
+            'UPDATE user u JOIN `order` o ON o.user_id = u.id SET u.n = 1'))
+
+    def test_delete(self):
+        self.assertEqual({'user'}, written_tables('DELETE FROM user WHERE id = 1'))
+        # Aliases may be named too; that only costs extra invalidations.
+        self.assertLessEqual({'user', 'order'}, written_tables(
+            'DELETE u, o FROM user u JOIN `order` o ON o.user_id = u.id'))
+
+    def test_table_statements(self):
+        self.assertEqual({'user'}, written_tables('TRUNCATE TABLE user'))
+        self.assertEqual({'a', 'b'}, written_tables('DROP TABLE IF EXISTS a, b'))
+        self.assertEqual({'a', 'b'}, written_tables('RENAME TABLE a TO b'))
+        self.assertEqual({'t'}, written_tables(
+            "LOAD DATA LOCAL INFILE 'f' INTO TABLE `t` (a)"))
+
+    def test_reads_write_nothing(self):
+        self.assertEqual(frozenset(), written_tables('SELECT * FROM user'))
+        self.assertEqual(frozenset(), written_tables('BEGIN'))
+        self.assertEqual(frozenset(), written_tables('SELECT 1 INTO @x'))
+
+    def test_unknown_may_write_anything(self):
+        self.assertIsNone(written_tables('CALL do_things()'))
+        self.assertIsNone(written_tables('SELECT * INTO t2 FROM t1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+import bson
+import pymongo.errors
+from tornado import gen, ioloop
+
+from asyncdb.frameworks import tornado as framework
+from asyncdb.mongo import raw
+from asyncdb.mongo.core import _CursorTail
+
+from . import run_on_loop
+
+
+class _Capped(object):
+    """A capped collection of documents with integer _ids, whose cursors
+    can be made to die."""
+
+    def __init__(self, io_loop, mode=None):
+        self.io_loop = io_loop
+        self.mode = mode
+        self.documents = []
+        self.specs = []
+        self.polls = 0
+        self.kill = False
+
+    def insert(self, *ids):
+        self.documents.extend({'_id': id_} for id_ in ids)
+
+
+class _Delegate(object):
+    def __init__(self, spec):
+        self._Cursor__spec = spec
+
+
+class _Cursor(object):
+    _framework = framework
+
+    def __init__(self, capped, spec=None):
+        self.capped = capped
+        self.delegate = _Delegate(spec or {})
+        self.alive = True
+        self.buffer = []
+        self.position = None
+
+    def clone(self):
+        return _Cursor(self.capped, self.delegate._Cursor__spec)
+
+    def get_io_loop(self):
+        return self.capped.io_loop
+
+    def _get_more(self):
+        capped = self.capped
+        capped.polls += 1
+        future = framework.get_future(capped.io_loop)
+        if capped.kill:
+            capped.kill = False
+            self.alive = False
+            future.set_exception(pymongo.errors.CursorNotFound('cursor killed'))
+            return future
+        if self.position is None:
+            spec = self.delegate._Cursor__spec
+            capped.specs.append(spec)
+            low = _low(spec)
+            self.position = len([d for d in capped.documents if d['_id'] <= low])
+        documents = capped.documents[self.position:]
+        self.position = len(capped.documents)
+        if capped.mode is None:
+            self.buffer.extend(documents)
+        else:
+            self.buffer.extend(raw.convert(documents, capped.mode))
+        future.set_result(len(documents))
+        return future
+
+    def _buffer_size(self):
+        return len(self.buffer)
+
+    def next_object(self):
+        return self.buffer.pop(0)
+
+    def close(self):
+        self.alive = False
+        future = framework.get_future(self.capped.io_loop)
+        future.set_result(None)
+        return future
+
+
+def _low(spec):
+    # The $gt bound _CursorTail adds when it resumes.
+    if '$and' in spec:
+        spec = spec['$and'][-1]
+    return spec.get('_id', {}).get('$gt', float('-inf'))
+
+
+class CursorTailTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+
+    def tearDown(self):
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    def tail(self, capped, min_delay=0.001, max_delay=0.004):
+        return _CursorTail(_Cursor(capped), '_id', min_delay, max_delay)
+
+    @gen.coroutine
+    def read(self, tail, count):
+        ids = []
+        while len(ids) < count:
+            self.assertTrue((yield tail.fetch_next))
+            document = tail.next_object()
+            if isinstance(document, bson.BSON):
+                document = document.decode()
+            ids.append(document['_id'])
+        raise gen.Return(ids)
+
+    @gen.coroutine
+    def check_resume(self, mode):
+        capped = _Capped(self.io_loop, mode)
+        capped.insert(1, 2)
+        tail = self.tail(capped)
+        self.assertEqual([1, 2], (yield self.read(tail, 2)))
+        capped.kill = True
+        capped.insert(3)
+        self.assertEqual([3], (yield self.read(tail, 1)))
+        self.assertEqual(1, tail.restarts)
+        self.assertEqual({'_id': {'$gt': 2}}, capped.specs[-1])
+        yield tail.close()
+
+    @run_on_loop
+    def test_resumes_after_cursor_dies(self):
+        yield self.check_resume(None)
+
+    @run_on_loop
+    def test_resumes_raw_documents(self):
+        yield self.check_resume(raw.RAW)
+
+    @run_on_loop
+    def test_resumes_lazy_documents(self):
+        yield self.check_resume(raw.LAZY)
+
+    @run_on_loop
+    def test_waits_longer_while_nothing_comes(self):
+        capped = _Capped(self.io_loop)
+        tail = self.tail(capped, min_delay=0.001, max_delay=0.008)
+        fetched = tail.fetch_next
+        yield gen.sleep(0.1)
+        self.assertFalse(fetched.done())
+        self.assertEqual(0.008, tail._delay)
+        # 0.001, 0.002, 0.004 then every 0.008 seconds, not every 0.001.
+        self.assertLess(capped.polls, 20)
+
+        capped.insert(1)
+        self.assertTrue((yield fetched))
+        self.assertEqual(0, tail._delay)
+        self.assertEqual(1, tail.next_object()['_id'])
+        yield tail.close()
+
+    @run_on_loop
+    def test_close_ends_iteration(self):
+        tail = self.tail(_Capped(self.io_loop))
+        fetched = tail.fetch_next
+        yield tail.close()
+        self.assertFalse((yield fetched))
+        self.assertFalse((yield tail.fetch_next))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+import pymysql.err
+from pymysql.constants import ER
+from tornado import gen, ioloop
+
+from asyncdb.mysql import TorMysqlPool
+from asyncdb.mysql.core import is_retryable
+
+from . import run_on_loop
+from .mysql_server import MysqlServer
+
+UPDATE = 'UPDATE account SET balance = balance - 1 WHERE id = 1'
+
+
+class TransactionTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        self.server = MysqlServer().start()
+        self.pool = TorMysqlPool('127.0.0.1', self.server.port, 'root', 'root',
+                                 'test', max_size=2)
+        self.server.results['SELECT balance FROM account'] = (
+            ['balance'], [(b'99',)])
+        # Connections func was called with, one per attempt.
+        self.attempts = []
+
+    def tearDown(self):
+        self.server.stop()
+        ioloop.IOLoop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    @gen.coroutine
+    def transfer(self, connection):
+        self.attempts.append(connection.thread_id())
+        self.assertTrue(connection.in_transaction)
+        cursor = connection.cursor()
+        yield cursor.execute(UPDATE)
+        yield cursor.execute('SELECT balance FROM account')
+        raise gen.Return(cursor.fetchall())
+
+    def statements(self):
+        return [sql for _, sql in self.server.statements
+                if sql in ('BEGIN', 'COMMIT', 'ROLLBACK', UPDATE)]
+
+    def assertReturned(self):
+        # The socket is back in the pool, outside any transaction.
+        self.assertEqual(1, self.pool.sock_pool.motor_sock_counter)
+        self.assertEqual(1, len(self.pool.sock_pool.sockets))
+
+    @run_on_loop
+    def test_commit(self):
+        result = yield self.pool.transaction().run(self.transfer)
+        self.assertEqual([{'balance': '99'}], list(result))
+        self.assertEqual(['BEGIN', UPDATE, 'COMMIT'], self.statements())
+        # Every statement went over the same socket.
+        self.assertEqual(1, len(set(thread_id
+                                    for thread_id, _ in self.server.statements)))
+        self.assertReturned()
+
+    @run_on_loop
+    def test_retried_after_deadlock(self):
+        self.server.errors[UPDATE] = [
+            (ER.LOCK_DEADLOCK, 'Deadlock found when trying to get lock'),
+            (ER.LOCK_WAIT_TIMEOUT, 'Lock wait timeout exceeded')]
+        result = yield self.pool.transaction(retries=3, backoff=0.001).run(
+            self.transfer)
+        self.assertEqual([{'balance': '99'}], list(result))
+        self.assertEqual(3, len(self.attempts))
+        self.assertEqual(['BEGIN', UPDATE, 'ROLLBACK'] * 2
+                         + ['BEGIN', UPDATE, 'COMMIT'], self.statements())
+        self.assertReturned()
+
+    @run_on_loop
+    def test_gives_up_after_retries(self):
+        self.server.errors[UPDATE] = [
+            (ER.LOCK_DEADLOCK, 'Deadlock found when trying to get lock')] * 3
+        with self.assertRaises(pymysql.err.MySQLError) as context:
+            yield self.pool.transaction(retries=1, backoff=0.001).run(
+                self.transfer)
+        self.assertEqual(ER.LOCK_DEADLOCK, context.exception.args[0])
+        self.assertEqual(2, len(self.attempts))
+        self.assertEqual(['BEGIN', UPDATE, 'ROLLBACK'] * 2, self.statements())
+        self.assertReturned()
+
+    @run_on_loop
+    def test_other_errors_not_retried(self):
+        @gen.coroutine
+        def fail(connection):
+            self.attempts.append(connection.thread_id())
+            yield connection.cursor().execute(UPDATE)
+            raise KeyError('account')
+
+        with self.assertRaises(KeyError):
+            yield self.pool.transaction(retries=3, backoff=0.001).run(fail)
+        self.assertEqual(1, len(self.attempts))
+        self.assertEqual(['BEGIN', UPDATE, 'ROLLBACK'], self.statements())
+        self.assertReturned()
+
+    @run_on_loop
+    def test_failed_rollback_discards_socket(self):
+        self.server.errors['ROLLBACK'] = [(ER.UNKNOWN_ERROR, 'Unknown error')]
+
+        @gen.coroutine
+        def fail(connection):
+            yield connection.cursor().execute(UPDATE)
+            raise KeyError('account')
+
+        # The original error wins over the rollback's.
+        with self.assertRaises(KeyError):
+            yield self.pool.transaction().run(fail)
+        self.assertEqual(0, self.pool.sock_pool.motor_sock_counter)
+
+    def test_is_retryable(self):
+        self.assertTrue(is_retryable(
+            pymysql.err.OperationalError(ER.LOCK_DEADLOCK, 'Deadlock')))
+        self.assertTrue(is_retryable(
+            pymysql.err.InternalError(ER.LOCK_WAIT_TIMEOUT, 'Timeout')))
+        self.assertFalse(is_retryable(
+            pymysql.err.OperationalError(ER.DUP_ENTRY, 'Duplicate')))
+        self.assertFalse(is_retryable(pymysql.err.OperationalError()))
+        self.assertFalse(is_retryable(KeyError(ER.LOCK_DEADLOCK)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+import pymongo.errors
+from tornado import ioloop
+
+from asyncdb.frameworks import tornado as framework
+from asyncdb.mongo.writes import WriteBatcher
+
+
+class _Bulk(object):
+    def __init__(self):
+        self.ops = []
+        self.executed = framework.get_future(None)
+
+    def insert(self, document):
+        self.ops.append(('insert', document))
+
+    def find(self, spec):
+        return _View(self, spec)
+
+    def execute(self):
+        return self.executed
+
+
+class _View(object):
+    def __init__(self, bulk, spec):
+        self.bulk = bulk
+        self.spec = spec
+
+    def upsert(self):
+        return self
+
+    def update_one(self, document):
+        self.bulk.ops.append(('update_one', self.spec))
+
+    def update(self, document):
+        self.bulk.ops.append(('update', self.spec))
+
+    def replace_one(self, document):
+        self.bulk.ops.append(('replace_one', self.spec))
+
+
+class _Collection(object):
+    full_name = 'db.c'
+    _framework = framework
+
+    def __init__(self, io_loop):
+        self.io_loop = io_loop
+        self.bulks = []
+
+    def get_io_loop(self):
+        return self.io_loop
+
+    def initialize_unordered_bulk_op(self):
+        self.bulks.append(_Bulk())
+        return self.bulks[-1]
+
+
+def _details(**kwargs):
+    details = {'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0,
+               'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0,
+               'upserted': []}
+    details.update(kwargs)
+    return details
+
+
+class WriteBatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.collection = _Collection(self.io_loop)
+
+    def tearDown(self):
+        self.io_loop.close(all_fds=True)
+
+    def write(self, updates, details=None, error=None, inserts=()):
+        """Sends `inserts` then `updates`, (spec, multi) pairs, as one
+        batch, which ends with `details` or `error`."""
+        batcher = WriteBatcher(max_batch_size=len(updates) + len(inserts),
+                               updates=True)
+        futures = [batcher.insert(self.collection, document) for document in inserts]
+        futures += [batcher.update(self.collection, spec, {'$set': {'x': 1}},
+                                   upsert=upsert, multi=multi)
+                    for spec, multi, upsert in updates]
+        self.assertEqual(1, len(self.collection.bulks))
+        executed = self.collection.bulks[0].executed
+        if error is None:
+            executed.set_result(details)
+        else:
+            executed.set_exception(error)
+        return futures
+
+    def test_single_update_gets_the_totals(self):
+        future, = self.write([({'a': 1}, True, False)],
+                             _details(nMatched=3, nModified=2))
+        self.assertEqual({'ok': 1.0, 'n': 3, 'nModified': 2, 'updatedExisting': True},
+                         future.result())
+
+    def test_counts_settled_by_the_totals(self):
+        updates = [({'a': 1}, False, False), ({'a': 2}, False, False)]
+        all_matched = self.write(updates, _details(nMatched=2, nModified=0))
+        self.assertEqual([(1, 0, True)] * 2,
+                         [(f.result()['n'], f.result()['nModified'],
+                           f.result()['updatedExisting']) for f in all_matched])
+        self.collection.bulks = []
+        none_matched = self.write(updates, _details())
+        self.assertEqual([(0, 0, False)] * 2,
+                         [(f.result()['n'], f.result()['nModified'],
+                           f.result()['updatedExisting']) for f in none_matched])
+
+    def test_counts_the_totals_dont_settle(self):
+        futures = self.write([({'a': 1}, False, False), ({'a': 2}, False, False)],
+                             _details(nMatched=1, nModified=1))
+        self.assertEqual([{'ok': 1.0, 'n': None, 'nModified': None,
+                           'updatedExisting': None}] * 2,
+                         [future.result() for future in futures])
+
+    def test_upserted(self):
+        futures = self.write(
+            [({'a': 1}, False, True), ({'a': 2}, False, False)],
+            _details(nMatched=1, nModified=1, nUpserted=1,
+                     upserted=[{'index': 0, '_id': 'new'}]))
+        self.assertEqual({'ok': 1.0, 'n': 1, 'nModified': 0, 'updatedExisting': False,
+                          'upserted': 'new'}, futures[0].result())
+        self.assertEqual({'ok': 1.0, 'n': 1, 'nModified': 1, 'updatedExisting': True},
+                         futures[1].result())
+
+    def test_without_n_modified(self):
+        details = _details(nMatched=1)
+        del details['nModified']
+        future, = self.write([({'a': 1}, False, False)], details)
+        self.assertNotIn('nModified', future.result())
+
+    def test_each_caller_gets_its_own_error(self):
+        errors = [{'index': 1, 'code': 11000, 'errmsg': 'dup'},
+                  {'index': 2, 'code': 2, 'errmsg': 'bad'}]
+        details = _details(nInserted=1, writeErrors=errors)
+        futures = self.write([({'a': 1}, False, False)],
+                             error=pymongo.errors.BulkWriteError(details),
+                             inserts=[{'_id': 1}, {'_id': 2}])
+        self.assertEqual(1, futures[0].result())
+        with self.assertRaises(pymongo.errors.DuplicateKeyError) as context:
+            futures[1].result()
+        self.assertEqual({'index': 0, 'code': 11000, 'errmsg': 'dup'},
+                         context.exception.details)
+        with self.assertRaises(pymongo.errors.OperationFailure) as context:
+            futures[2].result()
+        self.assertEqual('bad', context.exception.details['errmsg'])
+        # The reply's own documents are left as they were.
+        self.assertEqual(1, errors[0]['index'])
+
+    def test_write_concern_error_fails_every_write(self):
+        concern = {'code': 64, 'errmsg': 'timed out', 'errInfo': {'wtimeout': True}}
+        futures = self.write([({'a': 1}, False, False)],
+                             error=pymongo.errors.BulkWriteError(
+                                 _details(nInserted=1, writeConcernErrors=[concern])),
+                             inserts=[{'_id': 1}])
+        for future in futures:
+            self.assertRaises(pymongo.errors.WTimeoutError, future.result)
+
+    def test_other_errors_fail_every_write(self):
+        futures = self.write([({'a': 1}, False, False)],
+                             error=pymongo.errors.AutoReconnect('gone'),
+                             inserts=[{'_id': 1}])
+        for future in futures:
+            self.assertRaises(pymongo.errors.AutoReconnect, future.result)
+
+
+if __name__ == '__main__':
+    unittest.main()